@@ -37,12 +37,21 @@ import deployer_utils
 import application_summary_registrar
 import deployment_manager
 from deployer_system_test import DeployerRestClientTester
-from exceptiondef import NotFound, ConflictingState, FailedValidation, FailedCreation, FailedConnection, Forbidden
-from async_dispatcher import AsyncDispatcher
+from exceptiondef import NotFound, ConflictingState, FailedValidation, FailedCreation, FailedConnection, Forbidden, Overloaded
+from async_dispatcher import AsyncDispatcher, Lane
 from package_repo_rest_client import PackageRepoRestClient
+from hbase_connection_pool import HbaseConnectionPool
+from registrar_cache import CachedPackageRegistrar, CachedApplicationRegistrar, create_cache
+from package_cache import PackageCache
+from ssh_connection_pool import SshConnectionPool
+import http_session_pool
 
 options.logging = None
 
+READ_LANE = 'read'
+LIFECYCLE_LANE = 'lifecycle'
+RETRY_AFTER = 5
+
 
 class Application(tornado.web.Application):
     def __init__(self):
@@ -55,7 +64,9 @@ class Application(tornado.web.Application):
             (r'/applications/(.*)/(.*)', ApplicationDetailHandler),
             (r'/applications/(.*)', ApplicationHandler),
             (r'/applications', ApplicationsHandler),
+            (r'/batch/applications', ApplicationsBatchHandler),
             (r'/environment/endpoints', EnvironmentHandler),
+            (r'/scheduler/metrics', SchedulerMetricsHandler),
             (r'/selftest/all', SelfTestHandler)
         ]
         tornado.web.Application.__init__(self, handlers)
@@ -63,6 +74,18 @@ class Application(tornado.web.Application):
 
 class BaseHandler(CorsMixin, tornado.web.RequestHandler):
     CORS_ORIGIN = '*'
+    _task = None
+
+    def run_as_asynch(self, task, lane=READ_LANE):
+        try:
+            self._task = DISPATCHER.run_as_asynch(task=task, on_error=self.handle_error, lane=lane)
+        except Overloaded as ex:
+            self.handle_error(ex)
+
+    def on_connection_close(self):
+        # nobody is waiting for the result any more, so don't start it if it is still queued
+        if self._task is not None:
+            self._task.cancel()
 
     def handle_error(self, ex):
         def finish():
@@ -92,6 +115,11 @@ class BaseHandler(CorsMixin, tornado.web.RequestHandler):
                 logging.info(ex.msg)
                 self.set_status(503)
                 self.finish({"information": str(ex.msg)})
+            elif isinstance(ex, Overloaded):
+                logging.info(ex.msg)
+                self.set_status(503)
+                self.set_header('Retry-After', RETRY_AFTER)
+                self.finish({"information": str(ex.msg)})
             else:
                 self.set_status(500)
                 if "information" in str(ex):
@@ -108,10 +136,10 @@ class BaseHandler(CorsMixin, tornado.web.RequestHandler):
 
         IOLoop.instance().add_callback(callback=finish)
 
-    def send_accepted(self):
+    def send_accepted(self, ret_val=None):
         def finish():
             self.set_status(202)
-            self.finish()
+            self.finish(None if ret_val is None else json.dumps(ret_val))
 
         IOLoop.instance().add_callback(callback=finish)
 
@@ -123,7 +151,38 @@ class BaseHandler(CorsMixin, tornado.web.RequestHandler):
         IOLoop.instance().add_callback(callback=finish)
 
 
-DISPATCHER = AsyncDispatcher(num_threads=10)
+def create_dispatcher(dm_config):
+    """
+    Read only calls are run on a separate lane from calls that change packages and applications,
+    so they are never queued behind slow lifecycle operations
+    """
+    lanes = [Lane(READ_LANE,
+                  dm_config.get('api_read_threads', 10),
+                  max_queue=dm_config.get('api_read_queue_limit', 200),
+                  timeout=dm_config.get('api_read_timeout', 30)),
+             Lane(LIFECYCLE_LANE,
+                  dm_config.get('api_lifecycle_threads', 5),
+                  max_queue=dm_config.get('api_lifecycle_queue_limit', 50),
+                  timeout=dm_config.get('api_lifecycle_timeout', 120))]
+    return AsyncDispatcher(lanes=lanes)
+
+
+def hbase_pool_size(dm_config):
+    """
+    One connection for every thread that may be talking to HBase at any one time, on either
+    dispatcher lane or the deployment manager's own dispatcher
+    """
+    return dm_config.get('hbase_pool_size',
+                         dm_config.get('api_read_threads', 10) +
+                         dm_config.get('api_lifecycle_threads', 5) +
+                         dm_config['deployer_thread_limit'])
+
+
+class SchedulerMetricsHandler(BaseHandler):
+    def get(self):
+        self.finish(json.dumps({'api': DISPATCHER.metrics(),
+                                'deployer': dm.dispatcher.metrics(),
+                                'groups': dm.group_resolver.metrics()}))
 
 
 class SelfTestHandler(BaseHandler):
@@ -132,7 +191,7 @@ class SelfTestHandler(BaseHandler):
         def do_call():
             self.send_result(DeployerRestClientTester().run_tests())
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
 
 class EnvironmentHandler(BaseHandler):
@@ -141,7 +200,7 @@ class EnvironmentHandler(BaseHandler):
         def do_call():
             self.send_result(dm.get_environment(self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 
 class RepositoryHandler(BaseHandler):
@@ -155,7 +214,7 @@ class RepositoryHandler(BaseHandler):
                 recency = int(args['recency'][0])
             self.send_result(dm.list_repository(recency, self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 
 class PackagesHandler(BaseHandler):
@@ -164,7 +223,7 @@ class PackagesHandler(BaseHandler):
         def do_call():
             self.send_result(dm.list_packages(self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 
 class PackageHandler(BaseHandler):
@@ -173,7 +232,7 @@ class PackageHandler(BaseHandler):
         def do_call():
             self.send_result(dm.get_package_info(name, self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
     @asynchronous
     def put(self, name):
@@ -181,7 +240,7 @@ class PackageHandler(BaseHandler):
             dm.deploy_package(name, self.get_argument("user.name"))
             self.send_accepted()
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
     @asynchronous
     def delete(self, name):
@@ -189,7 +248,7 @@ class PackageHandler(BaseHandler):
             dm.undeploy_package(name, self.get_argument("user.name"))
             self.send_accepted()
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
 
 class PackageApplicationsHandler(BaseHandler):
@@ -198,7 +257,7 @@ class PackageApplicationsHandler(BaseHandler):
         def do_call():
             self.send_result(dm.list_package_applications(name, self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 
 class PackageStatusHandler(BaseHandler):
@@ -211,16 +270,51 @@ class PackageStatusHandler(BaseHandler):
                 "information": package_info.get("information", None)
             })
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 
 class ApplicationsHandler(BaseHandler):
     @asynchronous
     def get(self):
+        limit = self.get_argument("limit", default=None)
+        if limit is not None:
+            if not limit.isdigit() or int(limit) <= 0:
+                self.send_client_error("limit must be a positive integer")
+                return
+            limit = int(limit)
+        start_after = self.get_argument("start_after", default=None)
+
         def do_call():
-            self.send_result(dm.list_applications(self.get_argument("user.name", default='')))
+            self.send_result(dm.list_applications(self.get_argument("user.name", default=''),
+                                                  limit=limit, start_after=start_after))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
+
+
+class ApplicationsBatchHandler(BaseHandler):
+    @asynchronous
+    def post(self):
+        try:
+            request_body = json.loads(self.request.body)
+        except ValueError:
+            self.send_client_error("Invalid request body")
+            return
+
+        operations = request_body.get('operations') if isinstance(request_body, dict) else None
+        if not isinstance(operations, list) or not operations:
+            self.send_client_error("Invalid request body. Expected a non empty list of 'operations'")
+            return
+
+        max_operations = config['config'].get('batch_max_operations', 100)
+        if len(operations) > max_operations:
+            self.send_client_error("A batch may contain at most %s operations" % max_operations)
+            return
+
+        user_name = self.get_argument("user.name")
+        def do_call():
+            self.send_accepted({'results': dm.run_batch(operations, user_name)})
+
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
 
 class ApplicationDetailHandler(BaseHandler):
@@ -237,7 +331,7 @@ class ApplicationDetailHandler(BaseHandler):
             else:
                 self.send_client_error("%s is not a valid action (start|stop)" % action)
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
     @asynchronous
     def get(self, name, action):
@@ -256,7 +350,7 @@ class ApplicationDetailHandler(BaseHandler):
             else:
                 self.send_client_error("%s is not a valid query (status|detail|summary)" % action)
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
 class ApplicationHandler(BaseHandler):
     @asynchronous
@@ -280,14 +374,14 @@ class ApplicationHandler(BaseHandler):
             dm.create_application(request_body['package'], aname, request_body, user_name)
             self.send_accepted()
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
     @asynchronous
     def get(self, name):
         def do_call():
             self.send_result(dm.get_application_info(name, self.get_argument("user.name", default='')))
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call)
 
     @asynchronous
     def delete(self, name):
@@ -296,18 +390,20 @@ class ApplicationHandler(BaseHandler):
             dm.delete_application(name, user_name)
             self.send_accepted()
 
-        DISPATCHER.run_as_asynch(task=do_call, on_error=self.handle_error)
+        self.run_as_asynch(do_call, LIFECYCLE_LANE)
 
 
 # pylint: disable=C0103
 # pylint: disable=W0603
 config = None
 dm = None
+DISPATCHER = None
 
 
 def main():
     global config
     global dm
+    global DISPATCHER
 
     with open('dm-config.json', 'r') as f:
         config = json.load(f)
@@ -322,22 +418,42 @@ def main():
     logging.info("Starting up...")
 
     deployer_utils.fill_hadoop_env(config['environment'], config['config'])
-
-    package_repository = PackageRepoRestClient(config['config']["package_repository"], config['config']['stage_root'])
+    deployer_utils.SSH_POOL = SshConnectionPool(
+        max_idle_per_host=config['config'].get('ssh_pool_size', SshConnectionPool.MAX_IDLE_PER_HOST),
+        keepalive_interval=config['config'].get('ssh_keepalive_interval', SshConnectionPool.KEEPALIVE_INTERVAL),
+        idle_timeout=config['config'].get('ssh_idle_timeout', SshConnectionPool.IDLE_TIMEOUT))
+    http_session_pool.SESSION_POOL = http_session_pool.create_session_pool(config['config'])
+
+    package_repository = PackageRepoRestClient(config['config']["package_repository"], config['config']['stage_root'],
+                                               max_package_size=config['config'].get('max_package_size'))
+    hbase_connection_pool = HbaseConnectionPool(config['environment']['hbase_thrift_server'],
+                                                size=hbase_pool_size(config['config']),
+                                                checkout_timeout=config['config'].get(
+                                                    'hbase_pool_timeout', HbaseConnectionPool.CHECKOUT_TIMEOUT))
+    package_cache = PackageCache(config['config'].get('package_cache_dir',
+                                                      '%s/package_cache' % config['config']['stage_root']),
+                                 max_bytes=config['config'].get('package_cache_size', PackageCache.DEFAULT_MAX_BYTES))
+    # package and application records are served from memory between writes
     dm = deployment_manager.DeploymentManager(package_repository,
-                                              package_registrar.HbasePackageRegistrar(
+                                              CachedPackageRegistrar(package_registrar.HbasePackageRegistrar(
                                                   config['environment']['hbase_thrift_server'],
                                                   config['environment']['webhdfs_host'],
                                                   config['environment']['webhdfs_user'],
                                                   config['environment']['webhdfs_port'],
-                                                  config['config']['stage_root']),
-                                              application_registrar.HbaseApplicationRegistrar(
-                                                  config['environment']['hbase_thrift_server']),
+                                                  config['config']['stage_root'],
+                                                  connection_pool=hbase_connection_pool,
+                                                  package_cache=package_cache), create_cache(config['config'])),
+                                              CachedApplicationRegistrar(application_registrar.HbaseApplicationRegistrar(
+                                                  config['environment']['hbase_thrift_server'],
+                                                  connection_pool=hbase_connection_pool), create_cache(config['config'])),
                                               application_summary_registrar.HBaseAppplicationSummary(
-                                                  config['environment']['hbase_thrift_server']),
+                                                  config['environment']['hbase_thrift_server'],
+                                                  connection_pool=hbase_connection_pool),
                                               config['environment'],
                                               config['config'])
 
+    DISPATCHER = create_dispatcher(config['config'])
+
     http_server = tornado.httpserver.HTTPServer(Application())
     http_server.listen(options.port)
 
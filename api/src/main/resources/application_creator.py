@@ -28,10 +28,14 @@ import re
 
 import shutil
 import logging
+import threading
+import traceback
 import uuid
+from multiprocessing.dummy import Pool as ThreadPool
 from importlib import import_module
 from exceptiondef import FailedValidation, FailedCreation
 from deployer_utils import HDFS
+from package_cache import ExtractedPackageStore
 
 
 class ApplicationCreator(object):
@@ -45,13 +49,19 @@ class ApplicationCreator(object):
         self._hdfs_client = HDFS(environment['webhdfs_host'],
                                  environment['webhdfs_port'],
                                  environment['webhdfs_user'])
+        self._extracted_packages = None
+        self._extracted_packages_lock = threading.Lock()
 
     def assert_application_properties(self, override_properties, default_properties):
         for component_type, component_properties in default_properties.items():
             creator = self._load_creator(component_type)
             creator.assert_application_properties(override_properties.get(component_type, {}), component_properties)
 
-    def create_application(self, package_data_path, package_metadata, application_name, property_overrides):
+    def create_application(self, package_data_path, package_metadata, application_name, property_overrides,
+                           package_digest=None):
+        """
+        :param package_digest: the SHA-256 of the package, if it is already known
+        """
 
         logging.debug("create_application: %s", application_name)
 
@@ -64,26 +74,78 @@ class ApplicationCreator(object):
         except KeyError:
             raise FailedCreation('User %s does not exist. Verify that this user account exists on the machine running the deployment manager.' % user_name)
 
-        stage_path = self._stage_package(package_data_path)
+        stage_path = self._stage_package(package_data_path, package_digest)
 
-        # create each class of components in the package, aggregating any
+        # create every component in the package, aggregating any
         # component specific return data for destruction
         create_metadata = {}
+        work = []
+        for component_type, components in package_metadata['component_types'].items():
+            create_metadata[component_type] = []
+            creator = self._load_creator(component_type)
+            for component_name, component in components.items():
+                work.append((component_type, creator, component_name, component))
+
         try:
-            for component_type, components in package_metadata['component_types'].items():
-                creator = self._load_creator(component_type)
-                result = creator.create_components(stage_path,
-                                                   application_name,
-                                                   user_name,
-                                                   components,
-                                                   property_overrides.get(component_type))
-                create_metadata[component_type] = result
+            outcomes = self._create_components(stage_path, application_name, user_name, work, property_overrides)
         finally:
             # clean up staged package data
             shutil.rmtree(stage_path)
 
+        errors = {}
+        for (component_type, _, component_name, _), (result, error) in zip(work, outcomes):
+            if error is not None:
+                errors['%s.%s' % (component_type, component_name)] = error
+            elif result is not None:
+                create_metadata[component_type].append(result)
+
+        if errors:
+            if any(create_metadata.values()):
+                self._roll_back_creation(application_name, create_metadata)
+            if len(errors) == 1:
+                raise errors.values()[0]
+            raise FailedCreation(dict((name, str(error)) for name, error in errors.items()))
+
         return create_metadata
 
+    def _create_components(self, stage_path, application_name, user_name, work, property_overrides):
+        """
+        Creates up to component_creation_parallelism components at once, no more components are started
+        once one has failed
+        :return: a (create data, exception) pair for each item of work, both None for components that were skipped
+        """
+        failed = threading.Event()
+
+        def create(item):
+            component_type, creator, component_name, component = item
+            if failed.is_set():
+                return None, None
+            try:
+                return creator.create_named_component(stage_path, application_name, user_name, component_name,
+                                                      component, property_overrides.get(component_type)), None
+            except Exception as ex:
+                logging.error(traceback.format_exc())
+                failed.set()
+                return None, ex
+
+        parallelism = min(self._config.get('component_creation_parallelism', 1), len(work))
+        if parallelism <= 1:
+            return [create(item) for item in work]
+
+        pool = ThreadPool(processes=parallelism)
+        try:
+            return pool.map(create, work)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _roll_back_creation(self, application_name, create_metadata):
+        logging.info("rolling back creation of %s: %s", application_name, create_metadata)
+        try:
+            self.destroy_application(application_name, create_metadata)
+        except Exception:
+            logging.error("Failed to roll back creation of %s: %s", application_name, traceback.format_exc())
+
     def destroy_application(self, application_name, application_create_data):
 
         logging.debug("destroy_application: %s %s", application_name, application_create_data)
@@ -181,14 +243,34 @@ class ApplicationCreator(object):
 
         return creator
 
-    def _stage_package(self, package_data_path):
+    def _get_extracted_packages(self):
+        """
+        :return: the store of extracted packages to stage from, or None if extracted_package_limit disables it
+        """
+        with self._extracted_packages_lock:
+            limit = self._config.get('extracted_package_limit', ExtractedPackageStore.DEFAULT_LIMIT)
+            if self._extracted_packages is None and limit > 0:
+                self._extracted_packages = ExtractedPackageStore('%s/extracted' % self._config['stage_root'], limit)
+            return self._extracted_packages
+
+    def _stage_package(self, package_data_path, package_digest=None):
 
         logging.debug("_stage_package")
 
         if not os.path.isdir(self._config['stage_root']):
             os.mkdir(self._config['stage_root'])
 
-        tar = tarfile.open(package_data_path)
         stage_path = "%s/%s" % (self._config['stage_root'], uuid.uuid4())
+        extracted_packages = self._get_extracted_packages()
+        if extracted_packages is not None:
+            try:
+                extracted_packages.stage(package_data_path, stage_path, package_digest)
+                return stage_path
+            except Exception as ex:
+                logging.warning("Unable to stage %s from its extracted copy, extracting it instead: %s",
+                                package_data_path, str(ex))
+                shutil.rmtree(stage_path, ignore_errors=True)
+
+        tar = tarfile.open(package_data_path)
         tar.extractall(path=stage_path)
         return stage_path
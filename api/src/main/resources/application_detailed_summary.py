@@ -2,72 +2,142 @@ import time
 import json
 import logging
 import sys
+import threading
 from importlib import import_module
-from multiprocessing import TimeoutError as ThreadTimeoutError
 
 from summary_aggregator import ComponentSummaryAggregator
+from lifecycle_states import ApplicationState
 from plugins_summary.yarn_connection import YarnConnection
 from async_dispatcher import AsyncDispatcher
+from hbase_connection_pool import HbaseConnectionPool
 import application_registrar
 import application_summary_registrar
 import deployer_utils
+import http_session_pool
 
 
 # constants
 SUMMARY_INTERVAL = 30
-STATUS_INTERVAL = 0.1
+# applications whose components have all finished are summarized this often, unless their status changes
+QUIET_SUMMARY_INTERVAL = 300
 REST_API_REQ_TIMEOUT = 5
 MAX_APP_SUMMARY_TIMEOUT = 60
+SUMMARY_THREADS = 4
+# component statuses that are not expected to change until the application is started again
+QUIET_STATUSES = frozenset(['KILLED', 'FINISHED_KILLED', 'KILLED_WITH_FAILURES', 'FAILED', 'COMPLETED',
+                            'FINISHED_SUCCEEDED', 'SUCCEEDED', 'COMPLETED_WITH_FAILURES', 'FINISHED_FAILED'])
 
 def milli_time():
     return int(round(time.time() * 1000))
 
+def _any_component_running(summary_data):
+    """
+    :param summary_data: the summary of an application, keyed by component name
+    :return: True if any component of the application has a status that may still change
+    """
+    return any(component.get('aggregate_status') not in QUIET_STATUSES
+               for name, component in summary_data.items() if name != 'aggregate_status')
+
+class _GeneratedSummary(object):
+    """
+    What an application's summary was last generated from
+    """
+
+    def __init__(self, generated, dm_status, running, failed):
+        """
+        :param running: True if any component of the application was still running
+        :param failed: True if the summary could not be generated
+        """
+        self.generated = generated
+        self.dm_status = dm_status
+        self.running = running
+        self.failed = failed
+
+
 class ApplicationDetailedSummary(object):
 
     def __init__(self, environment, config):
         self._environment = environment
         self._environment.update({'rest_api_req_timeout': REST_API_REQ_TIMEOUT})
         self._config = config
-        self._application_registrar = application_registrar.HbaseApplicationRegistrar(environment['hbase_thrift_server'])
-        self._application_summary_registrar = application_summary_registrar.HBaseAppplicationSummary(environment['hbase_thrift_server'])
-        self._yarn_connection = YarnConnection(self._environment)
+        summary_threads = config.get('summary_threads', SUMMARY_THREADS)
+        self._quiet_interval = config.get('summary_quiet_interval', QUIET_SUMMARY_INTERVAL)
+        self._hbase_connection_pool = HbaseConnectionPool(environment['hbase_thrift_server'], size=summary_threads)
+        self._application_registrar = application_registrar.HbaseApplicationRegistrar(
+            environment['hbase_thrift_server'], connection_pool=self._hbase_connection_pool)
+        self._application_summary_registrar = application_summary_registrar.HBaseAppplicationSummary(
+            environment['hbase_thrift_server'], connection_pool=self._hbase_connection_pool)
+        self._yarn_connection = YarnConnection(self._environment, config)
         self._summary_aggregator = ComponentSummaryAggregator()
         self._component_creators = {}
-        self.dispatcher = AsyncDispatcher(num_threads=4)
+        self._summaries_lock = threading.Lock()
+        # application name -> _GeneratedSummary
+        self._summaries = {}
+        self.dispatcher = AsyncDispatcher(num_threads=summary_threads)
 
     def generate(self):
         """
-        Update applications detailed summary
+        Update the detailed summary of every application that is due one
+        Applications with a component still running, and applications whose last summary failed, are
+        summarized every cycle. Applications whose components have all finished are summarized every
+        summary_quiet_interval seconds, or as soon as their status changes.
         """
-        applist = self._application_registrar.list_applications()
-        logging.info("List of applications: %s", ', '.join(applist))
-        self._application_summary_registrar.sync_with_dm(applist)
-        apps_to_be_processed = {}
-
-        for app in applist:
-            apps_to_be_processed.update({app: self.generate_summary(app)})
-
-        wait_time = 0
-
-        # waiting block for all the application to get completed
-        while len(apps_to_be_processed) != 0:
-            for app_name in apps_to_be_processed.keys():
-                try:
-                    apps_to_be_processed[app_name].task.get(STATUS_INTERVAL) #
-                    del apps_to_be_processed[app_name]
-                except ThreadTimeoutError:
-                    wait_time += STATUS_INTERVAL # increasing the wait time by status interval
-                    if round(wait_time, 1) % MAX_APP_SUMMARY_TIMEOUT == 0:
-                        # logging out list of applications whose wait time exceeds the max app summary timeout, on the interval of same max app summary timeout
-                        # i.e. every 60 seconds as per current max app summary timeout
-                        logging.error("Timeout exceeded, %s applications waiting for %d seconds", (',').join(apps_to_be_processed.keys()), int(wait_time))
-
-    def generate_summary(self, application):
+        statuses = self._application_registrar.list_application_statuses()
+        logging.info("List of applications: %s", ', '.join(statuses))
+        self._application_summary_registrar.sync_with_dm(statuses.keys())
+        due = self._due_applications(statuses, time.time())
+        logging.info("Generating summaries for %d of %d applications", len(due), len(statuses))
+
+        pending = set(due)
+        finished = threading.Condition()
+
+        def _on_complete(application):
+            with finished:
+                pending.discard(application)
+                finished.notify()
+
+        self._yarn_connection.start_cycle()
+        try:
+            for app in due:
+                self.generate_summary(app, dm_status=statuses[app],
+                                      on_complete=lambda app=app: _on_complete(app))
+
+            wait_time = 0
+            with finished:
+                while pending:
+                    started_waiting = time.time()
+                    finished.wait(MAX_APP_SUMMARY_TIMEOUT)
+                    wait_time += time.time() - started_waiting
+                    if pending and wait_time >= MAX_APP_SUMMARY_TIMEOUT:
+                        logging.error("Timeout exceeded, %s applications waiting for %d seconds",
+                                      (',').join(pending), int(wait_time))
+                        wait_time = 0
+        finally:
+            self._yarn_connection.end_cycle()
+
+    def _due_applications(self, statuses, now):
+        with self._summaries_lock:
+            for app in [app for app in self._summaries if app not in statuses]:
+                del self._summaries[app]
+            due = []
+            for app, dm_status in statuses.items():
+                summary = self._summaries.get(app)
+                if summary is None or summary.dm_status != dm_status or summary.failed:
+                    due.append(app)
+                elif dm_status != ApplicationState.CREATED and summary.running:
+                    due.append(app)
+                elif now - summary.generated >= self._quiet_interval:
+                    due.append(app)
+            return due
+
+    def generate_summary(self, application, dm_status=None, on_complete=None):
         """
         Update HBase wih recent application summary
+        :param dm_status: the status of the application when it was listed, recorded to schedule the next summary
         """
         def _do_generate():
-
+            running = False
+            failed = False
             try:
                 create_data = self._application_registrar.get_create_data(application)
                 input_data = {}
@@ -77,11 +147,16 @@ class ApplicationDetailedSummary(object):
                     input_data[component_name]["component_data"] = component_data
                 app_data = self._summary_aggregator.get_application_summary(application, input_data)
                 self._application_summary_registrar.post_to_hbase(app_data, application)
+                running = _any_component_running(app_data[application])
                 logging.debug("Application: %s, Status: %s", application, app_data[application]['aggregate_status'])
             except Exception as ex:
+                failed = True
                 logging.error('%s while trying to get status of application "%s"', str(ex), application)
+            with self._summaries_lock:
+                # a failed summary is tried again next cycle
+                self._summaries[application] = _GeneratedSummary(time.time(), dm_status, running, failed)
 
-        return self.dispatcher.run_as_asynch(task=_do_generate)
+        return self.dispatcher.run_as_asynch(task=_do_generate, on_complete=on_complete)
 
     def _load_creator(self, component_type):
 
@@ -116,13 +191,15 @@ def main():
                         stream=sys.stderr)
 
     deployer_utils.fill_hadoop_env(config['environment'], config['config'])
+    http_session_pool.SESSION_POOL = http_session_pool.create_session_pool(config['config'])
 
     summary = ApplicationDetailedSummary(config['environment'], config['config'])
 
     logging.info('Starting... Building actual status for applications')
+    summary_interval = config['config'].get('summary_interval', SUMMARY_INTERVAL)
 
     while True:
-        # making sure every 30 seconds generate summary initiated
+        # making sure generate summary is initiated every summary interval
         start_time_on_cur_round = milli_time()
 
         summary.generate()
@@ -130,11 +207,11 @@ def main():
         finish_time_on_cur_round = (milli_time() - start_time_on_cur_round)/1000.0
         logging.info("Finished generating summary, time taken %s seconds", str(finish_time_on_cur_round))
 
-        if finish_time_on_cur_round >= SUMMARY_INTERVAL:
+        if finish_time_on_cur_round >= summary_interval:
             continue
         else:
             # putting sleep only for the remainig time from the current round's time
-            time.sleep(SUMMARY_INTERVAL - finish_time_on_cur_round)
+            time.sleep(summary_interval - finish_time_on_cur_round)
 
 if __name__ == "__main__":
     main()
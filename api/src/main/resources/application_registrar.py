@@ -22,31 +22,50 @@ either express or implied.
 
 import logging
 import json
-import happybase
-from Hbase_thrift import AlreadyExists
+import threading
+import time
+from Hbase_thrift import AlreadyExists, Mutation
 
 from lifecycle_states import ApplicationState
 from hbase_utils import encode,decode
+from hbase_connection_pool import HbaseConnectionPool
 
 
 class HbaseApplicationRegistrar(object):
-    def __init__(self, hbase_host):
+    # row in the package index recording that it has been populated from the applications table
+    PACKAGE_INDEX_BUILT_ROW = '__index_built__'
+    # evaluated by the region servers so that rows for applications that were never created are not returned
+    CREATED_APPLICATIONS_FILTER = "SingleColumnValueFilter ('cf', 'status', !=, 'binary:%s', true, true)" % ApplicationState.NOTCREATED
+    SCAN_BATCH_SIZE = 1000
+    # set while an operation is in progress on an application, see acquire_operation
+    OPERATION_COLUMN = 'cf:operation'
+
+    def __init__(self, hbase_host, connection_pool=None):
         self._hbase_host = hbase_host
+        self._connection_pool = connection_pool
         self._table_name = 'platform_applications'
+        # package name -> one 'cf:<application name>' column per application created from it
+        self._package_index_table_name = 'platform_package_applications'
+        self._package_index_built = False
+        self._package_index_lock = threading.Lock()
         if self._hbase_host is not None:
-            connection = happybase.Connection(self._hbase_host)
-            try:
-                connection.create_table(self._table_name, {'cf': dict()})
-                logging.debug("applications table created")
-            except AlreadyExists:
-                logging.debug("applications table exists")
-            finally:
-                connection.close()
+            if self._connection_pool is None:
+                self._connection_pool = HbaseConnectionPool(self._hbase_host)
+            with self._connection_pool.connection() as connection:
+                for table_name in [self._table_name, self._package_index_table_name]:
+                    try:
+                        connection.create_table(table_name, {'cf': dict()})
+                        logging.debug("%s table created", table_name)
+                    except AlreadyExists:
+                        logging.debug("%s table exists", table_name)
 
     def create_application(self, package_name, application_name, overrides, defaults):
         logging.debug("Creating %s", application_name)
         key, data = self.generate_record(application_name, package_name, overrides, defaults)
         self._write_to_db(key, data)
+        with self._connection_pool.connection() as connection:
+            table = connection.table(self._package_index_table_name)
+            table.put(encode(package_name), {encode('cf:%s' % application_name): b''})
 
     def set_application_status(self, application_name, status, information=None):
         logging.debug("Setting status %s = %s", application_name, status)
@@ -63,17 +82,46 @@ class HbaseApplicationRegistrar(object):
 
     def delete_application(self, application_name):
         logging.debug("Deleting %s", application_name)
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
-            table.delete(application_name)
-        finally:
-            connection.close()
+            package_name = table.row(encode(application_name), columns=[b'cf:package_name']).get(b'cf:package_name')
+            table.delete(encode(application_name))
+            if package_name is not None:
+                index_table = connection.table(self._package_index_table_name)
+                index_table.delete(package_name, columns=[encode('cf:%s' % application_name)])
+
+    def acquire_operation(self, application_name, operation, timeout):
+        """
+        Atomically records that an operation has started on an application, unless another operation
+        that has not yet timed out is recorded against it, so that deployment managers sharing this table
+        never operate on the same application at once
+        :param timeout: seconds after which the operation may be taken over, in case it is never released
+        :return: True if the operation was recorded
+        """
+        logging.debug("Acquiring %s for %s", application_name, operation)
+        column = encode(self.OPERATION_COLUMN)
+        claim = json.dumps({'operation': operation, 'expires': time.time() + timeout})
+        with self._connection_pool.connection() as connection:
+            table = connection.table(self._table_name)
+            current = table.row(encode(application_name), columns=[column]).get(column)
+            if current is not None and json.loads(current)['expires'] > time.time():
+                logging.info("%s is already held for %s", application_name, json.loads(current)['operation'])
+                return False
+            # only succeeds if nobody else has changed the column since it was read
+            return connection.client.checkAndPut(encode(self._table_name), encode(application_name), column, current,
+                                                 Mutation(column=column, value=encode(claim)), {})
+
+    def release_operation(self, application_name):
+        logging.debug("Releasing %s", application_name)
+        with self._connection_pool.connection() as connection:
+            table = connection.table(self._table_name)
+            table.delete(encode(application_name), columns=[encode(self.OPERATION_COLUMN)])
 
     def get_application(self, application_name):
         logging.debug("Reading %s", application_name)
         application_data = self._read_from_db(application_name)
-        if not application_data:
+        if 'cf:status' not in application_data:
+            # either no row at all or only an operation in progress on an application that does not exist yet
             return None
         return {'overrides': json.loads(application_data['cf:overrides']),
                 'defaults': json.loads(application_data['cf:defaults']),
@@ -85,7 +133,7 @@ class HbaseApplicationRegistrar(object):
     def application_exists(self, application_name):
         logging.debug("Checking %s", application_name)
         application_data = self._read_from_db(application_name)
-        if not application_data:
+        if 'cf:status' not in application_data:
             return False
         # Note: this last line is problematic, as with the current API:
         # a "NOTCREATED" app can have an error state in the db
@@ -94,30 +142,79 @@ class HbaseApplicationRegistrar(object):
     def application_has_record(self, application_name):
         logging.debug("Checking %s", application_name)
         application_data = self._read_from_db(application_name)
-        return not len(application_data) == 0
-
-    def list_applications(self):
-        logging.debug("List all applications")
-
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        return 'cf:status' in application_data
+
+    def list_applications(self, limit=None, start_after=None):
+        logging.debug("List applications, limit %s, starting after %s", limit, start_after)
+        return list(self.iter_applications(limit=limit, start_after=start_after))
+
+    def iter_applications(self, limit=None, start_after=None):
+        """
+        Streams the names of created applications in name order, a batch of rows at a time
+        A pooled connection is held until the generator is exhausted or closed.
+        :param limit: the maximum number of names to return, or None for all of them
+        :param start_after: only return applications whose name sorts after this one
+        """
+        for application_name, _ in self._scan_statuses(limit, start_after):
+            yield application_name
+
+    def list_application_statuses(self):
+        """
+        :return: a dictionary of the status of every created application, keyed by application name
+        """
+        logging.debug("List application statuses")
+        return dict(self._scan_statuses())
+
+    def _scan_statuses(self, limit=None, start_after=None):
+        row_start = None if start_after is None else encode(start_after) + b'\x00'
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
-            result = [decode(key) for key, data in table.scan(columns=[b'cf:status']) if decode(data[b'cf:status']) != ApplicationState.NOTCREATED]
-        finally:
-            connection.close()
-        return result
+            for key, data in table.scan(row_start=row_start,
+                                        columns=[b'cf:status'],
+                                        filter=self.CREATED_APPLICATIONS_FILTER,
+                                        limit=limit,
+                                        batch_size=self.SCAN_BATCH_SIZE):
+                yield decode(key), decode(data.get(b'cf:status'))
 
     def list_applications_for_package(self, package_name):
         logging.debug("List applications for package %s", package_name)
+        self._ensure_package_index()
 
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
+            index_table = connection.table(self._package_index_table_name)
+            indexed = sorted(column.split(b':', 1)[1] for column in index_table.row(encode(package_name)))
+            if not indexed:
+                return []
             table = connection.table(self._table_name)
-            result = [key for key, data in table.scan(columns=[b'cf:package_name', b'cf:status'])
-                      if decode(data[b'cf:package_name']) == package_name and decode(data[b'cf:status']) != ApplicationState.NOTCREATED]
-        finally:
-            connection.close()
-        return result
+            rows = [(key, data) for key, data in table.rows(indexed, columns=[b'cf:status', b'cf:package_name'])
+                    if data.get(b'cf:package_name') == encode(package_name)]
+            # an index entry can outlive its application if deleting it failed part way, or was done before the
+            # index was kept up to date, so prune entries for applications that are gone or now use another package
+            stale = set(indexed) - set(key for key, _ in rows)
+            if stale:
+                logging.debug("Removing applications %s from index of %s", list(stale), package_name)
+                index_table.delete(encode(package_name), columns=[b'cf:' + key for key in stale])
+        return [decode(key) for key, data in rows if decode(data[b'cf:status']) != ApplicationState.NOTCREATED]
+
+    def _ensure_package_index(self):
+        """
+        Populates the package index from a full scan of the applications table the first time it is used
+        """
+        if self._package_index_built:
+            return
+        with self._package_index_lock:
+            if self._package_index_built:
+                return
+            with self._connection_pool.connection() as connection:
+                index_table = connection.table(self._package_index_table_name)
+                if not index_table.row(encode(self.PACKAGE_INDEX_BUILT_ROW)):
+                    logging.info("Building index of applications by package")
+                    table = connection.table(self._table_name)
+                    with index_table.batch() as batch:
+                        for key, data in table.scan(columns=[b'cf:package_name']):
+                            batch.put(data[b'cf:package_name'], {b'cf:' + key: b''})
+                    index_table.put(encode(self.PACKAGE_INDEX_BUILT_ROW), {b'cf:built': b'true'})
+            self._package_index_built = True
 
     def generate_record(self, application_name, package_name, overrides, defaults):
         return application_name, {
@@ -129,18 +226,12 @@ class HbaseApplicationRegistrar(object):
         }
 
     def _read_from_db(self, key):
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
             data = table.row(encode(key))
-        finally:
-            connection.close()
         return decode(data)
 
     def _write_to_db(self, key, data):
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
             table.put(encode(key), encode(data))
-        finally:
-            connection.close()
@@ -1,50 +1,46 @@
 import json
 import logging
-import happybase
 from thriftpy2.transport import TTransportException
 from Hbase_thrift import AlreadyExists
 
+from hbase_connection_pool import HbaseConnectionPool
+
 #pylint: disable=E0602
 
 class HBaseAppplicationSummary(object):
-    def __init__(self, hbase_host):
+    def __init__(self, hbase_host, connection_pool=None):
         self._hbase_host = hbase_host
+        self._connection_pool = connection_pool
         self._table_name = 'platform_application_summary'
         if self._hbase_host is not None:
+            if self._connection_pool is None:
+                self._connection_pool = HbaseConnectionPool(self._hbase_host)
             try:
-                connection = happybase.Connection(self._hbase_host)
-                connection.create_table(self._table_name, {'cf': dict()})
+                with self._connection_pool.connection() as connection:
+                    connection.create_table(self._table_name, {'cf': dict()})
                 logging.debug("applications summary table created")
             except AlreadyExists as error_message:
                 logging.debug("applications summary table already exists")
             except TTransportException as error_message:
                 logging.error(str(error_message))
-            finally:
-                connection.close()
 
     def sync_with_dm(self, app_list):
-        connection = None
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table(self._table_name)
-            for application, _ in table.scan():
-                if application not in app_list:
-                    table.delete(application)
+            with self._connection_pool.connection() as connection:
+                table = connection.table(self._table_name)
+                for application, _ in table.scan():
+                    if application not in app_list:
+                        table.delete(application)
         except TTransportException as error_message:
             logging.error(str(error_message))
-        finally:
-            connection.close()
 
     def write_to_hbase(self, application, summary):
-        connection = None
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table(self._table_name)
-            table.put(application, summary)
+            with self._connection_pool.connection() as connection:
+                table = connection.table(self._table_name)
+                table.put(application, summary)
         except TTransportException as error_message:
             logging.error(str(error_message))
-        finally:
-            connection.close()
 
     def post_to_hbase(self, summary, application):
         data = {}
@@ -58,39 +54,33 @@ class HBaseAppplicationSummary(object):
         self.write_to_hbase(application, data)
 
     def _read_from_db(self, key):
-        connection = None
+        data = None
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table(self._table_name)
-            data = table.row(key)
+            with self._connection_pool.connection() as connection:
+                table = connection.table(self._table_name)
+                data = table.row(key)
         except TTransportException as error_message:
             logging.error(str(error_message))
-        finally:
-            connection.close()
         return data
 
     def get_dm_data(self, key):
-        connection = None
+        data = None
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table("platform_applications")
-            data = table.row(key)
+            with self._connection_pool.connection() as connection:
+                table = connection.table("platform_applications")
+                data = table.row(key)
         except TTransportException as error_message:
             logging.error(str(error_message))
-        finally:
-            connection.close()
         return data
 
     def get_dm_status(self, key):
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table("platform_applications")
-            row = table.row(key, columns=[b'cf:status'])
-            status = row[b'cf:status']
+            with self._connection_pool.connection() as connection:
+                table = connection.table("platform_applications")
+                row = table.row(key, columns=[b'cf:status'])
+                status = row[b'cf:status']
         except TTransportException as error_message:
             logging.error(str(error_message))
-        finally:
-            connection.close()
         return status.decode()
 
     def get_flink_job_id(self, key):
@@ -1,8 +1,8 @@
 """
 Name:       asynch_dispatcher
 Purpose:    A module responsible for running blocking tasks as asynchronous tasks
-            For now, it simply wraps a Threadpool,
-            Later this might be switched a more advanced library.
+            Tasks are queued on named lanes, each with its own worker threads and bounded queue,
+            so that slow tasks on one lane never hold up the tasks queued on another.
 
 Author:     PNDA team
 
@@ -24,7 +24,69 @@ either express or implied.
 """
 import traceback
 import logging
-from multiprocessing.dummy import Pool as ThreadPool
+import itertools
+import threading
+import time
+import Queue
+
+from exceptiondef import Overloaded
+
+DEFAULT_LANE = 'default'
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Lane(object):
+    """
+    Describes a queue of tasks and the threads that work through it
+    """
+
+    def __init__(self, name, num_threads, max_queue=0, timeout=None):
+        """
+        :param name: what tasks pass as 'lane' to be run on this lane
+        :param num_threads: the number of tasks from this lane that may run at once
+        :param max_queue: the number of tasks that may wait for a thread before new ones are rejected, 0 for no limit
+        :param timeout: the default number of seconds a task may wait for a thread, None to wait forever
+        """
+        self.name = name
+        self.num_threads = num_threads
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+
+class _LaneMetrics(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def started(self, wait_time):
+        with self.lock:
+            self.running += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def finished(self, counter):
+        with self.lock:
+            self.running -= 1
+            setattr(self, counter, getattr(self, counter) + 1)
 
 
 class AsyncDispatcher(object):
@@ -32,55 +94,93 @@ class AsyncDispatcher(object):
     Runs blockiong calls as synchronous tasks
     """
 
-    def __init__(self, num_threads=50):
-        self.pool = ThreadPool(processes=num_threads)
+    def __init__(self, num_threads=50, lanes=None):
+        """
+        :param num_threads: the number of threads on the default lane, used when lanes is not given
+        :param lanes: a list of Lane objects describing the lanes to create
+        """
+        if lanes is None:
+            lanes = [Lane(DEFAULT_LANE, num_threads)]
+        self._lanes = {}
+        self._metrics = {}
+        self._sequence = itertools.count()
+        for lane in lanes:
+            self._lanes[lane.name] = (lane, Queue.PriorityQueue(maxsize=lane.max_queue))
+            self._metrics[lane.name] = _LaneMetrics()
+            for index in range(lane.num_threads):
+                worker = threading.Thread(target=self._work, args=(lane.name,), name='%s-%s' % (lane.name, index))
+                worker.daemon = True
+                worker.start()
 
-    def run_as_asynch(self, task, on_success=None, on_error=None, on_complete=None):
+    def run_as_asynch(self, task, on_success=None, on_error=None, on_complete=None,
+                      lane=DEFAULT_LANE, priority=PRIORITY_NORMAL, timeout=None):
         """
         Transforms a blocking call into an asynchronous task
         :param task: a function to run
+        :param on_success: a function to call with the return value of the task if it succeeds
+        :param on_error: a function to call with the exception raised by the task if it fails,
+            or with an Overloaded exception if it could not be started before its timeout
         :param on_complete: a function to call when the task has finished running.
-            Said function should accept the return value of the synchrouns task.
-        :return:
+        :param lane: the name of the lane to queue the task on
+        :param priority: tasks with a lower priority value are started first
+        :param timeout: seconds the task may wait on the queue before it is abandoned, None for the lane default
+        :return: a ScheduledTask
+        :raises Overloaded: if the lane queue is full
         """
+        lane_config, queue = self._lanes[lane]
+        if timeout is None:
+            timeout = lane_config.timeout
+        deadline = None if timeout is None else time.time() + timeout
+        scheduled = ScheduledTask(task, on_success, on_error, on_complete, deadline)
+        try:
+            queue.put((priority, next(self._sequence), scheduled), False)
+        except Queue.Full:
+            self._metrics[lane].count('rejected')
+            logging.warning("Rejecting task, the %s queue is full", lane)
+            raise Overloaded("Too many requests are queued, try again later")
+        self._metrics[lane].count('submitted')
+        return scheduled
 
-        def task_wrapper():
-            """
-            encapsulates tasks to catch their errors,
-            as threadpool does not contain asynch error reporting by default
-            """
-            try:
-                return task()
-            except Exception as ex:
-                logging.error(traceback.format_exc())
-                # report asynchronous exception:
-                if on_error:
-                    # call callback on result thread (this is the worker thread)
-                    self.pool.apply_async(on_error, args=(ex,))
-                # call the completion handler:
-                if on_complete:
-                    # call callback on result thread (this is the worker thread)
-                    self.pool.apply_async(on_complete)
-                # re-throw execution exeption to get function
-                raise Exception(ex)
-
-        def success_wrapper(result):
-            """
-            called asynchronously when the task has finished running successfully
-            """
-            # This handler is called on the result thread,
-            # so there is no need to reschedule the callback
-            #
-            # report success:
-            if on_success:
-                on_success(result)
-            # report that task is completed
-            if on_complete:
-                on_complete()
-
-        # run the task on a different thread:
-        result = self.pool.apply_async(task_wrapper, callback=success_wrapper)
-        return ScheduledTask(result)
+    def metrics(self):
+        """
+        :return: a dictionary of counters and timings for each lane
+        """
+        result = {}
+        for name, (lane, queue) in self._lanes.items():
+            metrics = self._metrics[name]
+            with metrics.lock:
+                started = metrics.completed + metrics.failed + metrics.running
+                result[name] = {
+                    'threads': lane.num_threads,
+                    'max_queue': lane.max_queue,
+                    'queue_depth': queue.qsize(),
+                    'running': metrics.running,
+                    'submitted': metrics.submitted,
+                    'rejected': metrics.rejected,
+                    'expired': metrics.expired,
+                    'cancelled': metrics.cancelled,
+                    'completed': metrics.completed,
+                    'failed': metrics.failed,
+                    'wait_time_avg': metrics.wait_time_total / started if started else 0.0,
+                    'wait_time_max': metrics.wait_time_max
+                }
+        return result
+
+    def _work(self, lane):
+        _, queue = self._lanes[lane]
+        metrics = self._metrics[lane]
+        while True:
+            _, _, scheduled = queue.get()
+            wait_time = time.time() - scheduled.submitted
+            if not scheduled.start():
+                metrics.count('cancelled')
+            elif scheduled.deadline is not None and time.time() > scheduled.deadline:
+                logging.warning("Abandoning task that waited %.1fs on the %s queue", wait_time, lane)
+                metrics.count('expired')
+                scheduled.fail(Overloaded("Request timed out waiting to be run, try again later"))
+            else:
+                metrics.started(wait_time)
+                metrics.finished('completed' if scheduled.run() else 'failed')
 
 
 class ScheduledTask(object):
@@ -89,12 +189,76 @@ class ScheduledTask(object):
     This attempts to decouple the task from any particular execution framework
     """
 
-    def __init__(self, task):
+    def __init__(self, task, on_success=None, on_error=None, on_complete=None, deadline=None):
         self.task = task
+        self.deadline = deadline
+        self.submitted = time.time()
+        self._on_success = on_success
+        self._on_error = on_error
+        self._on_complete = on_complete
+        self._lock = threading.Lock()
+        self._started = False
+        self._cancelled = False
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
 
-    def get_result(self):
+    def cancel(self):
+        """
+        Stops the task from running if it has not started yet
+        :return: True if the task will not be run
+        """
+        with self._lock:
+            if not self._started:
+                self._cancelled = True
+                self._error = TaskCancelled()
+                self._done.set()
+            return self._cancelled
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._done.is_set()
+
+    def get_result(self, timeout=None):
         """
         Blocks until result is avaiable
         :return: the value returned by the worker task
+        :raises: the exception raised by the worker task, or TaskCancelled
         """
-        return self.task.get()
+        self._done.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def start(self):
+        with self._lock:
+            self._started = not self._cancelled
+            return self._started
+
+    def run(self):
+        try:
+            self._result = self.task()
+        except Exception as ex:
+            logging.error(traceback.format_exc())
+            self.fail(ex)
+            return False
+        self._notify(self._on_success, self._result)
+        self._notify(self._on_complete)
+        self._done.set()
+        return True
+
+    def fail(self, ex):
+        self._error = ex
+        self._notify(self._on_error, ex)
+        self._notify(self._on_complete)
+        self._done.set()
+
+    @staticmethod
+    def _notify(callback, *args):
+        if callback:
+            try:
+                callback(*args)
+            except Exception:
+                logging.error(traceback.format_exc())
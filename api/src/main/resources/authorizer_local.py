@@ -21,21 +21,68 @@ Unless required by applicable law or agreed to separately in writing, software d
 License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
 either express or implied.
 """
+
+import hashlib
 import logging
-import json
+import threading
+import time
 import yaml
 from authorizer import Authorizer
 
+RULES_FILE = 'authorizer_rules.yaml'
+
+
+def _freeze(attributes):
+    '''
+    Converts a dictionary of attributes to something hashable, so that it can be part of a cache key
+    '''
+    return tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                        for name, value in attributes.items()))
+
+
+class _CompiledRules(object):
+    '''
+    The grant rules compiled to code objects, along with the decisions made using them
+    '''
+    def __init__(self, rules):
+        self.rules = rules
+        self.sets = rules['sets']
+        self.grants = [(grant_rule, compile(grant_rule, '<grant rule %s>' % index, 'eval'))
+                       for index, grant_rule in enumerate(rules['rules']['grant'])]
+        self.decisions = {}
+
+
 class AuthorizerLocal(Authorizer):
     '''
     Authorizer implementation that validates requests based on locally defined rules
     '''
-    def __init__(self):
+    MAX_DECISIONS = 10000
+
+    def __init__(self, rules_path=RULES_FILE, check_interval=None):
         '''
         Initialise the authorizer by loading the rules file
+        Parameters:
+         - rules_path: the yaml file the rules are read from
+         - check_interval: seconds between checks for changes to the rules file, None to never reload it
+        '''
+        self._rules_path = rules_path
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = time.time() + (check_interval or 0)
+        contents = self._read_rules_file()
+        self.set_rules(yaml.safe_load(contents))
+        self._rules_digest = hashlib.sha1(contents).hexdigest()
+
+    @property
+    def _rules(self):
+        return self._compiled.rules
+
+    def set_rules(self, rules):
         '''
-        with open('authorizer_rules.yaml') as rules_file:
-            self._rules = yaml.load(rules_file)
+        Replaces the rules in use, discarding every decision made with the old rules
+        A rule that does not compile raises SyntaxError and leaves the old rules in place.
+        '''
+        self._compiled = _CompiledRules(rules)
 
     def authorize(self, identity, resource, action):
         '''
@@ -45,15 +92,25 @@ class AuthorizerLocal(Authorizer):
          - resource: dictionary of attributes defining the resource that access is required for
          - action: dictionary of attributes defining the action being performed
         '''
-        logging.debug("authorize: identity:%s, resource:%s, action:%s", json.dumps(identity), json.dumps(resource), json.dumps(action))
-        sets = self._rules['sets']
-        logging.debug("sets: %s", json.dumps(sets))
+        self._reload_if_changed()
+        compiled = self._compiled
+        try:
+            key = (_freeze(identity), _freeze(resource), _freeze(action))
+            hash(key)
+        except TypeError:
+            # an attribute is not hashable, so the decision cannot be cached
+            key = None
+        if key is not None:
+            authorize = compiled.decisions.get(key)
+            if authorize is not None:
+                return authorize
+
+        logging.debug("authorize: identity:%s, resource:%s, action:%s", identity, resource, action)
         authorize = False
-        for grant_rule in self._rules['rules']['grant']:
-            logging.debug("checking rule: %s", grant_rule)
+        for grant_rule, code in compiled.grants:
             try:
                 #pylint: disable=eval-used
-                if eval(grant_rule):
+                if eval(code, {'sets': compiled.sets, 'identity': identity, 'resource': resource, 'action': action}):
                     authorize = True
                     logging.debug("authorize: %s for %s", authorize, grant_rule)
                     break
@@ -63,4 +120,34 @@ class AuthorizerLocal(Authorizer):
         if not authorize:
             logging.debug("authorize: %s", authorize)
 
+        if key is not None:
+            with self._lock:
+                if len(compiled.decisions) >= self.MAX_DECISIONS:
+                    compiled.decisions.clear()
+                compiled.decisions[key] = authorize
         return authorize
+
+    def _reload_if_changed(self):
+        if not self._check_interval or time.time() < self._next_check:
+            return
+        with self._lock:
+            if time.time() < self._next_check:
+                return
+            self._next_check = time.time() + self._check_interval
+            try:
+                # the contents are compared rather than the modification time, which may not change
+                # if the file is edited within the same second it was last loaded
+                contents = self._read_rules_file()
+                digest = hashlib.sha1(contents).hexdigest()
+                if digest == self._rules_digest:
+                    return
+                self.set_rules(yaml.safe_load(contents))
+                self._rules_digest = digest
+                logging.info("reloaded authorization rules from %s", self._rules_path)
+            except Exception as ex:
+                # keep using the rules that were last loaded successfully
+                logging.error("failed to reload authorization rules from %s: %s", self._rules_path, str(ex))
+
+    def _read_rules_file(self):
+        with open(self._rules_path) as rules_file:
+            return rules_file.read()
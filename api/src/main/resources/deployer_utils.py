@@ -21,22 +21,31 @@ either express or implied.
 """
 
 import os
+import posixpath
+import shutil
+import uuid
 import tarfile
 from io import BytesIO
 import logging
 import traceback
 import time
+import urllib
+import Queue
 from threading import Thread
+from multiprocessing.dummy import Pool as ThreadPool
 
 import requests
 import spur
 from pywebhdfs.webhdfs import PyWebHdfsClient
+from pywebhdfs.errors import PyWebHdfsException
+from ssh_connection_pool import SshConnectionPool
+import http_session_pool
 
 def get_nameservice(cm_host, cluster_name, service_name, user_name='admin', password='admin'):
     request_url = 'http://%s:7180/api/v11/clusters/%s/services/%s/nameservices' % (cm_host,
                                                                                    cluster_name,
                                                                                    service_name)
-    result = requests.get(request_url, auth=(user_name, password))
+    result = http_session_pool.get(request_url, auth=(user_name, password))
     nameservice = ""
     if result.status_code == 200:
         response = result.json()
@@ -94,7 +103,7 @@ def ambari_request(ambari, uri):
 
     headers = {'X-Requested-By': hadoop_manager_username}
     auth = (hadoop_manager_username, hadoop_manager_password)
-    return requests.get(full_uri, auth=auth, headers=headers).json()
+    return http_session_pool.get(full_uri, auth=auth, headers=headers).json()
 
 def get_hdfs_hdp(ambari, cluster_name):
     core_site = ambari_request(ambari, '/clusters/%s?fields=Clusters/desired_configs/core-site' % cluster_name)
@@ -188,6 +197,16 @@ def tree(archive_filepath):
 
     return root
 
+def unshare_file(path):
+    """
+    Staged packages are hard linked to a pristine extracted copy of the package, so any staged file must be
+    given its own copy of its contents with this before it is rewritten or replaced
+    """
+    if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+        private_path = '%s.%s' % (path, uuid.uuid4())
+        shutil.copy2(path, private_path)
+        os.rename(private_path, path)
+
 def canonicalize(path):
     path = path.replace('\\', '/')
     path = path.replace('//', '/')
@@ -195,43 +214,98 @@ def canonicalize(path):
 
 
 class HDFS(object):
+    UPLOAD_THREADS = 8
+    # files bigger than this are streamed from disk instead of being read into memory to upload
+    STREAM_THRESHOLD = 4 * 1024 * 1024
+
     def __init__(self, host, port, user):
         self._hdfs = PyWebHdfsClient(
             host=host, port=port, user_name=user, timeout=None)
+        self._base_uri = 'http://%s:%s/webhdfs/v1' % (host, port)
+        self._user = user
         logging.debug('webhdfs = %s@%s:%s', user, host, port)
 
-    def recursive_copy(self, local_path, remote_path, exclude=None, permission=755):
-
+    def recursive_copy(self, local_path, remote_path, exclude=None, permission=755, threads=UPLOAD_THREADS):
+        """
+        Copies a local directory tree to HDFS, making the directories and then uploading the files
+        with a pool of workers that each keep their own HTTP session open across requests
+        The sessions do not retry, as an upload streamed from disk cannot be sent again, but every request
+        has the shared HTTP timeouts so that a stalled namenode or datanode cannot hold a worker forever.
+        """
         if exclude is None:
             exclude = []
 
-        c_path = canonicalize(remote_path)
-        logging.debug('making %s', c_path)
-        self._hdfs.make_dir(c_path, permission=permission)
-
-        fs_g = os.walk(local_path)
-        for dpath, dnames, fnames in fs_g:
+        directories = set([canonicalize(remote_path).rstrip('/')])
+        files = []
+        for dpath, dnames, fnames in os.walk(local_path):
             _, relative_path = dpath.split(local_path)
             for dname in dnames:
                 if dname not in exclude:
-                    c_path = canonicalize(
-                        '%s/%s/%s' %
-                        (remote_path, relative_path, dname))
-                    logging.debug('making %s', c_path)
-                    self._hdfs.make_dir(c_path, permission=permission)
-
+                    directories.add(canonicalize('%s/%s/%s' % (remote_path, relative_path, dname)).rstrip('/'))
             for fname in fnames:
                 if fname not in exclude:
-                    data = file(
-                        canonicalize(
-                            '%s/%s/%s' %
-                            (local_path, relative_path, fname)), 'rb')
-                    c_path = canonicalize(
-                        '%s/%s/%s' %
-                        (remote_path, relative_path, fname))
-                    logging.debug('creating %s', c_path)
-                    self._hdfs.create_file(c_path, data, overwrite=True, permission=permission)
-                    data.close()
+                    files.append((canonicalize('%s/%s/%s' % (local_path, relative_path, fname)),
+                                  canonicalize('%s/%s/%s' % (remote_path, relative_path, fname))))
+
+        # MKDIRS makes any missing parents, so only the deepest directories need to be made
+        leaf_directories = directories - set(posixpath.dirname(path) for path in directories)
+
+        sessions = Queue.Queue()
+        for _ in range(threads):
+            sessions.put(requests.Session())
+
+        def with_session(upload):
+            def run(args):
+                session = sessions.get()
+                try:
+                    return upload(session, *args)
+                finally:
+                    sessions.put(session)
+            return run
+
+        pool = ThreadPool(processes=threads)
+        try:
+            pool.map(with_session(lambda session, path: self._make_dir(session, path, permission)),
+                     [(path,) for path in sorted(leaf_directories)])
+            pool.map(with_session(lambda session, local, remote: self._upload_file(session, local, remote, permission)),
+                     files)
+        finally:
+            pool.close()
+            pool.join()
+            while not sessions.empty():
+                sessions.get().close()
+
+    def _make_dir(self, session, path, permission):
+        logging.debug('making %s', path)
+        response = session.put(self._uri(path),
+                               params={'op': 'MKDIRS', 'permission': permission, 'user.name': self._user},
+                               timeout=http_session_pool.SESSION_POOL.timeout)
+        if response.status_code != requests.codes.ok:
+            raise PyWebHdfsException(msg='Failed to make %s: %s' % (path, response.content))
+
+    def _upload_file(self, session, local_path, remote_path, permission):
+        logging.debug('creating %s', remote_path)
+        # the namenode redirects the upload to the datanode that will store the first block
+        response = session.put(self._uri(remote_path),
+                               params={'op': 'CREATE', 'overwrite': 'true', 'permission': permission,
+                                       'user.name': self._user},
+                               allow_redirects=False, timeout=http_session_pool.SESSION_POOL.timeout)
+        if response.status_code != requests.codes.temporary_redirect:
+            raise PyWebHdfsException(msg='Failed to create %s: %s' % (remote_path, response.content))
+
+        with open(local_path, 'rb') as local_file:
+            if os.fstat(local_file.fileno()).st_size > self.STREAM_THRESHOLD:
+                data = local_file
+            else:
+                data = local_file.read()
+            response = session.put(response.headers['location'], data=data,
+                                   headers={'content-type': 'application/octet-stream'},
+                                   timeout=http_session_pool.SESSION_POOL.timeout)
+        if response.status_code != requests.codes.created:
+            raise PyWebHdfsException(msg='Failed to upload %s: %s' % (remote_path, response.content))
+
+    def _uri(self, path):
+        return '%s/%s' % (self._base_uri, urllib.quote(path.lstrip('/')))
 
     def make_dir(self, path, permission=755):
 
@@ -290,22 +364,69 @@ class HDFS(object):
         except:
             return False
 
-def exec_ssh(host, user, key, ssh_commands):
-    shell = spur.SshShell(
-        hostname=host,
-        username=user,
-        private_key_file=key,
-        missing_host_key=spur.ssh.MissingHostKey.accept)
-    with shell:
-        for ssh_command in ssh_commands:
-            logging.debug('Host - %s: Command - %s', host, ssh_command)
-            try:
-                shell.run(["bash", "-c", ssh_command])
-            except spur.results.RunProcessError as exception:
-                logging.error(
-                    ssh_command +
-                    " - error: " +
-                    traceback.format_exc(exception))
+SSH_POOL = SshConnectionPool()
+BATCH_FAILURE_MARKER = 'exec_ssh: command failed:'
+
+
+def exec_ssh(host, user, key, ssh_commands, batch=True, check=False):
+    """
+    Runs commands on a host over a pooled SSH connection, logging rather than raising if any of them fail
+    Every command is run even if earlier ones fail. In batch mode they are all run by one remote bash,
+    otherwise each command is run on its own. Either way each command runs in its own shell, so a cd,
+    exit or variable in one command does not affect the commands after it.
+    :param check: raise the spur.results.RunProcessError of a failed command once every command has been run
+    """
+    error = None
+    with SSH_POOL.shell(host, user, key) as shell:
+        if batch and len(ssh_commands) > 1:
+            error = _exec_ssh_batch(shell, host, ssh_commands)
+        else:
+            for ssh_command in ssh_commands:
+                logging.debug('Host - %s: Command - %s', host, ssh_command)
+                try:
+                    shell.run(["bash", "-c", ssh_command])
+                except spur.results.RunProcessError as exception:
+                    logging.error(
+                        ssh_command +
+                        " - error: " +
+                        traceback.format_exc(exception))
+                    error = exception
+    if check and error is not None:
+        raise error
+
+
+def _exec_ssh_batch(shell, host, ssh_commands):
+    """
+    :return: the spur.results.RunProcessError raised if any of the commands failed, otherwise None
+    """
+    script = ['status=0']
+    for index, ssh_command in enumerate(ssh_commands):
+        logging.debug('Host - %s: Command - %s', host, ssh_command)
+        script.append('( %s\n) || { status=1; echo "%s%d" >&2; }' % (ssh_command, BATCH_FAILURE_MARKER, index))
+    script.append('exit $status')
+    try:
+        shell.run(["bash", "-c", '\n'.join(script)])
+    except spur.results.RunProcessError as exception:
+        stderr_output = exception.stderr_output
+        if isinstance(stderr_output, bytes):
+            stderr_output = stderr_output.decode('utf-8', 'replace')
+        failed = [int(line[len(BATCH_FAILURE_MARKER):]) for line in stderr_output.splitlines()
+                  if line.startswith(BATCH_FAILURE_MARKER)]
+        for index in failed or range(len(ssh_commands)):
+            logging.error("%s - error: %s", ssh_commands[index], stderr_output)
+        return exception
+    return None
+
+
+def upload_file(host, user, key, local_path, remote_path):
+    """
+    Copies a local file to a host over SFTP on a pooled SSH connection
+    """
+    logging.debug('Host - %s: Upload - %s to %s', host, local_path, remote_path)
+    with SSH_POOL.shell(host, user, key) as shell:
+        with open(local_path, 'rb') as local_file:
+            with shell.open(remote_path, 'wb') as remote_file:
+                shutil.copyfileobj(local_file, remote_file)
 
 
 def dict_to_props(dict_props):
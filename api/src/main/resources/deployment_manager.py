@@ -27,15 +27,16 @@ import time
 import datetime
 import threading
 import traceback
-import grp
-import pwd
-import requests
+from contextlib import contextmanager
 
 import application_creator
 import authorizer_local
-from exceptiondef import ConflictingState, NotFound, Forbidden
+import http_session_pool
+from exceptiondef import ConflictingState, NotFound, Forbidden, FailedValidation, DmException
 from package_parser import PackageParser
 from async_dispatcher import AsyncDispatcher
+from group_resolver import create_group_resolver
+from striped_lock import StripedLock
 from lifecycle_states import ApplicationState, PackageDeploymentState
 
 
@@ -60,6 +61,76 @@ class Actions(object):
     DESTROY = "destroy"
     READ = "read"
 
+
+class BatchStatus(object):
+    ACCEPTED = "ACCEPTED"
+    REJECTED = "REJECTED"
+
+
+class _StagedPackage(object):
+    """
+    A package fetched to local disk, shared by the application creates that use it and
+    removed once they have all finished
+    """
+
+    def __init__(self, path, digest):
+        self.path = path
+        self.digest = digest
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0:
+                os.remove(self.path)
+
+
+class ApplicationSnapshot(object):
+    """
+    The stored record of an application, read once and reused for the rest of a request
+    """
+
+    def __init__(self, name, record):
+        self.name = name
+        self.record = record
+
+    @property
+    def exists(self):
+        return self.record is not None
+
+    @property
+    def owner(self):
+        if self.record is None:
+            return None
+        return self.record['overrides']['user']
+
+
+class PackageSnapshot(object):
+    """
+    The stored metadata and deploy status of a package, read once and reused for the rest of a request
+    """
+
+    def __init__(self, name, metadata, deploy_status):
+        self.name = name
+        self.metadata = metadata
+        self.deploy_status = deploy_status
+
+    @property
+    def exists(self):
+        return self.metadata is not None
+
+    @property
+    def owner(self):
+        if self.metadata is None:
+            return None
+        return self.metadata['metadata']['user']
+
+
 class DeploymentManager(object):
     def __init__(self, repository, package_registrar, application_registrar, application_summary_registrar, environment, config):
         self._repository = repository
@@ -72,30 +143,42 @@ class DeploymentManager(object):
         self._application_summary_registrar = application_summary_registrar
         self._package_parser = PackageParser()
         self._package_progress = {}
-        self._lock = threading.RLock()
-        self._authorizer = authorizer_local.AuthorizerLocal()
+        self._progress_lock = threading.Lock()
+        # held while checking and marking the state of a package or application, see _package_key and _application_key
+        self._locks = StripedLock(config.get('lock_stripes', StripedLock.DEFAULT_STRIPES))
+        # how long an operation can hold an application before another deployment manager may take it over
+        self._operation_timeout = config.get('application_operation_timeout', 3600)
+        self._authorizer = authorizer_local.AuthorizerLocal(
+            check_interval=config.get('authorizer_rules_check_interval', 10))
+        self.group_resolver = create_group_resolver(config)
 
         # load number of threads from config file:
         number_of_threads = self._config["deployer_thread_limit"]
         assert isinstance(number_of_threads, (int))
         assert number_of_threads > 0
         self.dispatcher = AsyncDispatcher(num_threads=number_of_threads)
-        self.rest_client = requests
+        self.rest_client = http_session_pool
 
     def _get_groups(self, user):
         groups = []
         if user:
             try:
-                groups = [g.gr_name for g in grp.getgrall() if user in g.gr_mem]
-                gid = pwd.getpwnam(user).pw_gid
-                groups.append(grp.getgrgid(gid).gr_name)
+                groups = self.group_resolver.get_groups(user)
             except:
                 raise Forbidden('Failed to find details for user "%s"' % user)
         return groups
 
-    def _authorize(self, user_name, resource_type, resource_owner, action_name):
+    def _authorize(self, user_name, resource_type, resource_owner, action_name, identities=None):
+        """
+        :param identities: optionally caches the identity of each user, so that a batch of operations
+            only looks up the groups of its user once
+        """
         qualified_action = '%s:%s' % (resource_type, action_name)
-        identity = {'user': user_name, 'groups': self._get_groups(user_name)}
+        if identities is None:
+            identities = {}
+        if user_name not in identities:
+            identities[user_name] = {'user': user_name, 'groups': self._get_groups(user_name)}
+        identity = identities[user_name]
         resource = {'type': resource_type, 'owner': resource_owner}
         action = {'name': qualified_action}
         if not self._authorizer.authorize(identity, resource, action):
@@ -111,8 +194,8 @@ class DeploymentManager(object):
         deployed = self._package_registrar.list_packages()
         return deployed
 
-    def _assert_package_status(self, package, required_status):
-        status = self.get_package_info(package)['status']
+    def _assert_package_status(self, package, required_status, snapshot=None):
+        status = self.get_package_info(package, snapshot=snapshot)['status']
         if status != required_status:
             if status == PackageDeploymentState.NOTDEPLOYED:
                 raise NotFound(json.dumps({'status': status}))
@@ -125,29 +208,31 @@ class DeploymentManager(object):
         available = self._repository.get_package_list(user_name, recency)
         return available
 
-    def _get_saved_package_data(self, package):
-        package_owner = None
-        package_exists = False
-        package_metadata = None
-        if self._package_registrar.package_exists(package):
-            package_metadata = self._package_registrar.get_package_metadata(package)
-            logging.debug(package_metadata)
-            package_owner = package_metadata['metadata']['user']
-            package_exists = True
-        return package_owner, package_exists, package_metadata
-
-    def _get_package_owner(self, package):
-        package_owner, _, _ = self._get_saved_package_data(package)
-        return package_owner
-
-    def _get_application_owner(self, application):
-        application_owner = None
-        if self._application_registrar.application_has_record(application):
-            application_owner = self._application_registrar.get_application(application)['overrides']['user']
-        return application_owner
-
-    def get_package_info(self, package, user_name=None):
-        package_owner, package_exists, metadata = self._get_saved_package_data(package)
+    def snapshot_package(self, package):
+        """
+        Reads everything stored about a package in one go
+        :param package: the name of the package
+        :return: a PackageSnapshot that can be passed to the other package methods of this class
+        """
+        # None if the package has not been deployed
+        package_metadata = self._package_registrar.get_package_metadata(package)
+        logging.debug(package_metadata)
+        deploy_status = self._package_registrar.get_package_deploy_status(package)
+        return PackageSnapshot(package, package_metadata, deploy_status)
+
+    def snapshot_application(self, application):
+        """
+        Reads the stored record of an application in one go
+        :param application: the name of the application
+        :return: an ApplicationSnapshot that can be passed to the other application methods of this class
+        """
+        return ApplicationSnapshot(application, self._application_registrar.get_application(application))
+
+    def get_package_info(self, package, user_name=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot_package(package)
+        package_owner = snapshot.owner
+        metadata = snapshot.metadata
         if user_name is not None:
             self._authorize(user_name, Resources.PACKAGES, package_owner, Actions.READ)
         information = None
@@ -160,12 +245,12 @@ class DeploymentManager(object):
         else:
             # package deploy is not in progress:
             # get last package status from database
-            deploy_status = self._package_registrar.get_package_deploy_status(package)
+            deploy_status = snapshot.deploy_status
             if deploy_status:
                 status = deploy_status["state"]
                 information = deploy_status["information"]
             # check if package data exists in database:
-            if package_exists:
+            if snapshot.exists:
                 properties = self._package_parser.properties_from_metadata(metadata['metadata'])
                 status = PackageDeploymentState.DEPLOYED
                 name = metadata['name']
@@ -193,11 +278,13 @@ class DeploymentManager(object):
         :param initial_state: The state to check before beginning work on the package
         :param working_state: The state to set while the package operation is being carried out.
         :param task: The actual work to be carried out
+        :param auth_check: Called with a PackageSnapshot of the package to authorize the operation
         """
-        with self._lock:
+        with self._locks.locked(self._package_key(package_name)):
+            snapshot = self.snapshot_package(package_name)
             # check that package is in the right state before starting operation:
-            self._assert_package_status(package_name, initial_state)
-            auth_check()
+            self._assert_package_status(package_name, initial_state, snapshot)
+            auth_check(snapshot)
             # set the operation state before starting:
             self._set_package_progress(package_name, working_state)
 
@@ -215,10 +302,14 @@ class DeploymentManager(object):
                 self._state_change_event_package(package_name)
 
         # run everything on a background thread:
-        self.dispatcher.run_as_asynch(task=do_work_and_report_progress)
+        try:
+            self.dispatcher.run_as_asynch(task=do_work_and_report_progress)
+        except Exception:
+            self._clear_package_progress(package_name)
+            raise
 
     def deploy_package(self, package, user_name):
-        def auth_check():
+        def auth_check(_):
             self._authorize(user_name, Resources.PACKAGE, None, Actions.DEPLOY)
 
         # this function will be executed in the background:
@@ -260,9 +351,8 @@ class DeploymentManager(object):
         return datetime.datetime.utcnow().isoformat()
 
     def undeploy_package(self, package, user_name):
-        def auth_check():
-            package_owner = self._get_package_owner(package)
-            self._authorize(user_name, Resources.PACKAGE, package_owner, Actions.UNDEPLOY)
+        def auth_check(snapshot):
+            self._authorize(user_name, Resources.PACKAGE, snapshot.owner, Actions.UNDEPLOY)
 
         # this function will be executed in the background:
         def do_undeploy():
@@ -298,7 +388,7 @@ class DeploymentManager(object):
         :param state: the state of the background operation
         """
         # currently we are using multiple threads, so this lock is added for thread saftey
-        with self._lock:
+        with self._progress_lock:
             self._package_progress[package_name] = state
 
     def _get_package_progress(self, package_name):
@@ -306,10 +396,8 @@ class DeploymentManager(object):
         :param package_name: The name of the package for which to query progress
         :return: the state of the package
         """
-        with self._lock:
-            if self._is_package_in_progress(package_name):
-                return self._package_progress[package_name]
-            return None
+        with self._progress_lock:
+            return self._package_progress.get(package_name)
 
     def _is_package_in_progress(self, package_name):
         """
@@ -317,13 +405,55 @@ class DeploymentManager(object):
         :param package_name: the name of the package to check
         :return: true if the package is currently being operated on
         """
-        with self._lock:
+        with self._progress_lock:
             return package_name in self._package_progress
 
     def _clear_package_progress(self, package):
-        with self._lock:
+        with self._progress_lock:
             self._package_progress.pop(package, None)
 
+    @staticmethod
+    def _package_key(package):
+        return 'package:%s' % package
+
+    @staticmethod
+    def _application_key(application):
+        return 'application:%s' % application
+
+    @contextmanager
+    def _claim_application(self, application, operation):
+        """
+        Records in HBase that an operation has started on an application, so that no other operation can start
+        on it, in this or any other deployment manager, until the claim is released or times out
+        The claim is released if the with block raises, otherwise the caller must release it once the
+        operation has finished.
+        """
+        if not self._application_registrar.acquire_operation(application, operation, self._operation_timeout):
+            raise ConflictingState(json.dumps({'information': 'Another operation is in progress on %s' % application}))
+        try:
+            yield
+        except Exception:
+            self._application_registrar.release_operation(application)
+            raise
+
+    def _release_application(self, application):
+        """
+        Releases the claim and clears the progress of an operation on an application
+        """
+        self._application_registrar.release_operation(application)
+        self._clear_package_progress(application)
+
+    def _queue_application_work(self, work, abandon):
+        """
+        Queues work prepared for an application to be carried out in the background
+        :param abandon: called if the work cannot be queued, to undo what preparing it left behind
+        """
+        try:
+            self.dispatcher.run_as_asynch(task=work)
+        except Exception:
+            abandon()
+            raise
+
     def _mark_destroying(self, package):
         self._set_package_progress(package, ApplicationState.DESTROYING)
 
@@ -342,15 +472,15 @@ class DeploymentManager(object):
         applications = self._application_registrar.list_applications_for_package(package)
         return applications
 
-    def list_applications(self, user_name):
+    def list_applications(self, user_name, limit=None, start_after=None):
         self._authorize(user_name, Resources.APPLICATIONS, None, Actions.READ)
         logging.info('list_applications')
-        applications = self._application_registrar.list_applications()
+        applications = self._application_registrar.list_applications(limit=limit, start_after=start_after)
         return applications
 
-    def _assert_application_status(self, application, required_status):
+    def _assert_application_status(self, application, required_status, snapshot=None):
         logging.debug("Checking %s is %s", application, json.dumps(required_status))
-        app_info = self.get_application_info(application)
+        app_info = self.get_application_info(application, snapshot=snapshot)
         status = app_info['status']
         logging.debug("Found %s is %s", application, status)
 
@@ -363,17 +493,28 @@ class DeploymentManager(object):
 
         logging.debug("Status for %s is OK", application)
 
-    def _assert_application_exists(self, application):
-        status = self.get_application_info(application)['status']
+    def _assert_application_exists(self, application, snapshot=None):
+        status = self.get_application_info(application, snapshot=snapshot)['status']
         if status == ApplicationState.NOTCREATED:
             raise NotFound(json.dumps({'status': status}))
+        return status
 
     def start_application(self, application, user_name):
         logging.info('start_application')
-        with self._lock:
-            self._assert_application_status(application, ApplicationState.CREATED)
-            application_owner = self._get_application_owner(application)
-            self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.START)
+        with self._locks.locked(self._application_key(application)):
+            work, abandon = self._prepare_start_application(application, user_name)
+        self._queue_application_work(work, abandon)
+
+    def _prepare_start_application(self, application, user_name, identities=None):
+        """
+        Checks and marks an application as starting, must be called holding its lock
+        :return: the work that starts the application, and a function that undoes the preparation if
+            the work is never run
+        """
+        with self._claim_application(application, ApplicationState.STARTING):
+            snapshot = self.snapshot_application(application)
+            self._assert_application_status(application, ApplicationState.CREATED, snapshot)
+            self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.START, identities)
             self._mark_starting(application)
 
         def do_work_start():
@@ -387,17 +528,27 @@ class DeploymentManager(object):
                     self._handle_application_error(application, ex, ApplicationState.CREATED, "starting")
                     raise
             finally:
-                self._clear_package_progress(application)
+                self._release_application(application)
                 self._state_change_event_application(application)
 
-        self.dispatcher.run_as_asynch(task=do_work_start)
+        return do_work_start, lambda: self._release_application(application)
 
     def stop_application(self, application, user_name):
         logging.info('stop_application')
-        with self._lock:
-            self._assert_application_status(application, ApplicationState.STARTED)
-            application_owner = self._get_application_owner(application)
-            self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.STOP)
+        with self._locks.locked(self._application_key(application)):
+            work, abandon = self._prepare_stop_application(application, user_name)
+        self._queue_application_work(work, abandon)
+
+    def _prepare_stop_application(self, application, user_name, identities=None):
+        """
+        Checks and marks an application as stopping, must be called holding its lock
+        :return: the work that stops the application, and a function that undoes the preparation if
+            the work is never run
+        """
+        with self._claim_application(application, ApplicationState.STOPPING):
+            snapshot = self.snapshot_application(application)
+            self._assert_application_status(application, ApplicationState.STARTED, snapshot)
+            self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.STOP, identities)
             self._mark_stopping(application)
 
         def do_work_stop():
@@ -411,22 +562,23 @@ class DeploymentManager(object):
                     self._handle_application_error(application, ex, ApplicationState.STARTED, "stopping")
                     raise
             finally:
-                self._clear_package_progress(application)
+                self._release_application(application)
                 self._state_change_event_application(application)
 
-        self.dispatcher.run_as_asynch(task=do_work_stop)
+        return do_work_stop, lambda: self._release_application(application)
 
-    def get_application_info(self, application, user_name=None):
+    def get_application_info(self, application, user_name=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot_application(application)
         if user_name is not None:
-            application_owner = self._get_application_owner(application)
-            self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.READ)
+            self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.READ)
 
         logging.info('get_application_info')
 
-        if not self._application_registrar.application_has_record(application):
+        if not snapshot.exists:
             record = {'status': ApplicationState.NOTCREATED, 'information': None}
         else:
-            record = self._application_registrar.get_application(application)
+            record = dict(snapshot.record)
         progress_state = self._get_package_progress(application)
         if progress_state is not None:
             record['status'] = progress_state
@@ -434,20 +586,20 @@ class DeploymentManager(object):
         return record
 
     def get_application_detail(self, application, user_name):
-        application_owner = self._get_application_owner(application)
-        self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.READ)
+        snapshot = self.snapshot_application(application)
+        self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.READ)
 
         logging.info('get_application_detail')
-        self._assert_application_exists(application)
+        status = self._assert_application_exists(application, snapshot)
         create_data = self._application_registrar.get_create_data(application)
         record = self._application_creator.get_application_runtime_details(application, create_data)
-        record['status'] = self.get_application_info(application)['status']
+        record['status'] = status
         record['name'] = application
         return record
 
     def get_application_summary(self, application, user_name):
-        application_owner = self._get_application_owner(application)
-        self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.READ)
+        snapshot = self.snapshot_application(application)
+        self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.READ)
 
         logging.info('get_application_summary')
         record = self._application_summary_registrar.get_summary_data(application)
@@ -455,27 +607,50 @@ class DeploymentManager(object):
 
     def create_application(self, package, application, overrides, user_name):
         logging.info('create_application')
-        package_data_path = None
+        with self._locks.locked(self._package_key(package), self._application_key(application)):
+            work, abandon = self._prepare_create_application(package, application, overrides, user_name)
+        self._queue_application_work(work, abandon)
 
-        with self._lock:
+    def _prepare_create_application(self, package, application, overrides, user_name,
+                                    identities=None, staged_packages=None):
+        """
+        Checks, registers and marks an application as creating, must be called holding the locks
+        of the package and application
+        :param staged_packages: package name -> _StagedPackage, so that a batch of creates fetches each package once
+        :return: the work that creates the application, and a function that undoes the preparation if
+            the work is never run
+        """
+        if staged_packages is None:
+            staged_packages = {}
+        with self._claim_application(application, ApplicationState.CREATING):
             self._assert_application_status(application, ApplicationState.NOTCREATED)
-            self._assert_package_status(package, PackageDeploymentState.DEPLOYED)
-            package_owner = self._get_application_owner(package)
-            self._authorize(user_name, Resources.PACKAGE, package_owner, Actions.READ)
-            self._authorize(user_name, Resources.APPLICATION, None, Actions.CREATE)
-            defaults = self.get_package_info(package)['defaults']
+            package_snapshot = self.snapshot_package(package)
+            self._assert_package_status(package, PackageDeploymentState.DEPLOYED, package_snapshot)
+            self._authorize(user_name, Resources.PACKAGE, package_snapshot.owner, Actions.READ, identities)
+            self._authorize(user_name, Resources.APPLICATION, None, Actions.CREATE, identities)
+            defaults = self.get_package_info(package, snapshot=package_snapshot)['defaults']
             self._application_creator.assert_application_properties(overrides, defaults)
-            package_data_path = self._package_registrar.get_package_data(package)
-            self._application_registrar.create_application(package, application, overrides, defaults)
+            staged_package = staged_packages.get(package)
+            if staged_package is None:
+                staged_package = _StagedPackage(*self._package_registrar.get_package_file(package))
+            package_data_path = staged_package.path
+            staged_package.acquire()
+            try:
+                self._application_registrar.create_application(package, application, overrides, defaults)
+            except Exception:
+                staged_package.release()
+                raise
+            staged_packages[package] = staged_package
             self._mark_creating(application)
 
         def do_work_create():
             try:
                 self._state_change_event_application(application)
                 try:
-                    package_metadata = self._package_registrar.get_package_metadata(package)['metadata']
+                    package_metadata = package_snapshot.metadata['metadata']
                     create_data = self._application_creator.create_application(
-                        package_data_path, package_metadata, application, overrides)
+                        package_data_path, package_metadata, application, overrides,
+                        package_digest=staged_package.digest)
                     self._application_registrar.set_create_data(application, create_data)
                     self._application_registrar.set_application_status(application, ApplicationState.CREATED)
                 except Exception as ex:
@@ -484,12 +659,15 @@ class DeploymentManager(object):
                     raise
             finally:
                 # clear inner locks:
-                self._clear_package_progress(application)
+                self._release_application(application)
                 self._state_change_event_application(application)
-                if package_data_path is not None:
-                    os.remove(package_data_path)
+                staged_package.release()
 
-        self.dispatcher.run_as_asynch(task=do_work_create)
+        def abandon():
+            self._release_application(application)
+            staged_package.release()
+
+        return do_work_create, abandon
 
     def _handle_application_error(self, application, ex, app_status, operation):
         """
@@ -508,10 +686,20 @@ class DeploymentManager(object):
 
     def delete_application(self, application, user_name):
         logging.info('delete_application')
-        with self._lock:
-            self._assert_application_status(application, [ApplicationState.CREATED, ApplicationState.STARTED])
-            application_owner = self._get_application_owner(application)
-            self._authorize(user_name, Resources.APPLICATION, application_owner, Actions.DESTROY)
+        with self._locks.locked(self._application_key(application)):
+            work, abandon = self._prepare_delete_application(application, user_name)
+        self._queue_application_work(work, abandon)
+
+    def _prepare_delete_application(self, application, user_name, identities=None):
+        """
+        Checks and marks an application as being destroyed, must be called holding its lock
+        :return: the work that destroys the application, and a function that undoes the preparation if
+            the work is never run
+        """
+        with self._claim_application(application, ApplicationState.DESTROYING):
+            snapshot = self.snapshot_application(application)
+            self._assert_application_status(application, [ApplicationState.CREATED, ApplicationState.STARTED], snapshot)
+            self._authorize(user_name, Resources.APPLICATION, snapshot.owner, Actions.DESTROY, identities)
             self._mark_destroying(application)
 
         def do_work_delete():
@@ -525,10 +713,79 @@ class DeploymentManager(object):
                     self._handle_application_error(application, ex, ApplicationState.STARTED, "deleting")
                     raise
             finally:
-                self._clear_package_progress(application)
+                self._release_application(application)
                 self._state_change_event_application(application)
 
-        self.dispatcher.run_as_asynch(task=do_work_delete)
+        return do_work_delete, lambda: self._release_application(application)
+
+    def run_batch(self, operations, user_name):
+        """
+        Checks and authorizes a list of application operations in one pass, then queues the ones
+        that passed to be carried out in the background, like the single operations
+        :param operations: dicts with an 'action' (create|start|stop|delete) and an 'application', creates also
+            take a 'package' and any property overrides, as in the body of a create request
+        :return: the outcome of checking each operation, in order
+        """
+        logging.info('run_batch: %s operations', len(operations))
+        results = []
+        work = []
+        identities = {}
+        staged_packages = {}
+        keys = []
+        for operation in operations:
+            if isinstance(operation, dict):
+                keys.append(self._application_key(operation.get('application')))
+                if operation.get('package'):
+                    keys.append(self._package_key(operation['package']))
+        with self._locks.locked(*keys):
+            for operation in operations:
+                result = {'application': None, 'action': None}
+                try:
+                    if not isinstance(operation, dict):
+                        raise FailedValidation('Each operation must be an object')
+                    result['application'] = operation.get('application')
+                    result['action'] = operation.get('action')
+                    task, abandon = self._prepare_batch_operation(operation, user_name, identities, staged_packages)
+                    work.append((result, task, abandon))
+                    result['status'] = BatchStatus.ACCEPTED
+                except DmException as ex:
+                    self._reject_batch_operation(result, ex)
+                results.append(result)
+
+        for result, task, abandon in work:
+            try:
+                self._queue_application_work(task, abandon)
+            except DmException as ex:
+                self._reject_batch_operation(result, ex)
+        return results
+
+    @staticmethod
+    def _reject_batch_operation(result, ex):
+        result['status'] = BatchStatus.REJECTED
+        result['error'] = type(ex).__name__
+        result['information'] = ex.msg
+
+    def _prepare_batch_operation(self, operation, user_name, identities, staged_packages):
+        action = operation.get('action')
+        application = operation.get('application')
+        if not application:
+            raise FailedValidation("Missing field 'application'")
+        if action == 'create':
+            if 'package' not in operation:
+                raise FailedValidation("Missing field 'package'")
+            if 'user' in operation:
+                raise FailedValidation("User should be passed as URI parameter user.name")
+            overrides = dict((key, value) for key, value in operation.items() if key not in ('action', 'application'))
+            overrides['user'] = user_name
+            return self._prepare_create_application(operation['package'], application, overrides, user_name,
+                                                    identities, staged_packages)
+        elif action == 'start':
+            return self._prepare_start_application(application, user_name, identities)
+        elif action == 'stop':
+            return self._prepare_stop_application(application, user_name, identities)
+        elif action == 'delete':
+            return self._prepare_delete_application(application, user_name, identities)
+        raise FailedValidation("%s is not a valid action (create|start|stop|delete)" % action)
 
     def _state_change_event_application(self, name):
         endpoint_type = "application_callback"
@@ -71,3 +71,10 @@ class FailedConnection(DmException):
     def __init__(self, arg):
         super(FailedConnection, self).__init__(arg)
         self.msg = arg
+
+
+class Overloaded(DmException):
+
+    def __init__(self, arg):
+        super(Overloaded, self).__init__(arg)
+        self.msg = arg
@@ -0,0 +1,201 @@
+"""
+Name:       group_resolver.py
+Purpose:    Resolves the groups a user belongs to, caching the result for a fixed time
+            Looking up groups can mean enumerating every group known to NSS, which is slow when groups
+            come from LDAP, so it is done once per user per TTL rather than once per request.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import grp
+import logging
+import os
+import pwd
+import threading
+import time
+
+
+class _Metrics(object):
+    def __init__(self):
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.lookup_time_total = 0.0
+        self.lookup_time_max = 0.0
+
+
+class UnknownUser(KeyError):
+    pass
+
+
+def lookup_groups(user):
+    """
+    Reads the groups of a user from the system, with the user's primary group last
+    :raises UnknownUser: if the system has no such user
+    """
+    try:
+        gid = pwd.getpwnam(user).pw_gid
+    except KeyError:
+        raise UnknownUser(user)
+    primary = grp.getgrgid(gid).gr_name
+    if hasattr(os, 'getgrouplist'):
+        # asks NSS for this user's groups only, rather than for every group
+        groups = [grp.getgrgid(group_id).gr_name for group_id in os.getgrouplist(user, gid) if group_id != gid]
+    else:
+        groups = [g.gr_name for g in grp.getgrall() if user in g.gr_mem]
+    groups.append(primary)
+    return groups
+
+
+class GroupResolver(object):
+    """
+    A thread safe, TTL cache of the groups each user belongs to
+    Users that do not exist are cached for a shorter time. If a refresh interval is given, a background
+    thread looks up the users that have been asked for again before their entries expire, so that requests
+    rarely wait for a lookup.
+    """
+    DEFAULT_TTL = 300
+    DEFAULT_NEGATIVE_TTL = 60
+
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, refresh_interval=None, lookup=lookup_groups):
+        """
+        :param ttl: seconds the groups of a user are cached for
+        :param negative_ttl: seconds a user that does not exist is remembered for
+        :param refresh_interval: seconds between background refreshes, None or 0 to only look up groups on demand
+        :param lookup: reads the groups of a user, raising UnknownUser if there is no such user
+        """
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._lookup = lookup
+        self._lock = threading.Lock()
+        # user -> (expiry time, list of groups or None for an unknown user)
+        self._entries = {}
+        # users asked for since the last background refresh
+        self._requested = set()
+        self._metrics = _Metrics()
+        self._stopped = threading.Event()
+        self._refresh_interval = refresh_interval
+        if refresh_interval:
+            refresh_thread = threading.Thread(target=self._refresh_loop, name='group-resolver-refresh')
+            refresh_thread.daemon = True
+            refresh_thread.start()
+
+    def get_groups(self, user):
+        """
+        :return: a new list of the names of the groups that user belongs to
+        :raises UnknownUser: if there is no such user
+        """
+        now = time.time()
+        with self._lock:
+            self._requested.add(user)
+            expires, groups = self._entries.get(user, (0, None))
+            if expires > now:
+                if groups is None:
+                    self._metrics.negative_hits += 1
+                    raise UnknownUser(user)
+                self._metrics.hits += 1
+                return list(groups)
+            self._metrics.misses += 1
+
+        groups = self._resolve(user)
+        if groups is None:
+            raise UnknownUser(user)
+        return list(groups)
+
+    def invalidate(self, user=None):
+        """
+        Drops the cached groups of one user, or of every user
+        """
+        with self._lock:
+            if user is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user, None)
+
+    def stop(self):
+        self._stopped.set()
+
+    def metrics(self):
+        """
+        :return: a dictionary of counters and timings
+        """
+        with self._lock:
+            lookups = self._metrics.misses + self._metrics.refreshes
+            return {
+                'entries': len(self._entries),
+                'hits': self._metrics.hits,
+                'negative_hits': self._metrics.negative_hits,
+                'misses': self._metrics.misses,
+                'refreshes': self._metrics.refreshes,
+                'errors': self._metrics.errors,
+                'lookup_time_avg': self._metrics.lookup_time_total / lookups if lookups else 0.0,
+                'lookup_time_max': self._metrics.lookup_time_max
+            }
+
+    def _resolve(self, user):
+        """
+        Looks up and caches the groups of a user
+        :return: the groups, or None for an unknown user
+        """
+        start = time.time()
+        try:
+            groups = self._lookup(user)
+            ttl = self._ttl
+        except UnknownUser:
+            groups = None
+            ttl = self._negative_ttl
+        except Exception:
+            # the directory may only be briefly unavailable, so failures are not cached
+            with self._lock:
+                self._metrics.errors += 1
+            raise
+        finished = time.time()
+        with self._lock:
+            self._entries[user] = (finished + ttl, groups)
+            self._metrics.lookup_time_total += finished - start
+            self._metrics.lookup_time_max = max(self._metrics.lookup_time_max, finished - start)
+        return groups
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self._refresh_interval):
+            with self._lock:
+                users, self._requested = self._requested, set()
+                # stop refreshing users that have not been asked for since the last refresh
+                for user in [user for user in self._entries if user not in users]:
+                    del self._entries[user]
+            for user in users:
+                try:
+                    self._resolve(user)
+                    with self._lock:
+                        self._metrics.refreshes += 1
+                except Exception as ex:
+                    logging.warning("Failed to refresh the groups of %s: %s", user, str(ex))
+
+
+def create_group_resolver(config):
+    """
+    Builds a GroupResolver from the optional group_cache_ttl, group_cache_negative_ttl
+    and group_refresh_interval config settings
+    """
+    ttl = config.get('group_cache_ttl', GroupResolver.DEFAULT_TTL)
+    negative_ttl = config.get('group_cache_negative_ttl', GroupResolver.DEFAULT_NEGATIVE_TTL)
+    refresh_interval = config.get('group_refresh_interval')
+    logging.debug("group resolver: ttl=%s negative_ttl=%s refresh_interval=%s", ttl, negative_ttl, refresh_interval)
+    return GroupResolver(ttl=ttl, negative_ttl=negative_ttl, refresh_interval=refresh_interval)
@@ -0,0 +1,127 @@
+"""
+Name:       hbase_connection_pool.py
+Purpose:    A thread safe pool of long lived connections to the HBase thrift server
+            Connections are opened lazily, checked for health when they have been idle for a while
+            and re-opened after any transport error so callers never see a stale connection twice.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import logging
+import socket
+import time
+import Queue
+from contextlib import contextmanager
+
+import happybase
+from thriftpy2.transport import TTransportException
+from exceptiondef import Overloaded
+
+TRANSPORT_ERRORS = (TTransportException, socket.error)
+
+
+class _PooledConnection(object):
+    """
+    A slot in the pool, holding a (possibly not yet opened) connection and the time it was last used
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0
+
+
+class HbaseConnectionPool(object):
+    """
+    Hands out happybase connections to one thrift server, at most 'size' of them at a time
+    """
+    DEFAULT_SIZE = 10
+    HEALTH_CHECK_INTERVAL = 60
+    CHECKOUT_TIMEOUT = 30
+
+    def __init__(self, hbase_host, size=DEFAULT_SIZE, health_check_interval=HEALTH_CHECK_INTERVAL,
+                 checkout_timeout=CHECKOUT_TIMEOUT):
+        """
+        :param hbase_host: the HBase thrift server to connect to
+        :param size: the maximum number of connections that will be opened
+        :param health_check_interval: connections idle for longer than this (in seconds)
+            are checked before being handed out again
+        :param checkout_timeout: the number of seconds to wait for a connection before giving up
+        """
+        assert size > 0
+        self._hbase_host = hbase_host
+        self._health_check_interval = health_check_interval
+        self._checkout_timeout = checkout_timeout
+        self._slots = Queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._slots.put(_PooledConnection())
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool for the duration of a with block, blocking until one is free
+        A connection that raises a transport error is closed and will be re-opened by the next borrower.
+        :raises Overloaded: if no connection was returned to the pool within the checkout timeout
+        """
+        try:
+            slot = self._slots.get(True, self._checkout_timeout)
+        except Queue.Empty:
+            raise Overloaded("Timed out waiting for a connection to HBase, try again later")
+        try:
+            yield self._checkout(slot)
+        except TRANSPORT_ERRORS as ex:
+            logging.warning("HBase connection to %s failed, it will be reopened: %s", self._hbase_host, str(ex))
+            self._discard(slot)
+            raise
+        finally:
+            slot.last_used = time.time()
+            self._slots.put(slot)
+
+    def close(self):
+        """
+        Closes every connection that is not currently borrowed
+        """
+        slots = []
+        while True:
+            try:
+                slots.append(self._slots.get(False))
+            except Queue.Empty:
+                break
+        for slot in slots:
+            self._discard(slot)
+            self._slots.put(slot)
+
+    def _checkout(self, slot):
+        if slot.connection is not None and time.time() - slot.last_used > self._health_check_interval:
+            try:
+                slot.connection.tables()
+            except TRANSPORT_ERRORS as ex:
+                logging.info("Idle HBase connection to %s is no longer usable, reopening: %s", self._hbase_host, str(ex))
+                self._discard(slot)
+
+        if slot.connection is None:
+            logging.debug("Opening HBase connection to %s", self._hbase_host)
+            slot.connection = happybase.Connection(self._hbase_host)
+        return slot.connection
+
+    def _discard(self, slot):
+        if slot.connection is not None:
+            try:
+                slot.connection.close()
+            except TRANSPORT_ERRORS:
+                pass
+            slot.connection = None
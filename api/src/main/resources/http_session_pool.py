@@ -0,0 +1,152 @@
+"""
+Name:       http_session_pool.py
+Purpose:    Shared HTTP sessions for the REST calls made to other services, one per host
+            Each session keeps a pool of keep-alive connections to its host, retries requests that fail
+            to connect or are turned away with a gateway error, and applies a default timeout so that
+            no call can wait forever on a service that has stopped responding.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import logging
+import threading
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+
+class HttpSessionPool(object):
+    """
+    Hands out a requests.Session for each scheme, host and port that is called
+    Sessions are safe to share between threads, each thread that is making a call holds one of the
+    session's connections until the response has been read.
+    """
+    POOL_SIZE = 10
+    RETRIES = 3
+    BACKOFF_FACTOR = 0.5
+    CONNECT_TIMEOUT = 10
+    READ_TIMEOUT = 120
+    # statuses returned by proxies and services that are restarting, where trying again is likely to work
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, pool_size=POOL_SIZE, retries=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        """
+        :param pool_size: the number of idle connections kept open to each host
+        :param retries: the number of times a failed request is tried again
+        :param backoff_factor: retries wait backoff_factor * 2 ^ (retry number - 1) seconds before trying again
+        :param connect_timeout: the default number of seconds to wait for a connection to be made
+        :param read_timeout: the default number of seconds to wait for a response
+        """
+        assert pool_size > 0
+        self._pool_size = pool_size
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        # (scheme, host and port) -> session
+        self._sessions = {}
+
+    @property
+    def timeout(self):
+        """
+        :return: the default (connect, read) timeouts in seconds
+        """
+        return self._timeout
+
+    def session(self, url):
+        """
+        :return: the session used to call the host that url points at
+        """
+        parsed_url = urlparse(url)
+        key = (parsed_url.scheme.lower(), parsed_url.netloc.lower())
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                logging.debug("Opening HTTP session to %s://%s", key[0], key[1])
+                session = self._create_session()
+                self._sessions[key] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        """
+        Makes a request through the session for its host, taking the same arguments as requests.request
+        The default timeouts are used unless the caller passes its own.
+        """
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self._timeout
+        return self.session(url).request(method, url, **kwargs)
+
+    def close(self):
+        """
+        Closes every session and the connections they hold
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _create_session(self):
+        # POST is left out of the retried methods, so a request that may have been acted on is never
+        # sent twice, but any request is retried if it failed before a connection was made
+        retry = Retry(total=self._retries,
+                      backoff_factor=self._backoff_factor,
+                      status_forcelist=self.RETRY_STATUSES,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+SESSION_POOL = HttpSessionPool()
+
+
+def request(method, url, **kwargs):
+    return SESSION_POOL.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def create_session_pool(config):
+    """
+    Builds a HttpSessionPool from the optional http_pool_size, http_retries, http_retry_backoff,
+    http_connect_timeout and http_read_timeout config settings
+    """
+    return HttpSessionPool(pool_size=config.get('http_pool_size', HttpSessionPool.POOL_SIZE),
+                           retries=config.get('http_retries', HttpSessionPool.RETRIES),
+                           backoff_factor=config.get('http_retry_backoff', HttpSessionPool.BACKOFF_FACTOR),
+                           connect_timeout=config.get('http_connect_timeout', HttpSessionPool.CONNECT_TIMEOUT),
+                           read_timeout=config.get('http_read_timeout', HttpSessionPool.READ_TIMEOUT))
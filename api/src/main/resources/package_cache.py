@@ -0,0 +1,256 @@
+"""
+Name:       package_cache.py
+Purpose:    A size bounded, content addressed cache of package files on local disk
+            Packages are stored under the SHA-256 of their contents so that creating an application
+            can use the bytes that were deployed rather than reading the package back from HDFS.
+            The extracted contents of recently used packages are also kept, so that an application can be
+            staged by hard linking to them rather than decompressing the package again.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+from striped_lock import StripedLock
+
+CHUNK_SIZE = 1024 * 1024
+TEMP_SUFFIX = '.tmp'
+
+
+def file_digest(path):
+    """
+    :return: the hex SHA-256 of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PackageCache(object):
+    """
+    Keeps copies of package files keyed by their digest, evicting the least recently used
+    once they take up more than max_bytes
+    """
+    DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # digest -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        # digests whose files have been hashed since this process started
+        self._verified = set()
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        existing = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(TEMP_SUFFIX):
+                # left behind by an add that never finished
+                os.remove(path)
+            else:
+                existing.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, digest, size in sorted(existing):
+            self._entries[digest] = size
+        with self._lock:
+            self._evict()
+        logging.debug("package cache %s holds %s packages", cache_dir, len(self._entries))
+
+    def add(self, source_path):
+        """
+        Copies a file into the cache
+        :return: the digest the file is stored under
+        """
+        digest = hashlib.sha256()
+        size = 0
+        temp_file = tempfile.NamedTemporaryFile(dir=self._cache_dir, suffix=TEMP_SUFFIX, delete=False)
+        try:
+            with open(source_path, 'rb') as source_file:
+                for chunk in iter(lambda: source_file.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            temp_file.close()
+            os.rename(temp_file.name, self._path(digest.hexdigest()))
+        except Exception:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+
+        with self._lock:
+            self._entries.pop(digest.hexdigest(), None)
+            self._entries[digest.hexdigest()] = size
+            self._verified.add(digest.hexdigest())
+            self._evict()
+        logging.debug("cached %s as %s", source_path, digest.hexdigest())
+        return digest.hexdigest()
+
+    def checkout(self, digest, dest_path):
+        """
+        Places the file cached under digest at dest_path, hard linked to the cached copy where possible
+        The cached copy is hashed the first time it is checked out, and discarded if it has been corrupted.
+        :return: True if the file was cached, False if the caller needs to fetch it from elsewhere
+        """
+        with self._lock:
+            if digest not in self._entries:
+                return False
+            self._entries[digest] = self._entries.pop(digest)
+            verified = digest in self._verified
+
+        path = self._path(digest)
+        temp_path = '%s.%s%s' % (dest_path, uuid.uuid4(), TEMP_SUFFIX)
+        try:
+            if not verified:
+                if file_digest(path) != digest:
+                    logging.warning("cached package %s is corrupt, discarding it", digest)
+                    self.discard(digest)
+                    return False
+                with self._lock:
+                    self._verified.add(digest)
+            try:
+                os.link(path, temp_path)
+            except OSError:
+                # not on the same filesystem as the cache
+                shutil.copyfile(path, temp_path)
+            os.utime(path, None)
+            os.rename(temp_path, dest_path)
+        except (IOError, OSError) as ex:
+            # most likely evicted by another thread since the lock was released
+            logging.info("unable to check out cached package %s: %s", digest, str(ex))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+    def discard(self, digest):
+        with self._lock:
+            self._remove(digest)
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        while total > self._max_bytes and self._entries:
+            digest = next(iter(self._entries))
+            total -= self._entries[digest]
+            logging.debug("evicting %s from the package cache", digest)
+            self._remove(digest)
+
+    def _remove(self, digest):
+        self._entries.pop(digest, None)
+        self._verified.discard(digest)
+        if os.path.exists(self._path(digest)):
+            os.remove(self._path(digest))
+
+    def _path(self, digest):
+        return os.path.join(self._cache_dir, digest)
+
+
+def _link_tree(source_path, dest_path):
+    """
+    Recreates the directories under source_path at dest_path, with every file hard linked to the original
+    """
+    for dir_path, dir_names, file_names in os.walk(source_path):
+        relative_path = os.path.relpath(dir_path, source_path)
+        target_dir = dest_path if relative_path == os.curdir else os.path.join(dest_path, relative_path)
+        os.makedirs(target_dir)
+        for name in dir_names + file_names:
+            source = os.path.join(dir_path, name)
+            target = os.path.join(target_dir, name)
+            if os.path.islink(source):
+                # os.walk does not descend into linked directories, so links of both kinds are copied as links
+                os.symlink(os.readlink(source), target)
+            elif name in file_names:
+                os.link(source, target)
+
+
+class ExtractedPackageStore(object):
+    """
+    Keeps the extracted contents of the most recently used packages, keyed by the digest of the package
+    Trees handed out by stage are hard linked to the stored copy, so files must be passed to
+    deployer_utils.unshare_file before they are modified in place.
+    """
+    DEFAULT_LIMIT = 10
+
+    def __init__(self, store_dir, limit=DEFAULT_LIMIT):
+        """
+        :param store_dir: where the extracted packages are kept, must be on the same filesystem as staged trees
+        :param limit: the number of extracted packages to keep
+        """
+        assert limit > 0
+        self._store_dir = store_dir
+        self._limit = limit
+        # held for a digest while that package is being extracted, staged or evicted
+        self._package_locks = StripedLock()
+
+        if os.path.isdir(store_dir):
+            for name in os.listdir(store_dir):
+                if name.endswith(TEMP_SUFFIX):
+                    # left behind by an extraction that never finished
+                    shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+    def stage(self, package_path, stage_path, digest=None):
+        """
+        Places the contents of the package at package_path at stage_path, extracting it first
+        if it is not already stored
+        :param digest: the SHA-256 of the package, if it is already known
+        """
+        if digest is None:
+            digest = file_digest(package_path)
+        tree_path = os.path.join(self._store_dir, digest)
+        with self._package_locks.locked(digest):
+            if os.path.isdir(tree_path):
+                logging.debug("staging %s from extracted package %s", package_path, digest)
+            else:
+                self._extract(package_path, tree_path)
+            os.utime(tree_path, None)
+            _link_tree(tree_path, stage_path)
+        self._evict(digest)
+
+    def _extract(self, package_path, tree_path):
+        logging.debug("extracting %s to %s", package_path, tree_path)
+        with tarfile.open(package_path) as tar:
+            temp_path = '%s.%s%s' % (tree_path, uuid.uuid4(), TEMP_SUFFIX)
+            try:
+                tar.extractall(path=temp_path)
+                os.rename(temp_path, tree_path)
+            except Exception:
+                shutil.rmtree(temp_path, ignore_errors=True)
+                raise
+
+    def _evict(self, in_use):
+        trees = []
+        for name in os.listdir(self._store_dir):
+            if not name.endswith(TEMP_SUFFIX) and name != in_use:
+                trees.append((os.path.getmtime(os.path.join(self._store_dir, name)), name))
+        for _, digest in sorted(trees)[:max(0, len(trees) + 1 - self._limit)]:
+            with self._package_locks.locked_if_free(digest) as locked:
+                # leave trees that are being staged from to a later eviction
+                if locked:
+                    logging.debug("evicting extracted package %s", digest)
+                    shutil.rmtree(os.path.join(self._store_dir, digest), ignore_errors=True)
@@ -20,15 +20,23 @@ License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 either express or implied.
 """
 
+import copy
 import json
 import tarfile
+import threading
 import traceback
 import logging
+from collections import OrderedDict
 
 from exceptiondef import FailedValidation
+from package_cache import file_digest
 
 
 class PackageParser(object):
+    # metadata parsed from recently seen packages, keyed by package digest and shared by every parser
+    MAX_CACHED_PACKAGES = 32
+    _metadata_cache = OrderedDict()
+    _metadata_cache_lock = threading.Lock()
 
     def __init__(self):
         pass
@@ -45,52 +53,75 @@ class PackageParser(object):
 
         try:
             logging.debug("get_package_metadata")
-            metadata = {}
+            digest = file_digest(package_data_path)
+            with self._metadata_cache_lock:
+                metadata = self._metadata_cache.pop(digest, None)
+                if metadata is not None:
+                    self._metadata_cache[digest] = metadata
+                    logging.debug("using previously parsed metadata for %s", package_data_path)
+                    return copy.deepcopy(metadata)
+
+            metadata = self._parse(package_data_path)
+            with self._metadata_cache_lock:
+                self._metadata_cache[digest] = metadata
+                while len(self._metadata_cache) > self.MAX_CACHED_PACKAGES:
+                    self._metadata_cache.popitem(last=False)
 
-            tar = tarfile.open(package_data_path)
-            for name in sorted([member.name for member in tar.getmembers()]):
-                name_parts = name.split('/')
-                package_name = name_parts[0]
+            logging.debug(json.dumps(metadata))
+            return copy.deepcopy(metadata)
+        except FailedValidation as failure:
+            logging.error(traceback.format_exc())
+            raise failure
+        except Exception:
+            logging.error(traceback.format_exc())
+            raise FailedValidation("Unexpected error parsing the package contents")
+
+    def _parse(self, package_data_path):
+        """
+        Builds the package metadata in a single pass over the compressed archive, reading each
+        properties.json as it goes by, so members may appear in any order
+        """
+        package_name = None
+        component_types = {}
+
+        tar = tarfile.open(package_data_path, 'r|gz')
+        try:
+            for member in tar:
+                name_parts = member.name.split('/')
                 if len(name_parts) == 1:
                     # there must be exactly one package in the archive
-                    if 'package_name' in metadata:
+                    if package_name is not None:
                         raise FailedValidation("Expected to find a single directory inside the archive, but found more than one item at the top level")
-                    metadata['package_name'] = package_name
-                    metadata['component_types'] = {}
+                    package_name = name_parts[0]
                 elif len(name_parts) >= 4:
                     component_type = name_parts[1]
                     component_name = name_parts[2]
                     file_name = name_parts[3]
-                    if component_type not in metadata['component_types']:
-                        metadata['component_types'][component_type] = {}
-                    if component_name not in metadata['component_types'][component_type]:
-                        metadata['component_types'][component_type][component_name] = {
+                    if component_type not in component_types:
+                        component_types[component_type] = {}
+                    if component_name not in component_types[component_type]:
+                        component_types[component_type][component_name] = {
                             'component_name': component_name,
                             'component_detail': {},
-                            'component_path': '%s/%s/%s' % (package_name, component_type, component_name)
+                            'component_path': '%s/%s/%s' % (name_parts[0], component_type, component_name)
                         }
                     file_contents = {}
                     if file_name == 'properties.json':
-                        file_contents = json.load(tar.extractfile(name))
-                    metadata['component_types'][component_type][component_name][
+                        file_contents = json.load(tar.extractfile(member))
+                    component_types[component_type][component_name][
                         'component_detail']['/'.join(name_parts[3:])] = file_contents
+        finally:
+            tar.close()
 
-            # there must be at least one component type in the package
-            if 'component_types' not in metadata:
-                raise FailedValidation("Expected to find a single package directory inside the archive, but found none")
-            if len(metadata['component_types']) <= 0:
-                raise FailedValidation("Expected to find at least one component within the package directory")
+        # there must be at least one component type in the package
+        if package_name is None:
+            raise FailedValidation("Expected to find a single package directory inside the archive, but found none")
+        if len(component_types) <= 0:
+            raise FailedValidation("Expected to find at least one component within the package directory")
 
-            for component_type, components in metadata['component_types'].items():
-                for component_name, component_detail in components.items():
-                    if 'properties.json' not in component_detail['component_detail']:
-                        component_detail['component_detail']['properties.json'] = {}
+        for component_type, components in component_types.items():
+            for component_name, component_detail in components.items():
+                if 'properties.json' not in component_detail['component_detail']:
+                    component_detail['component_detail']['properties.json'] = {}
 
-            logging.debug(json.dumps(metadata))
-            return metadata
-        except FailedValidation as failure:
-            logging.error(traceback.format_exc())
-            raise failure
-        except Exception:
-            logging.error(traceback.format_exc())
-            raise FailedValidation("Unexpected error parsing the package contents")
+        return {'package_name': package_name, 'component_types': component_types}
@@ -23,7 +23,6 @@ either express or implied.
 import logging
 import json
 
-import happybase
 from Hbase_thrift import AlreadyExists
 
 from package_parser import PackageParser
@@ -32,12 +31,21 @@ from deployer_utils import HDFS
 from exceptiondef import FailedConnection
 
 from hbase_utils import encode,decode
+from hbase_connection_pool import HbaseConnectionPool
 
 class HbasePackageRegistrar(object):
     COLUMN_DEPLOY_STATUS = 'cf:deploy_status'
+    COLUMN_PACKAGE_HASH = 'cf:package_hash'
 
-    def __init__(self, hbase_host, hdfs_host, hdfs_user, hdfs_port, package_local_dir_path):
+    def __init__(self, hbase_host, hdfs_host, hdfs_user, hdfs_port, package_local_dir_path, connection_pool=None,
+                 package_cache=None):
+        """
+        :param package_cache: an optional PackageCache that deployed packages are kept in, so that
+            they do not need to be read back from HDFS when applications are created
+        """
         self._hbase_host = hbase_host
+        self._connection_pool = connection_pool
+        self._package_cache = package_cache
         self._hdfs_user = hdfs_user
         self._hdfs_host = hdfs_host
         self._hdfs_port = hdfs_port
@@ -59,20 +67,22 @@ class HbasePackageRegistrar(object):
             logging.debug("not creating packages HDFS folder as it already exists")
 
         if self._hbase_host is not None:
-            connection = happybase.Connection(self._hbase_host)
-            try:
-                connection.create_table(self._table_name, {'cf': dict()})
-                logging.debug("packages table created")
-            except AlreadyExists:
-                logging.debug("packages table exists")
-            finally:
-                connection.close()
+            if self._connection_pool is None:
+                self._connection_pool = HbaseConnectionPool(self._hbase_host)
+            with self._connection_pool.connection() as connection:
+                try:
+                    connection.create_table(self._table_name, {'cf': dict()})
+                    logging.debug("packages table created")
+                except AlreadyExists:
+                    logging.debug("packages table exists")
 
     def set_package(self, package_name, package_data_path, user):
         logging.debug("Storing %s", package_name)
         metadata = self._parser.get_package_metadata(package_data_path)
         metadata['user'] = user
         key, data = self.generate_record(metadata)
+        if self._package_cache is not None:
+            data[self.COLUMN_PACKAGE_HASH] = self._package_cache.add(package_data_path)
         self._write_to_hdfs(package_data_path, data['cf:package_data'])
         self._write_to_db(key, data)
 
@@ -87,23 +97,42 @@ class HbasePackageRegistrar(object):
 
     def delete_package(self, package_name):
         logging.debug("Deleting %s", package_name)
-        package_data_hdfs_path = self._read_from_db(package_name, ['cf:package_data'])['cf:package_data']
-        self._hdfs_client.remove(package_data_hdfs_path)
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        record = self._read_from_db(package_name, ['cf:package_data', self.COLUMN_PACKAGE_HASH])
+        self._hdfs_client.remove(record['cf:package_data'])
+        if self._package_cache is not None and self.COLUMN_PACKAGE_HASH in record:
+            self._package_cache.discard(record[self.COLUMN_PACKAGE_HASH])
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
             table.delete(package_name)
-        finally:
-            connection.close()
 
     def get_package_data(self, package_name):
+        package_file = self.get_package_file(package_name)
+        return package_file[0] if package_file is not None else None
+
+    def get_package_file(self, package_name):
+        """
+        Fetches a package to local disk
+        :return: the local path of the package and the SHA-256 of its contents, or None for the SHA-256
+            if it is not known, or None if the package does not exist
+        """
         logging.debug("Reading %s", package_name)
-        record = self._read_from_db(package_name, ['cf:package_data'])
+        record = self._read_from_db(package_name, ['cf:package_data', self.COLUMN_PACKAGE_HASH])
         if not record:
             return None
         local_package_path = "%s/%s" % (self._package_local_dir_path, package_name)
+        package_hash = record.get(self.COLUMN_PACKAGE_HASH)
+        if self._package_cache is not None and package_hash is not None:
+            if self._package_cache.checkout(package_hash, local_package_path):
+                logging.debug("Using cached copy of %s", package_name)
+                return local_package_path, package_hash
         self._read_from_hdfs(record['cf:package_data'], local_package_path)
-        return local_package_path
+        if self._package_cache is not None and package_hash is not None:
+            cached_hash = self._package_cache.add(local_package_path)
+            if cached_hash != package_hash:
+                logging.warning("%s in HDFS does not match the package that was deployed", package_name)
+                self._package_cache.discard(cached_hash)
+            return local_package_path, cached_hash
+        return local_package_path, None
 
     def get_package_metadata(self, package_name):
         logging.debug("Reading %s", package_name)
@@ -135,17 +164,13 @@ class HbasePackageRegistrar(object):
     def list_packages(self):
         logging.debug("List all packages")
 
-        connection = None
         try:
-            connection = happybase.Connection(self._hbase_host)
-            table = connection.table(self._table_name)
-            result = [key.decode() for key, _ in table.scan(columns=['cf:name'])]
+            with self._connection_pool.connection() as connection:
+                table = connection.table(self._table_name)
+                result = [key.decode() for key, _ in table.scan(columns=['cf:name'])]
         except Exception as exc:
             logging.debug(str(exc))
             raise FailedConnection('Unable to connect to the HBase master')
-        finally:
-            if connection:
-                connection.close()
         return result
 
     def generate_record(self, metadata):
@@ -157,25 +182,18 @@ class HbasePackageRegistrar(object):
         }
 
     def _read_from_db(self, key, columns):
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
             data = table.row(encode(key), columns=encode(columns))
-        finally:
-            connection.close()
-        
         return decode(data)
 
     def _read_from_hdfs(self, source_hdfs_path, dest_local_path):
         self._hdfs_client.stream_file_to_disk(source_hdfs_path, dest_local_path)
 
     def _write_to_db(self, key, data):
-        connection = happybase.Connection(self._hbase_host)
-        try:
+        with self._connection_pool.connection() as connection:
             table = connection.table(self._table_name)
             table.put(encode(key), encode(data))
-        finally:
-            connection.close()
 
     def _write_to_hdfs(self, source_local_path, dest_hdfs_path):
         with open(source_local_path, 'rb') as source_file:
@@ -18,22 +18,30 @@ Unless required by applicable law or agreed to separately in writing, software d
 License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
 either express or implied.
 """
+import base64
+import hashlib
 import json
 import logging
+import os
 import re
-import requests
 from requests.exceptions import RequestException
-from exceptiondef import FailedConnection
+import http_session_pool
+from exceptiondef import FailedConnection, FailedValidation
 
 
 class PackageRepoRestClient(object):
-    def __init__(self, api_url, package_local_dir_path):
+    CHUNK_SIZE = 1024 * 1024
+    DOWNLOAD_ATTEMPTS = 3
+
+    def __init__(self, api_url, package_local_dir_path, max_package_size=None):
         """
         A client implementation for the package repository API
         :param api_url: A url describing the location to make REST calls to
+        :param max_package_size: packages bigger than this number of bytes are refused, None for no limit
         """
         self.api_url = api_url
         self._package_local_dir_path = package_local_dir_path
+        self._max_package_size = max_package_size
 
     def put_package(self, package_name, package_data):
         """
@@ -43,7 +51,7 @@ class PackageRepoRestClient(object):
         """
         url = self.api_url + "/packages/" + package_name
         logging.debug("PUT: %s", url)
-        response = requests.put(url, data=package_data)
+        response = http_session_pool.put(url, data=package_data)
         logging.debug("response code: %s", str(response.status_code))
         assert response.status_code == 200
 
@@ -55,12 +63,75 @@ class PackageRepoRestClient(object):
         """
         if not expected_codes:
             expected_codes = [200]
-        response = self.make_rest_get_request("/packages/%s?user.name=%s" % (package_name, user_name), expected_codes)
         local_path = "%s/%s" % (self._package_local_dir_path, package_name)
-        with open(local_path, 'wb') as local_file:
-            local_file.write(response.content)
+        partial_path = "%s.part" % local_path
+        try:
+            self._download("/packages/%s?user.name=%s" % (package_name, user_name), partial_path, expected_codes)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.rename(partial_path, local_path)
         return local_path
 
+    def _download(self, path, local_path, expected_codes):
+        """
+        Streams a file to disk a chunk at a time, resuming from where it got to with a range request
+        if the connection is lost part way through and the repository supports them
+        The download is checked against the Content-Length and, if the repository sends one, Content-MD5 headers.
+        """
+        received = 0
+        expected_size = None
+        expected_md5 = None
+        resumable = False
+        checksum = hashlib.md5()
+        with open(local_path, 'wb') as local_file:
+            for attempt in range(1, self.DOWNLOAD_ATTEMPTS + 1):
+                if received:
+                    response = self.make_rest_get_request(path, expected_codes + [206],
+                                                          headers={'Range': 'bytes=%s-' % received}, stream=True)
+                else:
+                    response = self.make_rest_get_request(path, expected_codes, stream=True)
+                try:
+                    if response.status_code != 206:
+                        # the whole file is being sent, so start again from the beginning
+                        local_file.seek(0)
+                        local_file.truncate()
+                        received = 0
+                        checksum = hashlib.md5()
+                        if 'Content-Length' in response.headers:
+                            expected_size = int(response.headers['Content-Length'])
+                            self._check_size(path, expected_size)
+                        expected_md5 = response.headers.get('Content-MD5')
+                        resumable = response.headers.get('Accept-Ranges') == 'bytes'
+
+                    for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                        local_file.write(chunk)
+                        checksum.update(chunk)
+                        received += len(chunk)
+                        self._check_size(path, received)
+                    if expected_size is not None and received < expected_size:
+                        raise RequestException("connection closed after %s of %s bytes" % (received, expected_size))
+                    break
+                except RequestException as exc:
+                    if not resumable or attempt == self.DOWNLOAD_ATTEMPTS:
+                        logging.debug("Request error: %s", str(exc))
+                        raise FailedConnection('Lost connection to the Package Repository Manager')
+                    logging.warning("Download of %s interrupted after %s bytes, resuming: %s", path, received, str(exc))
+                finally:
+                    response.close()
+
+        if expected_size is not None and received != expected_size:
+            raise FailedValidation("Package Repository Manager - expected %s bytes but received %s (request path = %s)"
+                                   % (expected_size, received, path))
+        if expected_md5 is not None and base64.b64encode(checksum.digest()) != expected_md5:
+            raise FailedValidation("Package Repository Manager - checksum mismatch (request path = %s)" % path)
+
+    def _check_size(self, path, size):
+        if self._max_package_size is not None and size > self._max_package_size:
+            raise FailedValidation("Package Repository Manager - package is larger than the limit of %s bytes (request path = %s)"
+                                   % (self._max_package_size, path))
+
     def get_package_list(self, user_name, recency=None):
         """
         :return: a list of all packages in the repository
@@ -79,14 +150,14 @@ class PackageRepoRestClient(object):
             return cause_msg
         return html_str
 
-    def make_rest_get_request(self, path, expected_codes=None):
+    def make_rest_get_request(self, path, expected_codes=None, headers=None, stream=False):
         if not expected_codes:
             expected_codes = [200]
         url = self.api_url + path
         logging.debug("GET: %s", url)
 
         try:
-            response = requests.get(url, timeout=120)
+            response = http_session_pool.get(url, timeout=120, headers=headers, stream=stream)
         except RequestException as exc:
             logging.debug("Request error: %s", str(exc))
             error_msg = 'Unable to connect to the Package Repository Manager'
@@ -36,16 +36,21 @@ import logging
 import json
 import string
 import collections
-import requests
+import http_session_pool
 import hbase_descriptor
 import opentsdb_descriptor
-from deployer_utils import HDFS
+import yarn_query
+from deployer_utils import HDFS, unshare_file
 
 
 class Creator(object):
     '''
     Base Functionality for Creator classes
     '''
+    # the types of YARN application this component type runs, used to narrow queries, None for any type
+    YARN_APPLICATION_TYPES = None
+    # whether this component type tags the YARN applications it launches, see yarn_query.application_tag
+    TAGS_YARN_APPLICATIONS = False
 
     def __init__(self, config, environment, namespace):
         '''
@@ -175,6 +180,7 @@ class Creator(object):
         props['component_application'] = application_name
         props['component_name'] = component['component_name']
         props['component_job_name'] = '%s-%s-job' % (props['component_application'], props['component_name'])
+        props['component_yarn_tags'] = yarn_query.application_tag(self._namespace)
         props['application_hdfs_root'] = '/pnda/system/deployment-manager/applications/%s/%s' % (user_name, application_name)
         props['component_hdfs_root'] = '%s/%s' % (props['application_hdfs_root'], component['component_name'])
         props['application_user'] = user_name
@@ -185,6 +191,7 @@ class Creator(object):
             with open(local_file, "r") as myfile:
                 file_contents = myfile.read()
             new_file_contents = string.Template(file_contents).safe_substitute(props)
+            unshare_file(local_file)
             with open(local_file, "w") as myfile:
                 myfile.write(new_file_contents)
         except UnicodeDecodeError:
@@ -194,6 +201,7 @@ class Creator(object):
 
     def _auto_fill_app_properties(self, staged_component_path, props):
         app_properties_file_path = '%s/application.properties' % staged_component_path
+        unshare_file(app_properties_file_path)
         with open(app_properties_file_path, "a") as app_properties_file:
             if 'component_no_auto_props' not in props:
                 app_properties_file.write('\n')
@@ -249,20 +257,29 @@ class Creator(object):
                           components_overrides):
         results = []
         for component_name, component in components.items():
-            staged_component_path = '%s/%s' % (stage_path, component['component_path'])
-            overrides = components_overrides.get(component_name) if components_overrides is not None else {}
-            overrides = {} if overrides is None else overrides
-            merged_props = self._instantiate_properties(application_name, user_name, component, overrides)
-            descriptor_result = self._create_optional_descriptors(staged_component_path, component, merged_props)
-            self._auto_fill_app_properties(staged_component_path, merged_props)
-            result = self.create_component(staged_component_path, application_name, user_name, component, merged_props)
-            result['component_name'] = component_name
-            result['application_hdfs_root'] = merged_props['application_hdfs_root']
-            result['component_job_name'] = merged_props['component_job_name']
-            result['descriptors'] = descriptor_result
-            results.append(result)
+            results.append(self.create_named_component(stage_path, application_name, user_name,
+                                                       component_name, component, components_overrides))
         return results
 
+    def create_named_component(self, stage_path, application_name, user_name, component_name, component,
+                               components_overrides):
+        '''
+        Creates a single component from a staged package, along with its optional descriptors
+        Components do not share any state, so this may be called for several components at once.
+        '''
+        staged_component_path = '%s/%s' % (stage_path, component['component_path'])
+        overrides = components_overrides.get(component_name) if components_overrides is not None else {}
+        overrides = {} if overrides is None else overrides
+        merged_props = self._instantiate_properties(application_name, user_name, component, overrides)
+        descriptor_result = self._create_optional_descriptors(staged_component_path, component, merged_props)
+        self._auto_fill_app_properties(staged_component_path, merged_props)
+        result = self.create_component(staged_component_path, application_name, user_name, component, merged_props)
+        result['component_name'] = component_name
+        result['application_hdfs_root'] = merged_props['application_hdfs_root']
+        result['component_job_name'] = merged_props['component_job_name']
+        result['descriptors'] = descriptor_result
+        return result
+
     def destroy_components(self, application_name, create_data):
         for single_component_data in create_data:
             self._destroy_optional_descriptors(single_component_data['descriptors'])
@@ -315,8 +332,13 @@ class Creator(object):
         result = None
         logging.debug('Querying list of yarn applications from %s', resource_manager)
         try:
-            url = 'http://%s/ws/v1/cluster/apps' % resource_manager
-            result = requests.get(url, headers={'Accept': 'application/json'}).json()
+            url = 'http://%s%s' % (resource_manager, yarn_query.APPS_PATH)
+            application_tags = None
+            if self.TAGS_YARN_APPLICATIONS and self._config.get('yarn_query_by_tag', False):
+                application_tags = [yarn_query.application_tag(self._namespace)]
+            params = yarn_query.query_params(application_types=self.YARN_APPLICATION_TYPES,
+                                             application_tags=application_tags)
+            result = http_session_pool.get(url, params=params, headers={'Accept': 'application/json'}).json()
         except:
             logging.info('Failed to query application list from %s', url)
 
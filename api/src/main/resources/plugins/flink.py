@@ -31,6 +31,8 @@ from plugins.base_common import Common
 
 
 class FlinkCreator(Common):
+    YARN_APPLICATION_TYPES = ['Apache Flink']
+    TAGS_YARN_APPLICATIONS = True
 
     def validate_component(self, component):
         errors = []
@@ -79,6 +81,7 @@ class FlinkCreator(Common):
             raise Exception('properties.json must contain "main_jar or main_py" for %s flink %s' % (application_name, component['component_name']))
 
         this_dir = os.path.dirname(os.path.realpath(__file__))
+        deployer_utils.unshare_file(os.path.join(staged_component_path, 'flink-stop.py'))
         copy(os.path.join(this_dir, 'flink-stop.py'), staged_component_path)
         service_script = 'flink.systemd.service.tpl' if java_app else 'flink.systemd.service.py.tpl'
         service_script_install_path = '/usr/lib/systemd/system/%s.service' % service_name
@@ -94,6 +97,7 @@ class FlinkCreator(Common):
             else:
                 properties['component_respawn_timeout_sec'] = '2'
 
+        deployer_utils.unshare_file(os.path.join(staged_component_path, service_script))
         copy(os.path.join(this_dir, service_script), staged_component_path)
 
         self._fill_properties(os.path.join(staged_component_path, service_script), properties)
@@ -30,9 +30,9 @@ import xml.etree.ElementTree as ElementTree
 import commands
 import shutil
 import traceback
-import requests
 
 import deployer_utils
+import http_session_pool
 from plugins.base_creator import Creator
 from exceptiondef import FailedCreation, FailedValidation
 
@@ -83,7 +83,9 @@ requested spark version" % self._config['oozie_spark_version']
         else:
             raise Exception('properties.json must contain "main_jar or main_py" for %s flink-batch-job %s' % (application_name, component_name))
 
+        deployer_utils.unshare_file('%s/lib/flink-stop.py' % staged_component_path)
         shutil.copyfile(os.path.join(this_dir, 'flink-stop.py'), '%s/lib/flink-stop.py' % staged_component_path)
+        deployer_utils.unshare_file('%s/lib/%s' % (staged_component_path, service_script))
         shutil.copyfile(os.path.join(this_dir, service_script), '%s/lib/%s' % (staged_component_path, service_script))
         self._fill_properties(os.path.join('%s/lib' % staged_component_path, "flink-stop.py"), properties)
         self._fill_properties(os.path.join('%s/lib' % staged_component_path, service_script), properties)
@@ -241,6 +243,7 @@ requested spark version" % self._config['oozie_spark_version']
                         ElementTree.SubElement(prop, 'name').text = 'mapreduce.job.queuename'
                         ElementTree.SubElement(prop, 'value').text = properties['mapreduce.job.queuename']
                         data = ElementTree.tostring(root)
+                        deployer_utils.unshare_file('%s/config-default.xml' % staged_component_path)
                         with open('%s/config-default.xml' % staged_component_path, 'w') as config_default_file:
                             config_default_file.write(data)
 
@@ -256,6 +259,7 @@ requested spark version" % self._config['oozie_spark_version']
                 logging.debug("Found workflow file %s", file_path)
                 # copy config-default.xml into this directory
                 if os.path.dirname(file_path) != staged_component_path:
+                    deployer_utils.unshare_file('%s/config-default.xml' % os.path.dirname(file_path))
                     shutil.copyfile('%s/config-default.xml' % staged_component_path, '%s/config-default.xml' % os.path.dirname(file_path))
 
                 # set the spark opts --queue so spark jobs are put in the right queue
@@ -284,6 +288,7 @@ requested spark version" % self._config['oozie_spark_version']
                 # write out modified workflow if changes were made
                 if workflow_modified:
                     logging.debug("Writing out modified workflow xml to %s", file_path)
+                    deployer_utils.unshare_file(file_path)
                     with open(file_path, "w") as workflow_file:
                         workflow_file.write(workflow_xml)
 
@@ -326,7 +331,7 @@ requested spark version" % self._config['oozie_spark_version']
 
         oozie_url = '%s/v1/jobs' % self._environment['oozie_uri']
 
-        response = requests.post(oozie_url, data=xml_string, headers={'Content-Type': 'application/xml'})
+        response = http_session_pool.post(oozie_url, data=xml_string, headers={'Content-Type': 'application/xml'})
 
         if response.status_code >= 200 and response.status_code < 300:
             result = response.json()
@@ -339,16 +344,16 @@ requested spark version" % self._config['oozie_spark_version']
     def _kill_oozie(self, job_id, oozie_user):
         logging.debug("_kill_oozie: %s", job_id)
         oozie_url = '%s/v1/job/%s?action=kill&user.name=%s' % (self._environment['oozie_uri'], job_id, oozie_user)
-        requests.put(oozie_url)
+        http_session_pool.put(oozie_url)
 
     def _start_oozie(self, job_id, oozie_user):
         logging.debug("_start_oozie: %s", job_id)
         oozie_url = '%s/v1/job/%s?action=resume&user.name=%s' % (self._environment['oozie_uri'], job_id, oozie_user)
-        requests.put(oozie_url)
+        http_session_pool.put(oozie_url)
         oozie_url = '%s/v1/job/%s?action=start&user.name=%s' % (self._environment['oozie_uri'], job_id, oozie_user)
-        requests.put(oozie_url)
+        http_session_pool.put(oozie_url)
 
     def _stop_oozie(self, job_id, oozie_user):
         logging.debug("_stop_oozie: %s", job_id)
         oozie_url = '%s/v1/job/%s?action=suspend&user.name=%s' % (self._environment['oozie_uri'], job_id, oozie_user)
-        requests.put(oozie_url)
+        http_session_pool.put(oozie_url)
@@ -25,12 +25,20 @@ either express or implied.
 import json
 import os
 import logging
+import time
+import traceback
 from shutil import copy
+from multiprocessing.dummy import Pool as ThreadPool
 import deployer_utils
+from exceptiondef import FailedCreation
 from plugins.base_common import Common
 
+NODE_DISTRIBUTION_ATTEMPTS = 3
+
 
 class SparkStreamingCreator(Common):
+    YARN_APPLICATION_TYPES = ['SPARK']
+    TAGS_YARN_APPLICATIONS = True
 
     def validate_component(self, component):
         errors = []
@@ -48,6 +56,46 @@ class SparkStreamingCreator(Common):
     def get_component_type(self):
         return 'sparkStreaming'
 
+    def _distribute_to_nodes(self, nodes, local_path, remote_tmp_path, remote_install_path):
+        """
+        Installs a file on every YARN node manager, working on up to node_distribution_parallelism nodes at once
+        Each node is retried if a command fails or the connection is lost, and a FailedCreation listing the
+        nodes that never succeeded is raised.
+        """
+        key_file = self._environment['cluster_private_key']
+        root_user = self._environment['cluster_root_user']
+        file_name = os.path.basename(local_path)
+
+        def distribute(node):
+            for attempt in range(1, NODE_DISTRIBUTION_ATTEMPTS + 1):
+                try:
+                    deployer_utils.exec_ssh(node, root_user, key_file, ['mkdir -p %s' % remote_tmp_path], check=True)
+                    deployer_utils.upload_file(node, root_user, key_file, local_path,
+                                               '%s/%s' % (remote_tmp_path, file_name))
+                    deployer_utils.exec_ssh(node, root_user, key_file,
+                                            ['sudo mkdir -p %s' % remote_install_path,
+                                             'sudo mv %s/%s %s/%s' % (remote_tmp_path, file_name, remote_install_path, file_name)],
+                                            check=True)
+                    return None
+                except Exception as ex:
+                    logging.warning("Failed to install %s on %s (attempt %s of %s): %s",
+                                    file_name, node, attempt, NODE_DISTRIBUTION_ATTEMPTS, traceback.format_exc())
+                    error = ex
+                    if attempt < NODE_DISTRIBUTION_ATTEMPTS:
+                        time.sleep(attempt)
+            return error
+
+        parallelism = max(1, min(self._config.get('node_distribution_parallelism', 10), len(nodes)))
+        pool = ThreadPool(processes=parallelism)
+        try:
+            results = pool.map(distribute, nodes)
+        finally:
+            pool.close()
+
+        errors = dict((node, str(error)) for node, error in zip(nodes, results) if error is not None)
+        if errors:
+            raise FailedCreation('Failed to install %s on %s' % (file_name, json.dumps(errors)))
+
     def create_component(self, staged_component_path, application_name, user_name, component, properties):
         logging.debug("create_component: %s %s %s %s", application_name, user_name, json.dumps(component), properties)
         remote_component_tmp_path = '%s/%s/%s' % (
@@ -86,6 +134,7 @@ class SparkStreamingCreator(Common):
                 raise Exception('properties.json must contain "main_jar or main_py" for %s sparkStreaming %s' % (application_name, component['component_name']))
 
             this_dir = os.path.dirname(os.path.realpath(__file__))
+            deployer_utils.unshare_file(os.path.join(staged_component_path, 'yarn-kill.py'))
             copy(os.path.join(this_dir, 'yarn-kill.py'), staged_component_path)
             service_script = 'systemd.service.tpl' if java_app else 'systemd.service.py.tpl'
             service_script_install_path = '/usr/lib/systemd/system/%s.service' % service_name
@@ -93,6 +142,7 @@ class SparkStreamingCreator(Common):
                 properties['component_respawn_type'] = 'always'
             if 'component_respawn_timeout_sec' not in properties:
                 properties['component_respawn_timeout_sec'] = '2'
+            deployer_utils.unshare_file(os.path.join(staged_component_path, service_script))
             copy(os.path.join(this_dir, service_script), staged_component_path)
 
         self._fill_properties(os.path.join(staged_component_path, service_script), properties)
@@ -108,13 +158,9 @@ class SparkStreamingCreator(Common):
         os.system("scp -i %s -o StrictHostKeyChecking=no %s %s@%s:%s"
                   % (key_file, staged_component_path + '/*', root_user, target_host, remote_component_tmp_path))
 
-        for node in self._environment['yarn_node_managers'].split(','):
-            deployer_utils.exec_ssh(node, root_user, key_file, ['mkdir -p %s' % remote_component_tmp_path])
-            os.system("scp -i %s -o StrictHostKeyChecking=no %s %s@%s:%s"
-                      % (key_file, staged_component_path + '/log4j.properties', root_user, node, remote_component_tmp_path + '/log4j.properties'))
-            deployer_utils.exec_ssh(node, root_user, key_file,
-                                    ['sudo mkdir -p %s' % remote_component_install_path,
-                                     'sudo mv %s %s' % (remote_component_tmp_path + '/log4j.properties', remote_component_install_path + '/log4j.properties')])
+        self._distribute_to_nodes(self._environment['yarn_node_managers'].split(','),
+                                   os.path.join(staged_component_path, 'log4j.properties'),
+                                   remote_component_tmp_path, remote_component_install_path)
 
         commands = []
         commands.append('sudo cp %s/%s %s' % (remote_component_tmp_path, service_script, service_script_install_path))
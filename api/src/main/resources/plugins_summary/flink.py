@@ -1,6 +1,6 @@
 import json
-import requests
 
+import http_session_pool
 from plugins_summary.component_summary import ComponentSummary
 
 class FlinkComponentSummary(ComponentSummary):
@@ -66,12 +66,12 @@ class FlinkComponentSummary(ComponentSummary):
         'FINISHED', 'RECONCILING']
 
         url = '%s%s' % (url, 'jobs')
-        job_list_resp = requests.get(url, timeout=self.environment['rest_api_req_timeout'])
+        job_list_resp = http_session_pool.get(url, timeout=self.environment['rest_api_req_timeout'])
         job_list_resp = json.loads(job_list_resp.text)
 
         if job_list_resp['jobs-running']:
             url = '%s/%s' % (url, job_list_resp['jobs-running'][0])
-            job_data = requests.get(url, timeout=self.environment['rest_api_req_timeout'])
+            job_data = http_session_pool.get(url, timeout=self.environment['rest_api_req_timeout'])
             job_data = json.loads(job_data.text)
             ret_data['flinkJid'] = job_data['jid']
             ret_data['vertices'] = []
@@ -1,10 +1,56 @@
+import copy
 import json
-import requests
+import threading
+from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
 
+import http_session_pool
 from plugins_summary.component_summary import ComponentSummary
 
+# workflows and YARN applications in these states will not change again
+FINISHED_WORKFLOW_STATES = frozenset(['SUCCEEDED', 'KILLED', 'FAILED'])
+FINISHED_YARN_STATES = frozenset(['FINISHED', 'FAILED', 'KILLED'])
+MAX_CACHED_JOBS = 10000
+# sub-workflows of the same workflow fetched at once
+OOZIE_FETCH_THREADS = 8
+
+
+class _JobCache(object):
+    """
+    A thread safe, size bounded LRU map shared by every summary thread
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_JOBS):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
 class OozieComponentSummary(ComponentSummary):
 
+    def __init__(self, environment, yarn_con, app_registrar):
+        super(OozieComponentSummary, self).__init__(environment, yarn_con, app_registrar)
+        # sub-workflow id -> (lastModifiedTime, summary, finished), for workflows whose summary can be reused
+        self._workflows = _JobCache()
+        # YARN application id -> (status, information) for applications that have finished
+        self._finished_yarn_applications = _JobCache()
+        self._fetch_pool = None
+        self._fetch_pool_lock = threading.Lock()
+
     def get_component_type(self):
         return 'oozie'
 
@@ -54,6 +100,9 @@ class OozieComponentSummary(ComponentSummary):
         return ret_data
 
     def _action_yarn_handler(self, yarn_id):
+        cached = self._finished_yarn_applications.get(yarn_id)
+        if cached is not None:
+            return cached
         yarn_data = self._yarn_connection.yarn_info(yarn_id)
         (status, information) = ("", "")
         if yarn_data['yarnStatus'] == 'FAILED' or yarn_data['yarnStatus'] == 'KILLED':
@@ -65,14 +114,26 @@ class OozieComponentSummary(ComponentSummary):
         else:
             status = self.component_status['amber']
             information = yarn_data['diagnostics']
+        if yarn_data['yarnStatus'] in FINISHED_YARN_STATES:
+            self._finished_yarn_applications.put(yarn_id, (status, information))
         return status, information
 
     def _oozie_action_handler(self, actions):
         """
         Handling OOZIE actions both Workflow and Coordinator
         """
+        return self._handle_actions(actions)[0]
+
+    def _handle_actions(self, actions):
+        """
+        :return: the summary of each action, and whether none of them can change without Oozie
+            updating the lastModifiedTime of the workflow they belong to
+        """
         count = 1
         ret = {}
+        settled = True
+        sub_workflows = self._fetch_jobs([action['externalId'] for action in actions
+                                          if 'oozie-oozi-W' in (action['externalId'] or '')])
         for action in actions:
             if action['externalId'] is not None:
                 if 'job_' in action.get('externalId', ''):
@@ -81,6 +142,7 @@ class OozieComponentSummary(ComponentSummary):
                     else self._convert_job_id(action['externalId'])
                     applicationtype = action['type']
                     status, information = self._action_yarn_handler(yarn_id)
+                    settled = settled and self._finished_yarn_applications.get(yarn_id) is not None
                     if action['status'] == 'ERROR':
                         status = self.component_status['red']
                         information = '%s, %s' % (information, action['errorMessage'])
@@ -96,12 +158,55 @@ class OozieComponentSummary(ComponentSummary):
                     type_name = self._find_workflow_type(action)
                     key = '%s-%d' % (type_name, count)
                     count += 1
-                    oozie_info = self._oozie_api_request(action['externalId'])
-                    oozie_data = self._oozie_action_handler(oozie_info['actions'])
-                    job_status = self._process_data(oozie_data)
-                    ret.update({key: {'actions': oozie_data, 'oozieId': action['externalId'], \
-                    'status': job_status, 'name': oozie_info['appName']}})
-        return ret
+                    summary, workflow_settled = self._workflow_summary(action['externalId'],
+                                                                       sub_workflows.get(action['externalId']))
+                    settled = settled and workflow_settled
+                    ret.update({key: summary})
+        return ret, settled
+
+    def _workflow_summary(self, job_id, oozie_info):
+        """
+        :param oozie_info: the workflow as fetched from Oozie, or None if it did not need to be fetched
+        :return: the summary of a sub-workflow, and whether it is settled
+        """
+        cached = self._workflows.get(job_id)
+        if cached is not None and cached[2]:
+            return copy.deepcopy(cached[1]), True
+        if oozie_info is None:
+            oozie_info = self._oozie_api_request(job_id)
+        last_modified = oozie_info.get('lastModifiedTime')
+        if cached is not None and last_modified is not None and cached[0] == last_modified:
+            return copy.deepcopy(cached[1]), True
+
+        oozie_data, settled = self._handle_actions(oozie_info['actions'])
+        job_status = self._process_data(oozie_data)
+        summary = {'actions': oozie_data, 'oozieId': job_id, 'status': job_status, 'name': oozie_info['appName']}
+        if settled:
+            finished = oozie_info['status'] in FINISHED_WORKFLOW_STATES
+            if finished or last_modified is not None:
+                self._workflows.put(job_id, (last_modified, copy.deepcopy(summary), finished))
+        return summary, settled
+
+    def _fetch_jobs(self, job_ids):
+        """
+        Fetches the workflows that are not known to have finished, several at once where there is more than one
+        :return: a dictionary of fetched workflows keyed by id
+        """
+        to_fetch = []
+        for job_id in job_ids:
+            cached = self._workflows.get(job_id)
+            if (cached is None or not cached[2]) and job_id not in to_fetch:
+                to_fetch.append(job_id)
+        if len(to_fetch) < 2:
+            return dict((job_id, self._oozie_api_request(job_id)) for job_id in to_fetch)
+        return dict(zip(to_fetch, self._get_fetch_pool().map(self._oozie_api_request, to_fetch)))
+
+    def _get_fetch_pool(self):
+        # only ever runs _oozie_api_request, so fetches from the pool never wait on the pool
+        with self._fetch_pool_lock:
+            if self._fetch_pool is None:
+                self._fetch_pool = ThreadPool(OOZIE_FETCH_THREADS)
+            return self._fetch_pool
 
     def _process_data(self, data):
         """
@@ -129,7 +234,7 @@ class OozieComponentSummary(ComponentSummary):
         """
         oozie_info = {}
         url = '%s%s%s' % (self.environment['oozie_uri'], '/v1/job/', job_id)
-        oozie_info = requests.get(url, timeout=self.environment['rest_api_req_timeout'])
+        oozie_info = http_session_pool.get(url, timeout=self.environment['rest_api_req_timeout'])
         oozie_info = json.loads(oozie_info.text)
         return oozie_info
 
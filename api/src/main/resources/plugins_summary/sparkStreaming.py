@@ -1,10 +1,96 @@
 import json
-import requests
+import threading
+from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
 
+import http_session_pool
 from plugins_summary.component_summary import ComponentSummary
 
+# the complete job and stage lists are read every this many summaries of an application, and the
+# short lists of jobs and stages in each unfinished or failed state the rest of the time
+FULL_REFRESH_CYCLES = 10
+MAX_TRACKED_APPLICATIONS = 1000
+# job and stage lists fetched at once
+SPARK_FETCH_THREADS = 8
+
+
+class _SparkCounters(object):
+    """
+    What is known about the jobs or the stages of one Spark application
+    Jobs and stages that have finished never change, so it is enough to remember the highest id seen and
+    which ids ended in a state other than the finished state, and to count the rest from the lists of jobs
+    or stages that have not finished.
+    """
+
+    def __init__(self, id_key, unfinished_states, finished_state, final_states):
+        """
+        :param final_states: the states other than finished_state that a job or stage stays in once it has ended
+        """
+        self.id_key = id_key
+        self.unfinished_states = unfinished_states
+        self.finished_state = finished_state
+        self.final_states = final_states
+        self.highest_id = -1
+        # final state -> ids still listed by Spark in that state
+        self._final_ids = dict((state, set()) for state in final_states)
+        # final state -> number of ids no longer listed by Spark in that state
+        self._final_counts = dict((state, 0) for state in final_states)
+
+    @property
+    def listed_states(self):
+        return self.unfinished_states + self.final_states
+
+    def update(self, entries_by_state, newest_id=-1):
+        """
+        :param entries_by_state: the current jobs or stages in each of the listed states
+        :param newest_id: the newest id known to exist, which counts jobs or stages that started and ended
+            without being listed
+        :return: a dictionary of counts, with every job or stage that is in none of the listed states
+            counted as finished
+        """
+        self.highest_id = max(self.highest_id, newest_id)
+        for entries in entries_by_state.values():
+            for entry in entries:
+                self.highest_id = max(self.highest_id, entry[self.id_key])
+        total = self.highest_id + 1
+        counts = {}
+        for state in self.final_states:
+            counts[state] = self._count_final(state, entries_by_state.get(state, []))
+        for state in self.unfinished_states:
+            counts[state] = len(entries_by_state.get(state, []))
+        counts[self.finished_state] = max(0, total - sum(counts.values()))
+        counts['total'] = total
+        return counts
+
+    def _count_final(self, state, entries):
+        ids = set(entry[self.id_key] for entry in entries)
+        known = self._final_ids[state]
+        known.update(ids)
+        if ids:
+            # Spark drops the oldest entries first, so ids below the oldest listed are never listed again
+            # and only need counting
+            dropped = set(known_id for known_id in known if known_id < min(ids))
+            known.difference_update(dropped)
+            self._final_counts[state] += len(dropped)
+        return self._final_counts[state] + len(known)
+
+
+class _SparkApplicationState(object):
+    def __init__(self):
+        self.summaries = 0
+        self.jobs = _SparkCounters('jobId', ['RUNNING', 'UNKNOWN'], 'SUCCEEDED', ['FAILED'])
+        self.stages = _SparkCounters('stageId', ['ACTIVE', 'PENDING'], 'COMPLETE', ['FAILED', 'SKIPPED'])
+
+
 class SparkStreamingComponentSummary(ComponentSummary):
 
+    def __init__(self, environment, yarn_con, app_registrar):
+        super(SparkStreamingComponentSummary, self).__init__(environment, yarn_con, app_registrar)
+        self._lock = threading.Lock()
+        # YARN application id -> _SparkApplicationState, least recently summarized first
+        self._applications = OrderedDict()
+        self._fetch_pool = None
+
     def get_component_type(self):
         return 'sparkStreaming'
 
@@ -51,34 +137,43 @@ class SparkStreamingComponentSummary(ComponentSummary):
         state = None
         information = None
 
-        url = 'http://%s:%s%s%s%s%s%s' % (self._yarn_connection.yarn_host, \
-            self._yarn_connection.yarn_port, '/proxy/', app_id, '/api/v1/applications/',\
-                app_id, '/jobs')
-        spark_jobs = requests.get(url, timeout=self.environment['rest_api_req_timeout'])
-        spark_jobs = json.loads(spark_jobs.text)
-        if spark_jobs:
-            information = {}
-            job_count = spark_jobs[0]['jobId'] + 1
-            job_run_c, job_suc_c, job_unknown_c, job_fail_c = \
-            self._get_status_count(spark_jobs, 'RUNNING', 'SUCCEEDED', 'UNKNOWN', 'FAILED')
-
-            url = 'http://%s:%s%s%s%s%s%s' % (self._yarn_connection.yarn_host, \
-                self._yarn_connection.yarn_port, '/proxy/', \
-                app_id, '/api/v1/applications/', app_id, '/stages')
-            spark_stages = requests.get(url, timeout=self.environment['rest_api_req_timeout'])
-            spark_stages = json.loads(spark_stages.text)
-            stage_count = spark_stages[0]['stageId'] + 1
-            stage_active_c, stage_complete_c, stage_pending_c, stage_failed_c = \
-            self._get_status_count(spark_stages, 'ACTIVE', 'COMPLETE', 'PENDING', 'FAILED')
+        url = 'http://%s:%s%s%s%s%s' % (self._yarn_connection.yarn_host, \
+            self._yarn_connection.yarn_port, '/proxy/', app_id, '/api/v1/applications/', app_id)
+        app_state, full_refresh = self._get_application_state(app_id)
+        if full_refresh:
+            spark_jobs, spark_stages = self._fetch([(self._fetch_list, '%s/jobs' % url, None),
+                                                    (self._fetch_list, '%s/stages' % url, None)])
+            jobs_by_state, newest_job = self._group_by_state(spark_jobs, app_state.jobs)
+            stages_by_state, newest_stage = self._group_by_state(spark_stages, app_state.stages)
+        else:
+            job_states = app_state.jobs.listed_states
+            stage_states = app_state.stages.listed_states
+            # jobs and stages that started and ended since the last summary are in none of the lists
+            results = self._fetch([(self._fetch_list, '%s/jobs' % url, state) for state in job_states] +
+                                  [(self._fetch_list, '%s/stages' % url, state) for state in stage_states] +
+                                  [(self._find_newest_id, '%s/jobs' % url, app_state.jobs.highest_id),
+                                   (self._find_newest_id, '%s/stages' % url, app_state.stages.highest_id)])
+            lists, (newest_job, newest_stage) = results[:-2], results[-2:]
+            jobs_by_state = dict(zip(job_states, lists[:len(job_states)]))
+            stages_by_state = dict(zip(stage_states, lists[len(job_states):]))
+
+        with self._lock:
+            job_counts = app_state.jobs.update(jobs_by_state, newest_job)
+            stage_counts = app_state.stages.update(stages_by_state, newest_stage)
+
+        if job_counts['total'] > 0:
             information = {
-                'jobSummary': {'number_of_jobs': job_count, 'unknown': job_unknown_c, \
-                    'succeeded': job_suc_c, 'failed': job_fail_c, 'running': job_run_c},
-                'stageSummary': {'number_of_stages': stage_count, 'active': stage_active_c, \
-                    'complete': stage_complete_c, 'pending': stage_pending_c, \
-                    'failed': stage_failed_c}
+                'jobSummary': {'number_of_jobs': job_counts['total'], 'unknown': job_counts['UNKNOWN'], \
+                    'succeeded': job_counts['SUCCEEDED'], 'failed': job_counts['FAILED'], \
+                    'running': job_counts['RUNNING']},
+                'stageSummary': {'number_of_stages': stage_counts['total'], 'active': stage_counts['ACTIVE'], \
+                    'complete': stage_counts['COMPLETE'], 'pending': stage_counts['PENDING'], \
+                    'failed': stage_counts['FAILED']}
                 }
 
-            if job_fail_c >= 1:
+            # failures Spark no longer lists are still counted, but only failures it lists make the job red,
+            # so that an old failure does not mark the job for the rest of its life
+            if jobs_by_state['FAILED']:
                 state = self.component_status['red']
             else:
                 state = self.component_status['green']
@@ -93,15 +188,76 @@ class SparkStreamingComponentSummary(ComponentSummary):
 
         return ret
 
-    def _get_status_count(self, status_data, status1, status2, status3, status4):
-        status1_c, status2_c, status3_c, status4_c = (0, 0, 0, 0)
-        for ele in status_data:
-            if ele['status'] == status1:
-                status1_c += 1
-            if ele['status'] == status2:
-                status2_c += 1
-            if ele['status'] == status3:
-                status3_c += 1
-            if ele['status'] == status4:
-                status4_c += 1
-        return status1_c, status2_c, status3_c, status4_c
+    def _get_application_state(self, app_id):
+        """
+        :return: what is known about a Spark application, and whether its complete job and stage lists should be read
+        """
+        with self._lock:
+            app_state = self._applications.pop(app_id, None) or _SparkApplicationState()
+            self._applications[app_id] = app_state
+            while len(self._applications) > MAX_TRACKED_APPLICATIONS:
+                self._applications.popitem(last=False)
+            full_refresh = app_state.summaries % FULL_REFRESH_CYCLES == 0
+            app_state.summaries += 1
+            return app_state, full_refresh
+
+    @staticmethod
+    def _group_by_state(entries, counters):
+        """
+        :return: the entries in each listed state, and the newest id
+        """
+        entries_by_state = dict((state, []) for state in counters.listed_states)
+        for entry in entries:
+            if entry['status'] in entries_by_state:
+                entries_by_state[entry['status']].append(entry)
+        # the lists are newest first, and the newest may have finished
+        newest_id = entries[0][counters.id_key] if entries else -1
+        return entries_by_state, newest_id
+
+    def _fetch(self, requests_to_make):
+        """
+        Makes several requests to the Spark REST API at once
+        :param requests_to_make: a list of (method, url, argument) to call method(url, argument) with
+        :return: what each call returned, in the same order
+        """
+        with self._lock:
+            if self._fetch_pool is None:
+                self._fetch_pool = ThreadPool(SPARK_FETCH_THREADS)
+        return self._fetch_pool.map(_call, requests_to_make)
+
+    def _fetch_list(self, url, state):
+        """
+        :return: the jobs or stages in state, or all of them if state is None
+        """
+        params = {'status': state.lower()} if state is not None else None
+        response = http_session_pool.get(url, params=params, timeout=self.environment['rest_api_req_timeout'])
+        return json.loads(response.text)
+
+    def _find_newest_id(self, url, known_id):
+        """
+        Finds the newest job or stage id by asking for ids after the highest one known, with twice the step
+        each time one is found and then halving the gap to the first one missing
+        A single request is made when there are no new jobs or stages.
+        :return: the newest id, or known_id if there are none after it
+        """
+        step = 1
+        while self._id_exists(url, known_id + step):
+            known_id += step
+            step *= 2
+        missing_id = known_id + step
+        while missing_id - known_id > 1:
+            middle_id = (known_id + missing_id) // 2
+            if self._id_exists(url, middle_id):
+                known_id = middle_id
+            else:
+                missing_id = middle_id
+        return known_id
+
+    def _id_exists(self, url, entry_id):
+        response = http_session_pool.get('%s/%d' % (url, entry_id), timeout=self.environment['rest_api_req_timeout'])
+        return response.status_code == 200
+
+
+def _call(request):
+    method, url, argument = request
+    return method(url, argument)
@@ -1,33 +1,88 @@
 import json
-import requests
+import threading
+
+import http_session_pool
+import yarn_query
+
+def _get_yarn_start_time(app_info):
+    try:
+        return int(app_info['startedTime'])
+    except:
+        return 0
+
+
+class YarnAppSnapshot(object):
+    """
+    The applications known to the resource manager when it was last asked, indexed by name
+    """
+
+    def __init__(self, apps):
+        # application name -> the most recently started application with that name
+        self._latest = {}
+        for app in apps:
+            latest = self._latest.get(app['name'])
+            if latest is None or _get_yarn_start_time(app) > _get_yarn_start_time(latest):
+                self._latest[app['name']] = app
+
+    def latest(self, job_name):
+        return self._latest.get(job_name)
+
 
 class YarnConnection(object):
-    def __init__(self, environment):
+    # the types of YARN application that components are looked up among by check_in_yarn
+    APPLICATION_TYPES = ['SPARK', 'Apache Flink']
+
+    def __init__(self, environment, config=None):
+        """
+        :param config: the optional yarn_query_by_tag setting limits lookups to applications tagged by the
+            deployment manager, and yarn_full_refresh_interval sets how often the whole application list is read
+        """
+        config = config or {}
         self.yarn_host = environment['yarn_resource_manager_host']
         self.yarn_port = environment['yarn_resource_manager_port']
         self.rest_api_req_timeout = environment['rest_api_req_timeout']
+        resource_manager = '%s:%s' % (self.yarn_host, self.yarn_port)
+        application_tags = None
+        if config.get('yarn_query_by_tag', False):
+            application_tags = [yarn_query.application_tag(environment['namespace'])]
+        self._filters = {'application_types': self.APPLICATION_TYPES, 'application_tags': application_tags}
+        # kept between cycles so that each cycle only asks for the applications that have changed
+        self._app_list = yarn_query.IncrementalAppList(
+            resource_manager, timeout=self.rest_api_req_timeout,
+            full_refresh_interval=config.get('yarn_full_refresh_interval',
+                                             yarn_query.IncrementalAppList.DEFAULT_FULL_REFRESH_INTERVAL),
+            **self._filters)
+        # held while the snapshot is fetched so that it is only fetched once per cycle
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = None
+        self._in_cycle = False
 
-    def _get_yarn_start_time(self, app_info):
-        try:
-            return int(app_info['startedTime'])
-        except:
-            return 0
+    def start_cycle(self):
+        """
+        Share one list of YARN applications between every check_in_yarn until end_cycle,
+        so that a summary cycle reads the list from the resource manager once rather than once per component
+        """
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._in_cycle = True
+
+    def end_cycle(self):
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._in_cycle = False
 
     def check_in_yarn(self, job_name):
         """
         Check in YARN list of Jobs with Job name provided and return latest application
         """
-        url = 'http://%s:%s%s' % (self.yarn_host, self.yarn_port, '/ws/v1/cluster/apps')
-        run_app_info = None
-        yarn_list = requests.get(url, timeout=self.rest_api_req_timeout)
-        yarn_list = json.loads(yarn_list.text)
-        if yarn_list['apps'] != None:
-            for app in yarn_list['apps']['app']:
-                if job_name == app['name']:
-                    if run_app_info is None or self._get_yarn_start_time(app) > self._get_yarn_start_time(run_app_info):
-                        run_app_info = app
-
-        return run_app_info
+        with self._snapshot_lock:
+            if self._in_cycle:
+                if self._snapshot is None:
+                    self._snapshot = YarnAppSnapshot(self._app_list.poll())
+                return self._snapshot.latest(job_name)
+        apps = yarn_query.list_apps('%s:%s' % (self.yarn_host, self.yarn_port),
+                                    timeout=self.rest_api_req_timeout, **self._filters)
+        return YarnAppSnapshot(apps).latest(job_name)
 
     def yarn_info(self, app_id):
         """
@@ -35,7 +90,7 @@ class YarnConnection(object):
         """
         url = 'http://%s:%s%s/%s' % (self.yarn_host, self.yarn_port, '/ws/v1/cluster/apps', app_id)
         ret = {}
-        yarn_app_info = requests.get(url, timeout=self.rest_api_req_timeout)
+        yarn_app_info = http_session_pool.get(url, timeout=self.rest_api_req_timeout)
         yarn_app_info = json.loads(yarn_app_info.text)
         if 'app' in yarn_app_info:
             ret.update({
@@ -0,0 +1,202 @@
+"""
+Name:       registrar_cache.py
+Purpose:    Write-through in-memory cache in front of the package and application registrars
+            Reads of package and application records are served from memory until they expire or
+            are invalidated by a write made through this process. Entries expire after a TTL so that
+            changes made by other processes are picked up eventually.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# key used for entries that describe the whole table rather than a single record
+ALL_RECORDS = None
+
+_MISSING = object()
+
+
+class RecordCache(object):
+    """
+    A thread safe, size bounded LRU cache of records whose entries expire after a fixed time
+    Entries are keyed by (record name, field) so that everything known about a record can be dropped at once.
+    """
+    DEFAULT_TTL = 30
+    DEFAULT_MAX_ENTRIES = 10000
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param ttl: number of seconds an entry is served for before it is read again
+        :param max_entries: the least recently used entries are evicted beyond this number
+        """
+        assert max_entries > 0
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped by every invalidation so that a read racing with a write never caches the old value
+        self._generation = 0
+
+    def get_or_load(self, name, field, loader):
+        """
+        :param name: the record name, or ALL_RECORDS
+        :param field: what is being cached about the record
+        :param loader: called to read the value when it is not cached
+        :return: a copy of the cached value, so callers are free to modify it
+        """
+        key = (name, field)
+        now = time.time()
+        with self._lock:
+            expires, value = self._entries.pop(key, (0, _MISSING))
+            if value is not _MISSING and expires > now:
+                self._entries[key] = (expires, value)
+                return copy.deepcopy(value)
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._entries.pop(key, None)
+                self._entries[key] = (now + self._ttl, value)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def invalidate(self, name):
+        """
+        Drops every field cached for a record along with everything cached about the whole table
+        """
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] == name or key[0] is ALL_RECORDS]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class _CachedRegistrar(object):
+    """
+    Forwards anything that is not explicitly cached to the wrapped registrar
+    """
+
+    def __init__(self, registrar, cache):
+        self._registrar = registrar
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._registrar, name)
+
+    def _cached(self, name, field, loader, *args):
+        return self._cache.get_or_load(name, field, lambda: loader(*args))
+
+    def _write(self, name, writer, *args):
+        try:
+            return writer(*args)
+        finally:
+            # invalidate even if the write failed, as it may have been partially applied
+            self._cache.invalidate(name)
+
+
+class CachedPackageRegistrar(_CachedRegistrar):
+    """
+    Caches package metadata and deploy status read through a HbasePackageRegistrar
+    """
+
+    def set_package(self, package_name, package_data_path, user):
+        return self._write(package_name, self._registrar.set_package, package_name, package_data_path, user)
+
+    def set_package_deploy_status(self, package_name, deploy_status):
+        return self._write(package_name, self._registrar.set_package_deploy_status, package_name, deploy_status)
+
+    def delete_package(self, package_name):
+        return self._write(package_name, self._registrar.delete_package, package_name)
+
+    def get_package_metadata(self, package_name):
+        return self._cached(package_name, 'metadata', self._registrar.get_package_metadata, package_name)
+
+    def package_exists(self, package_name):
+        return self._cached(package_name, 'exists', self._registrar.package_exists, package_name)
+
+    def get_package_deploy_status(self, package_name):
+        return self._cached(package_name, 'deploy_status', self._registrar.get_package_deploy_status, package_name)
+
+    def list_packages(self):
+        return self._cached(ALL_RECORDS, 'packages', self._registrar.list_packages)
+
+
+class CachedApplicationRegistrar(_CachedRegistrar):
+    """
+    Caches application records, status and create data read through a HbaseApplicationRegistrar
+    """
+
+    def create_application(self, package_name, application_name, overrides, defaults):
+        return self._write(application_name, self._registrar.create_application,
+                           package_name, application_name, overrides, defaults)
+
+    def set_application_status(self, application_name, status, information=None):
+        return self._write(application_name, self._registrar.set_application_status,
+                           application_name, status, information)
+
+    def set_create_data(self, application_name, create_data):
+        return self._write(application_name, self._registrar.set_create_data, application_name, create_data)
+
+    def delete_application(self, application_name):
+        return self._write(application_name, self._registrar.delete_application, application_name)
+
+    def acquire_operation(self, application_name, operation, timeout):
+        return self._write(application_name, self._registrar.acquire_operation, application_name, operation, timeout)
+
+    def release_operation(self, application_name):
+        return self._write(application_name, self._registrar.release_operation, application_name)
+
+    def get_application(self, application_name):
+        return self._cached(application_name, 'record', self._registrar.get_application, application_name)
+
+    def get_create_data(self, application_name):
+        return self._cached(application_name, 'create_data', self._registrar.get_create_data, application_name)
+
+    def application_exists(self, application_name):
+        return self._cached(application_name, 'exists', self._registrar.application_exists, application_name)
+
+    def application_has_record(self, application_name):
+        return self._cached(application_name, 'has_record', self._registrar.application_has_record, application_name)
+
+    def list_applications(self, limit=None, start_after=None):
+        return self._cached(ALL_RECORDS, 'applications:%s:%s' % (limit, start_after),
+                            self._registrar.list_applications, limit, start_after)
+
+    def list_applications_for_package(self, package_name):
+        return self._cached(ALL_RECORDS, 'package_applications:%s' % package_name,
+                            self._registrar.list_applications_for_package, package_name)
+
+
+def create_cache(config):
+    """
+    Builds a RecordCache from the optional registrar_cache_ttl and registrar_cache_size config settings
+    """
+    ttl = config.get('registrar_cache_ttl', RecordCache.DEFAULT_TTL)
+    max_entries = config.get('registrar_cache_size', RecordCache.DEFAULT_MAX_ENTRIES)
+    logging.debug("registrar cache: ttl=%s size=%s", ttl, max_entries)
+    return RecordCache(ttl=ttl, max_entries=max_entries)
@@ -0,0 +1,158 @@
+"""
+Name:       ssh_connection_pool.py
+Purpose:    A thread safe pool of SSH connections, keyed by host, user and key file
+            Connections are kept open between commands with transport keep-alives and are
+            re-opened after any connection error so that callers pay for the SSH handshake once per host.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+import spur
+
+CONNECTION_ERRORS = (spur.ssh.ConnectionError, paramiko.SSHException, socket.error, EOFError)
+# returned by _transport when the version of spur in use does not hold its paramiko client where expected
+UNKNOWN_TRANSPORT = object()
+
+
+class _PooledShell(object):
+    """
+    An idle shell and the time it was last used
+    """
+
+    def __init__(self, shell):
+        self.shell = shell
+        self.last_used = time.time()
+
+
+class SshConnectionPool(object):
+    """
+    Hands out spur shells, reusing an idle shell to the same host, as the same user, where there is one
+    Shells are only kept while idle, so there is no limit on how many can be borrowed at once.
+    """
+    MAX_IDLE_PER_HOST = 4
+    KEEPALIVE_INTERVAL = 30
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST, keepalive_interval=KEEPALIVE_INTERVAL,
+                 idle_timeout=IDLE_TIMEOUT):
+        """
+        :param max_idle_per_host: the number of idle shells kept open to each host
+        :param keepalive_interval: seconds between keep-alive messages sent on idle connections
+        :param idle_timeout: shells idle for longer than this (in seconds) are closed rather than reused
+        """
+        assert max_idle_per_host > 0
+        self._max_idle_per_host = max_idle_per_host
+        self._keepalive_interval = keepalive_interval
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # (host, user, key file) -> idle shells, most recently used last
+        self._idle = {}
+
+    @contextmanager
+    def shell(self, host, user, key_file):
+        """
+        Borrows a shell for the duration of a with block
+        A shell whose connection fails is closed rather than being returned to the pool.
+        """
+        key = (host, user, key_file)
+        shell = self._checkout(key)
+        try:
+            yield shell
+        except CONNECTION_ERRORS as ex:
+            logging.warning("SSH connection to %s failed, it will be reopened: %s", host, str(ex))
+            self._close(shell)
+            raise
+        except Exception:
+            self._checkin(key, shell)
+            raise
+        else:
+            self._checkin(key, shell)
+
+    def close(self):
+        """
+        Closes every idle shell
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for pooled_shells in idle.values():
+            for pooled in pooled_shells:
+                self._close(pooled.shell)
+
+    def _checkout(self, key):
+        while True:
+            with self._lock:
+                pooled_shells = self._idle.get(key)
+                pooled = pooled_shells.pop() if pooled_shells else None
+            if pooled is None:
+                logging.debug("Opening SSH connection to %s as %s", key[0], key[1])
+                return spur.SshShell(hostname=key[0],
+                                     username=key[1],
+                                     private_key_file=key[2],
+                                     missing_host_key=spur.ssh.MissingHostKey.accept)
+            if time.time() - pooled.last_used <= self._idle_timeout and self._is_active(pooled.shell):
+                return pooled.shell
+            logging.debug("Idle SSH connection to %s is no longer usable, closing it", key[0])
+            self._close(pooled.shell)
+
+    def _checkin(self, key, shell):
+        if not self._is_active(shell):
+            self._close(shell)
+            return
+        transport = self._transport(shell)
+        if transport is not UNKNOWN_TRANSPORT:
+            transport.set_keepalive(self._keepalive_interval)
+        with self._lock:
+            pooled_shells = self._idle.setdefault(key, [])
+            pooled_shells.append(_PooledShell(shell))
+            surplus = pooled_shells[:-self._max_idle_per_host]
+            del pooled_shells[:-self._max_idle_per_host]
+        for pooled in surplus:
+            self._close(pooled.shell)
+
+    def _is_active(self, shell):
+        transport = self._transport(shell)
+        if transport is UNKNOWN_TRANSPORT:
+            # assume the connection is usable, a shell whose connection has dropped is reopened when it fails
+            return True
+        return transport is not None and transport.is_active()
+
+    @staticmethod
+    def _transport(shell):
+        """
+        The only place that looks inside a spur shell, which connects lazily and does not expose the
+        paramiko client it holds
+        :return: the paramiko transport, None if the shell is not connected, or UNKNOWN_TRANSPORT
+        """
+        if not hasattr(shell, '_client'):
+            return UNKNOWN_TRANSPORT
+        client = shell._client
+        return client.get_transport() if client is not None else None
+
+    @staticmethod
+    def _close(shell):
+        try:
+            shell.__exit__(None, None, None)
+        except CONNECTION_ERRORS:
+            pass
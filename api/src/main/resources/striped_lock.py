@@ -0,0 +1,70 @@
+"""
+Name:       striped_lock.py
+Purpose:    A fixed set of locks shared between an unbounded set of named resources
+            Each name always maps to the same lock, so operations on the same resource are serialized
+            while operations on unrelated resources almost always run concurrently.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import threading
+import zlib
+from contextlib import contextmanager
+
+
+class StripedLock(object):
+    DEFAULT_STRIPES = 64
+
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        assert stripes > 0
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def _stripe(self, name):
+        # crc32 rather than hash() so the mapping does not depend on the process
+        return (zlib.crc32(name.encode('utf-8') if not isinstance(name, bytes) else name) & 0xffffffff) % len(self._locks)
+
+    @contextmanager
+    def locked(self, *names):
+        """
+        Holds the locks for every given name for the duration of a with block
+        Locks are always taken in the same order so that callers locking several names cannot deadlock.
+        """
+        stripes = sorted(set(self._stripe(name) for name in names))
+        acquired = []
+        try:
+            for stripe in stripes:
+                self._locks[stripe].acquire()
+                acquired.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                self._locks[stripe].release()
+
+    @contextmanager
+    def locked_if_free(self, name):
+        """
+        Holds the lock for a name for the duration of a with block, but only if it can be taken without waiting
+        The with target is whether the lock was taken.
+        """
+        lock = self._locks[self._stripe(name)]
+        acquired = lock.acquire(False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
@@ -0,0 +1,109 @@
+"""
+Name:       test_app.py
+Purpose:    Unit tests for the REST API handlers
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import json
+import socket
+from threading import Event
+from mock import Mock
+import happybase  # pylint: disable=unused-import
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.iostream import IOStream
+from tornado.testing import AsyncHTTPTestCase, gen_test
+import app
+from async_dispatcher import AsyncDispatcher, Lane
+from exceptiondef import NotFound, Overloaded
+
+
+class HandlerTests(AsyncHTTPTestCase):
+    def setUp(self):
+        super(HandlerTests, self).setUp()
+        app.config = {'config': {}}
+        app.dm = Mock()
+        self.dispatcher = AsyncDispatcher(lanes=[Lane(app.READ_LANE, 1), Lane(app.LIFECYCLE_LANE, 1)])
+        self.queued = []
+
+        def run_as_asynch(*args, **kwargs):
+            task = self.dispatcher.run_as_asynch(*args, **kwargs)
+            self.queued.append(task)
+            return task
+
+        app.DISPATCHER = Mock()
+        app.DISPATCHER.run_as_asynch.side_effect = run_as_asynch
+
+    def get_new_ioloop(self):
+        # the handlers finish requests through callbacks on the global IOLoop
+        return IOLoop.instance()
+
+    def get_app(self):
+        return app.Application()
+
+    def test_success(self):
+        app.dm.list_packages.return_value = ['package-1.0.0']
+        response = self.fetch('/packages?user.name=username')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body), ['package-1.0.0'])
+        app.dm.list_packages.assert_called_once_with('username')
+
+        app.dm.run_batch.return_value = [{'application': 'a', 'action': 'start', 'status': 'ACCEPTED'}]
+        response = self.fetch('/batch/applications?user.name=username', method='POST',
+                              body=json.dumps({'operations': [{'action': 'start', 'application': 'a'}]}))
+        self.assertEqual(response.code, 202)
+        self.assertEqual(json.loads(response.body)['results'][0]['status'], 'ACCEPTED')
+
+    def test_error(self):
+        app.dm.get_application_info.side_effect = NotFound(json.dumps({'status': 'NOTCREATED'}))
+        response = self.fetch('/applications/a/status?user.name=username')
+        self.assertEqual(response.code, 404)
+        self.assertEqual(json.loads(response.body), {'status': 'NOTCREATED'})
+
+        response = self.fetch('/applications?limit=0')
+        self.assertEqual(response.code, 400)
+        app.dm.list_applications.assert_not_called()
+
+    def test_overloaded(self):
+        app.DISPATCHER = Mock()
+        app.DISPATCHER.run_as_asynch.side_effect = Overloaded('The read queue is full')
+        response = self.fetch('/applications/a/summary?user.name=username')
+        self.assertEqual(response.code, 503)
+        self.assertEqual(response.headers['Retry-After'], str(app.RETRY_AFTER))
+        app.dm.get_application_summary.assert_not_called()
+
+    @gen_test
+    def test_client_disconnect(self):
+        # keep the only read thread busy so the request stays queued
+        release = Event()
+        self.dispatcher.run_as_asynch(release.wait, lane=app.READ_LANE)
+        stream = IOStream(socket.socket())
+        yield stream.connect(('127.0.0.1', self.get_http_port()))
+        yield stream.write(b'GET /packages?user.name=username HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        while not self.queued:
+            yield gen.sleep(0.01)
+
+        # the queued call is cancelled when the client goes away, so it is never made
+        stream.close()
+        while not self.queued[0].cancelled():
+            yield gen.sleep(0.01)
+        release.set()
+        yield gen.sleep(0.1)
+        app.dm.list_packages.assert_not_called()
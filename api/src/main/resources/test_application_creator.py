@@ -23,8 +23,10 @@ either express or implied.
 
 import unittest
 import getpass
+from threading import Event
 from datetime import datetime
-from mock import patch, mock_open, Mock
+from mock import patch, mock_open, Mock, ANY
+import spur
 from application_creator import ApplicationCreator
 from exceptiondef import FailedValidation, FailedCreation
 
@@ -35,6 +37,7 @@ class ApplicationCreatorTests(unittest.TestCase):
     environment = {
         'webhdfs_host': 'webhdfshost',
         'webhdfs_port': 'webhdfsport',
+        'webhdfs_user': 'webhdfsuser',
         'name_node': 'namenode',
         'oozie_uri': 'oozie',
         'cluster_private_key': 'keyfile.pem',
@@ -170,8 +173,8 @@ class ApplicationCreatorTests(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -195,22 +198,26 @@ class ApplicationCreatorTests(unittest.TestCase):
         post_mock.return_value = Resp()
         dist_mock.return_value = 'redhat'
         cmd_mock.return_value = (0, 'dev')
-        with patch("__builtin__.open", mock_open(read_data="[]")):
+        with patch("__builtin__.open", mock_open(read_data="[]")), patch('deployer_utils.upload_file') as upload_mock:
             creator = ApplicationCreator(self.config, self.environment, self.service)
             print self.property_overrides
             creator.create_application('abcd', self.package_metadata, 'aname', self.property_overrides)
         print post_mock.call_args_list
+        environment_properties = ''.join('<property><name>environment_%s</name><value>%s</value></property>' % item
+                                         for item in self.environment.items())
         # pylint: disable=line-too-long
-        post_mock.assert_any_call('oozie/v1/jobs', data='<?xml version="1.0" encoding="UTF-8" ?><configuration><property><name>environment_cluster_private_key</name><value>keyfile.pem</value></property><property><name>environment_hbase_thrift_server</name><value>hbasehost</value></property><property><name>environment_webhdfs_host</name><value>webhdfshost</value></property><property><name>environment_opentsdb</name><value>1.2.3.5:1234</value></property><property><name>environment_yarn_node_managers</name><value>nm1,nm2</value></property><property><name>environment_webhdfs_port</name><value>webhdfsport</value></property><property><name>environment_hbase_rest_server</name><value>hbasehost</value></property><property><name>environment_oozie_uri</name><value>oozie</value></property><property><name>environment_hbase_rest_port</name><value>123</value></property><property><name>environment_cluster_root_user</name><value>root_user</value></property><property><name>environment_hive_port</name><value>124</value></property><property><name>environment_queue_policy</name><value>echo dev</value></property><property><name>environment_name_node</name><value>namenode</value></property><property><name>environment_hive_server</name><value>hivehost</value></property><property><name>component_property3</name><value>3</value></property><property><name>component_property4</name><value>nine</value></property><property><name>component_application</name><value>aname</value></property><property><name>component_name</name><value>componentA</value></property><property><name>component_job_name</name><value>aname-componentA-job</value></property><property><name>application_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname</value></property><property><name>component_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname/componentA</value></property><property><name>application_user</name><value>root</value></property><property><name>deployment_start</name><value>2013-01-01T00:02Z</value></property><property><name>deployment_end</name><value>2013-01-08T00:02Z</value></property><property><name>user.name</name><value>root</value></property><property><name>oozie.use.system.libpath</name><value>true</value></property><property><name>oozie.libpath</name><value>/pnda/deployment/platform</value></property><property><name>mapreduce.job.queuename</name><value>dev</value></property><property><name>oozie.wf.application.path</name><value>namenode/pnda/system/deployment-manager/applications/root/aname/componentA</value></property></configuration>', headers={'Content-Type': 'application/xml'})
-        post_mock.assert_any_call('oozie/v1/jobs', data='<?xml version="1.0" encoding="UTF-8" ?><configuration><property><name>environment_cluster_private_key</name><value>keyfile.pem</value></property><property><name>environment_hbase_thrift_server</name><value>hbasehost</value></property><property><name>environment_webhdfs_host</name><value>webhdfshost</value></property><property><name>environment_opentsdb</name><value>1.2.3.5:1234</value></property><property><name>environment_yarn_node_managers</name><value>nm1,nm2</value></property><property><name>environment_webhdfs_port</name><value>webhdfsport</value></property><property><name>environment_hbase_rest_server</name><value>hbasehost</value></property><property><name>environment_oozie_uri</name><value>oozie</value></property><property><name>environment_hbase_rest_port</name><value>123</value></property><property><name>environment_cluster_root_user</name><value>root_user</value></property><property><name>environment_hive_port</name><value>124</value></property><property><name>environment_queue_policy</name><value>echo dev</value></property><property><name>environment_name_node</name><value>namenode</value></property><property><name>environment_hive_server</name><value>hivehost</value></property><property><name>component_application</name><value>aname</value></property><property><name>component_name</name><value>componentB</value></property><property><name>component_job_name</name><value>aname-componentB-job</value></property><property><name>application_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname</value></property><property><name>component_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname/componentB</value></property><property><name>application_user</name><value>root</value></property><property><name>deployment_start</name><value>2013-01-01T00:02Z</value></property><property><name>deployment_end</name><value>2013-01-08T00:02Z</value></property><property><name>user.name</name><value>root</value></property><property><name>oozie.use.system.libpath</name><value>true</value></property><property><name>oozie.libpath</name><value>/pnda/deployment/platform</value></property><property><name>mapreduce.job.queuename</name><value>dev</value></property><property><name>oozie.wf.application.path</name><value>namenode/pnda/system/deployment-manager/applications/root/aname/componentB</value></property></configuration>', headers={'Content-Type': 'application/xml'})
+        post_mock.assert_any_call('oozie/v1/jobs', data='<?xml version="1.0" encoding="UTF-8" ?><configuration>' + environment_properties + '<property><name>component_property3</name><value>3</value></property><property><name>component_property4</name><value>nine</value></property><property><name>component_application</name><value>aname</value></property><property><name>component_name</name><value>componentA</value></property><property><name>component_job_name</name><value>aname-componentA-job</value></property><property><name>component_yarn_tags</name><value>pnda-dm-ns</value></property><property><name>application_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname</value></property><property><name>component_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname/componentA</value></property><property><name>application_user</name><value>root</value></property><property><name>deployment_start</name><value>2013-01-01T00:02Z</value></property><property><name>deployment_end</name><value>2013-01-08T00:02Z</value></property><property><name>user.name</name><value>root</value></property><property><name>oozie.use.system.libpath</name><value>true</value></property><property><name>oozie.libpath</name><value>/pnda/deployment/platform</value></property><property><name>mapreduce.job.queuename</name><value>dev</value></property><property><name>oozie.wf.application.path</name><value>namenode/pnda/system/deployment-manager/applications/root/aname/componentA</value></property></configuration>', headers={'Content-Type': 'application/xml'})
+        post_mock.assert_any_call('oozie/v1/jobs', data='<?xml version="1.0" encoding="UTF-8" ?><configuration>' + environment_properties + '<property><name>component_application</name><value>aname</value></property><property><name>component_name</name><value>componentB</value></property><property><name>component_job_name</name><value>aname-componentB-job</value></property><property><name>component_yarn_tags</name><value>pnda-dm-ns</value></property><property><name>application_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname</value></property><property><name>component_hdfs_root</name><value>/pnda/system/deployment-manager/applications/root/aname/componentB</value></property><property><name>application_user</name><value>root</value></property><property><name>deployment_start</name><value>2013-01-01T00:02Z</value></property><property><name>deployment_end</name><value>2013-01-08T00:02Z</value></property><property><name>user.name</name><value>root</value></property><property><name>oozie.use.system.libpath</name><value>true</value></property><property><name>oozie.libpath</name><value>/pnda/deployment/platform</value></property><property><name>mapreduce.job.queuename</name><value>dev</value></property><property><name>oozie.wf.application.path</name><value>namenode/pnda/system/deployment-manager/applications/root/aname/componentB</value></property></configuration>', headers={'Content-Type': 'application/xml'})
 
         put_mock.assert_any_call('oozie/v1/job/someid?action=suspend&user.name=root')
 
         exec_ssh_mock.assert_any_call('localhost', 'root_user', 'keyfile.pem', ['mkdir -p /tmp/ns/aname/componentC', 'sudo mkdir -p /opt/ns/aname/componentC'])
-        exec_ssh_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ['mkdir -p /tmp/ns/aname/componentC'])
-        exec_ssh_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ['sudo mkdir -p /opt/ns/aname/componentC', 'sudo mv /tmp/ns/aname/componentC/log4j.properties /opt/ns/aname/componentC/log4j.properties'])
-        exec_ssh_mock.assert_any_call('nm2', 'root_user', 'keyfile.pem', ['mkdir -p /tmp/ns/aname/componentC'])
-        exec_ssh_mock.assert_any_call('nm2', 'root_user', 'keyfile.pem', ['sudo mkdir -p /opt/ns/aname/componentC', 'sudo mv /tmp/ns/aname/componentC/log4j.properties /opt/ns/aname/componentC/log4j.properties'])
+        exec_ssh_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ['mkdir -p /tmp/ns/aname/componentC'], check=True)
+        exec_ssh_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ['sudo mkdir -p /opt/ns/aname/componentC', 'sudo mv /tmp/ns/aname/componentC/log4j.properties /opt/ns/aname/componentC/log4j.properties'], check=True)
+        exec_ssh_mock.assert_any_call('nm2', 'root_user', 'keyfile.pem', ['mkdir -p /tmp/ns/aname/componentC'], check=True)
+        exec_ssh_mock.assert_any_call('nm2', 'root_user', 'keyfile.pem', ['sudo mkdir -p /opt/ns/aname/componentC', 'sudo mv /tmp/ns/aname/componentC/log4j.properties /opt/ns/aname/componentC/log4j.properties'], check=True)
+        upload_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ANY, '/tmp/ns/aname/componentC/log4j.properties')
+        upload_mock.assert_any_call('nm2', 'root_user', 'keyfile.pem', ANY, '/tmp/ns/aname/componentC/log4j.properties')
         exec_ssh_mock.assert_any_call('localhost', 'root_user', 'keyfile.pem', ['sudo cp /tmp/ns/aname/componentC/systemd.service.tpl /usr/lib/systemd/system/ns-aname-componentC.service', 'sudo cp /tmp/ns/aname/componentC/* /opt/ns/aname/componentC', 'sudo chmod a+x /opt/ns/aname/componentC/yarn-kill.py', 'cd /opt/ns/aname/componentC && sudo jar uf abc.jar application.properties', 'sudo rm -rf /tmp/ns/aname/componentC'])
 
     @patch('starbase.Connection')
@@ -218,8 +225,8 @@ class ApplicationCreatorTests(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -267,8 +274,8 @@ class ApplicationCreatorTests(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -302,8 +309,8 @@ class ApplicationCreatorTests(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -337,8 +344,8 @@ class ApplicationCreatorTests(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -360,12 +367,12 @@ class ApplicationCreatorTests(unittest.TestCase):
         post_mock.return_value = Resp()
         cmd_mock.return_value = (0, 'dev')
 
-        with patch("__builtin__.open", mock_open(read_data="[]")):
+        with patch("__builtin__.open", mock_open(read_data="[]")), patch('deployer_utils.upload_file'):
             creator = ApplicationCreator(self.config, self.environment, self.service)
             creator.create_application('abcd', self.package_metadata, 'test-app', self.property_overrides)
 
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
+    @patch('http_session_pool.put')
     def test_start_application(self, put_mock, exec_ssh_mock):
         creator = ApplicationCreator(self.config, self.environment, self.service)
         creator.start_application('name', self.create_data)
@@ -376,7 +383,7 @@ class ApplicationCreatorTests(unittest.TestCase):
         put_mock.assert_any_call('oozie/v1/job/someid2?action=start&user.name='+self.user)
 
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
+    @patch('http_session_pool.put')
     def test_stop_application(self, put_mock, exec_ssh_mock):
         creator = ApplicationCreator(self.config, self.environment, self.service)
         creator.stop_application('name', self.create_data)
@@ -426,7 +433,7 @@ class ApplicationCreatorTests(unittest.TestCase):
     # pylint: disable=unused-argument
     @patch('deployer_utils.HDFS')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
+    @patch('http_session_pool.put')
     @patch('os.path.isdir')
     @patch('os.rmdir')
     def test_destroy_application(self, rmdir_mock, isdir_mock, put_mock, exec_ssh_mock, hdfs_client_mock):
@@ -443,7 +450,7 @@ class ApplicationCreatorTests(unittest.TestCase):
         put_mock.assert_any_call('oozie/v1/job/someid2?action=kill&user.name='+self.user)
 
     # pylint: disable=line-too-long
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     def test_get_runtime_details(self, get_mock):
         rm_call = Mock()
         rm_call.json.return_value = {
@@ -587,3 +594,76 @@ class ApplicationCreatorTests(unittest.TestCase):
                 "yarn-state": "RUNNING"
             }
         }})
+
+    @patch('application_creator.shutil')
+    @patch('application_creator.pwd')
+    def test_parallel_create_rolls_back(self, pwd_mock, shutil_mock):
+        config = dict(self.config, component_creation_parallelism=4)
+        components = dict(('component%s' % index, {'component_path': 'c%s' % index}) for index in range(3))
+        package_metadata = {'component_types': {'oozie': components}}
+
+        created = [Event(), Event()]
+
+        def create_named_component(stage_path, application_name, user_name, component_name, component, overrides):
+            if component_name == 'component1':
+                # fail once the other components, which are being created at the same time, have finished
+                for event in created:
+                    event.wait(5)
+                raise FailedCreation('oozie error!')
+            created[int(component_name[-1]) // 2].set()
+            return {'component_name': component_name}
+
+        component_creator = Mock()
+        component_creator.create_named_component.side_effect = create_named_component
+        creator = ApplicationCreator(config, self.environment, self.service)
+        creator._load_creator = Mock(return_value=component_creator) # pylint: disable=protected-access
+        creator._stage_package = Mock(return_value='stage/abcd') # pylint: disable=protected-access
+
+        self.assertRaises(FailedCreation, creator.create_application, 'abcd', package_metadata, 'aname', self.property_overrides)
+        shutil_mock.rmtree.assert_called_once_with('stage/abcd')
+        self.assertEqual(component_creator.destroy_components.call_count, 1)
+        rolled_back = component_creator.destroy_components.call_args[0][1]
+        self.assertEqual(sorted(result['component_name'] for result in rolled_back), ['component0', 'component2'])
+
+    @patch('plugins.sparkStreaming.time')
+    @patch('deployer_utils.upload_file')
+    @patch('deployer_utils.exec_ssh')
+    def test_distribute_to_nodes_retries(self, exec_ssh_mock, upload_mock, time_mock):
+        attempts = {'nm1': 0, 'nm2': 0}
+
+        def upload_file(node, user, key, local_path, remote_path):
+            attempts[node] += 1
+            if node == 'nm2' or attempts[node] == 1:
+                raise IOError('connection reset')
+
+        upload_mock.side_effect = upload_file
+        creator = ApplicationCreator(self.config, self.environment, self.service)
+        spark_creator = creator._load_creator('sparkStreaming') # pylint: disable=protected-access
+
+        with self.assertRaises(FailedCreation) as context:
+            spark_creator._distribute_to_nodes(['nm1', 'nm2'], 'stage/log4j.properties', # pylint: disable=protected-access
+                                               '/tmp/ns/aname/componentC', '/opt/ns/aname/componentC')
+        self.assertIn('nm2', str(context.exception))
+        self.assertNotIn('nm1', str(context.exception))
+        self.assertEqual(attempts, {'nm1': 2, 'nm2': 3})
+        exec_ssh_mock.assert_any_call('nm1', 'root_user', 'keyfile.pem', ['sudo mkdir -p /opt/ns/aname/componentC', 'sudo mv /tmp/ns/aname/componentC/log4j.properties /opt/ns/aname/componentC/log4j.properties'], check=True)
+
+    @patch('plugins.sparkStreaming.time')
+    @patch('deployer_utils.upload_file')
+    @patch('deployer_utils.exec_ssh')
+    def test_distribute_to_nodes_retries_failed_commands(self, exec_ssh_mock, upload_mock, time_mock):
+        failures = [spur.results.RunProcessError(1, '', 'mv: cannot stat')]
+
+        def exec_ssh(node, user, key, ssh_commands, check=False):
+            self.assertTrue(check)
+            if ssh_commands[0].startswith('sudo mkdir') and failures:
+                raise failures.pop()
+
+        exec_ssh_mock.side_effect = exec_ssh
+        creator = ApplicationCreator(self.config, self.environment, self.service)
+        spark_creator = creator._load_creator('sparkStreaming') # pylint: disable=protected-access
+
+        spark_creator._distribute_to_nodes(['nm1'], 'stage/log4j.properties', # pylint: disable=protected-access
+                                           '/tmp/ns/aname/componentC', '/opt/ns/aname/componentC')
+        self.assertEqual(upload_mock.call_count, 2)
+        self.assertEqual(exec_ssh_mock.call_count, 4)
@@ -1,10 +1,39 @@
 import json
+import re
 import unittest
 from multiprocessing import Event
 from mock import patch
 
 from application_detailed_summary import ApplicationDetailedSummary
 from application_summary_registrar import HBaseAppplicationSummary
+from summary_aggregator import ComponentSummaryAggregator
+from plugins_summary.yarn_connection import YarnConnection
+
+def route_spark_requests(responses):
+    """
+    Answers YARN and Spark REST requests, which may be made concurrently, from the YARN application list,
+    Spark jobs list and Spark stages list responses in that order
+    Jobs and stages are filtered by state when the request asks for a single state, and a single job or
+    stage is found by its id.
+    """
+    def get(url, params=None, timeout=None):
+        del timeout
+        entry_request = re.match(r'.*/(jobs|stages)/(\d+)$', url)
+        if entry_request:
+            response = responses[1] if entry_request.group(1) == 'jobs' else responses[2]
+            id_key = 'jobId' if entry_request.group(1) == 'jobs' else 'stageId'
+            entries = [entry for entry in json.loads(response.text) if entry[id_key] == int(entry_request.group(2))]
+            return type('obj', (object,), {'status_code' : 200 if entries else 404, 'text': json.dumps(entries[:1])})
+        if url.endswith('/jobs') or url.endswith('/stages'):
+            response = responses[1] if url.endswith('/jobs') else responses[2]
+            if params and 'status' in params:
+                entries = [entry for entry in json.loads(response.text)
+                           if entry['status'].lower() == params['status']]
+                return type('obj', (object,), {'status_code' : 200, 'text': json.dumps(entries)})
+            return response
+        return responses[0]
+    return get
+
 
 class ApplicationDetailedSummaryTests(unittest.TestCase):
     def setUp(self):
@@ -18,7 +47,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
         self.mock_config = {}
 
     @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     @patch('happybase.Connection')
     def test_sparkstreaming_component(self, mock_hbase, mock_get_requests, mock_summary_registrar):
         # SparkStreaming CREATED status
@@ -51,7 +80,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
             {b'cf:create_data': '{"sparkStreaming": [{"component_name": "example", \
             "component_job_name": "app1-example-job"}]}'},
             {b'cf:status': 'STARTED'}]
-        mock_get_requests.side_effect = [
+        mock_get_requests.side_effect = route_spark_requests([
             type('obj', (object,), {'status_code' : 200, 'text': json.dumps({
                 "apps": {
                     "app": [{
@@ -71,7 +100,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
                     'status': 'COMPLETE',
                     'stageId': 1}, {
                         'status': 'COMPLETE',
-                        'stageId': 1}])})]
+                        'stageId': 1}])})])
         on_complete = Event()
         app_summary.generate_summary("app1")
         on_complete.wait(1)
@@ -104,7 +133,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
             {b'cf:create_data': '{"sparkStreaming": [{"component_name": "example", \
             "component_job_name": "app1-example-job"}]}'},
             {b'cf:status': 'STARTED'}]
-        mock_get_requests.side_effect = [
+        mock_get_requests.side_effect = route_spark_requests([
             type('obj', (object,), {'status_code' : 200, 'text': json.dumps({
                 "apps": {
                     "app": [{
@@ -131,7 +160,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
                         'status': 'COMPLETE',
                         'stageId': 1}, {
                             'status': 'COMPLETE',
-                            'stageId': 0}])})]
+                            'stageId': 0}])})])
         on_complete = Event()
         app_summary.generate_summary("app1")
         on_complete.wait(1)
@@ -190,7 +219,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
         mock_summary_registrar.assert_called_with(expected_summary, 'app1')
 
     @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     @patch('happybase.Connection')
     def test_flink_component(self, mock_hbase, mock_get_requests, mock_summary_registrar):
         # Flink CREATED status
@@ -391,7 +420,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
         mock_summary_registrar.assert_called_with(expected_summary, 'app2')
 
     @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     @patch('happybase.Connection')
     def test_oozie_component(self, mock_hbase, mock_get_requests, mock_summary_registrar):
         # Oozie coordinator CREATED status
@@ -562,6 +591,9 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
                     "startedTime": 6,
                     "diagnostics": "Failed reason",
                     "applicationType": "MAPREDUCE"}})})]
+        # finished workflows and YARN applications are cached, and the ids below are reused with new states,
+        # so start again from an empty cache
+        app_summary = ApplicationDetailedSummary(self.mock_environment, self.mock_config)
         on_complete = Event()
         app_summary.generate_summary("app3")
         on_complete.wait(1)
@@ -655,6 +687,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
                     "startedTime": 7,
                     "diagnostics": "",
                     "applicationType": "SPARK"}})})]
+        app_summary = ApplicationDetailedSummary(self.mock_environment, self.mock_config)
         on_complete = Event()
         app_summary.generate_summary("app3")
         on_complete.wait(1)
@@ -722,6 +755,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
                     "startedTime": 6,
                     "diagnostics": "Failed Reason",
                     "applicationType": "MAPREDUCE"}})})]
+        app_summary = ApplicationDetailedSummary(self.mock_environment, self.mock_config)
         on_complete = Event()
         app_summary.generate_summary("app4")
         on_complete.wait(1)
@@ -751,7 +785,7 @@ class ApplicationDetailedSummaryTests(unittest.TestCase):
 # pylint: disable=C0301
     @patch('commands.getoutput')
     @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     @patch('happybase.Connection')
     def test_check_in_service_log(self, mock_hbase, mock_get_requests, mock_summary_registrar, \
         mock_command_out):
@@ -786,7 +820,7 @@ execute "journalctl -u platform-app-app5-example"',
         mock_summary_registrar.assert_called_with(expected_summary, 'app5')
 
     @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
-    @patch('requests.get')
+    @patch('http_session_pool.get')
     @patch('happybase.Connection')
     def test_combined_component(self, mock_hbase, mock_get_requests, mock_summary_registrar):
         mock_hbase.return_value.table.return_value.row.side_effect = [
@@ -951,3 +985,201 @@ execute "journalctl -u platform-app-app5-example"',
                                     'yarnId': u'application_124'}},
                             'name': u'app6-subworkflow'}},
                     'name': u'app6-workflow'}}}, "app6")
+
+    @patch.object(HBaseAppplicationSummary, 'post_to_hbase')
+    @patch.object(HBaseAppplicationSummary, 'sync_with_dm')
+    @patch('happybase.Connection')
+    def test_generate_schedules_due_applications(self, mock_hbase, mock_sync, mock_post):
+        #pylint: disable=protected-access
+        statuses = {'running': 'STARTED', 'finished': 'STARTED', 'created': 'CREATED'}
+        component_statuses = {'running': ['RUNNING'], 'finished': ['COMPLETED'], 'created': ['CREATED']}
+        summarized = []
+
+        def get_application_summary(application, _):
+            summarized.append(application)
+            if component_statuses[application] is None:
+                raise Exception('Summary failed')
+            app_data = dict(('component-%d' % index, {'aggregate_status': status})
+                            for index, status in enumerate(component_statuses[application]))
+            app_data['aggregate_status'] = ComponentSummaryAggregator().process_application_data(app_data)
+            return {application: app_data}
+
+        app_summary = ApplicationDetailedSummary(self.mock_environment, {'summary_threads': 2})
+        app_summary._application_registrar.list_application_statuses = lambda: dict(statuses)
+        app_summary._application_registrar.get_create_data = lambda application: {}
+        app_summary._summary_aggregator.get_application_summary = get_application_summary
+
+        # everything is summarized the first time, and generate waits for all of them
+        app_summary.generate()
+        self.assertEqual(sorted(summarized), ['created', 'finished', 'running'])
+        self.assertEqual(mock_post.call_count, 3)
+
+        # only running applications are summarized again
+        del summarized[:]
+        app_summary.generate()
+        self.assertEqual(summarized, ['running'])
+
+        # as are applications whose status has changed
+        del summarized[:]
+        statuses['finished'] = 'STOPPED'
+        app_summary.generate()
+        self.assertEqual(sorted(summarized), ['finished', 'running'])
+        mock_sync.assert_called_with(statuses.keys())
+
+        # and every application once the quiet interval has passed
+        del summarized[:]
+        app_summary._quiet_interval = 0
+        app_summary.generate()
+        self.assertEqual(sorted(summarized), ['created', 'finished', 'running'])
+        app_summary._quiet_interval = 300
+
+        # a component still running keeps an application due, although a finished one decides its aggregate status
+        del summarized[:]
+        component_statuses['running'] = ['RUNNING', 'FAILED']
+        app_summary.generate()
+        app_summary.generate()
+        self.assertEqual(summarized, ['running', 'running'])
+
+        # failed summaries are tried again whatever the status of the application
+        del summarized[:]
+        component_statuses['created'] = None
+        statuses['created'] = 'STOPPED'
+        app_summary.generate()
+        statuses['created'] = 'CREATED'
+        app_summary.generate()
+        app_summary.generate()
+        self.assertEqual(summarized.count('created'), 3)
+
+    @patch('http_session_pool.get')
+    def test_yarn_list_shared_within_cycle(self, mock_get_requests):
+        mock_get_requests.return_value = type('obj', (object,), {'status_code' : 200, 'text': json.dumps({
+            "apps": {"app": [
+                {"name": "app1-example-job", "id": "application_1", "startedTime": 5},
+                {"name": "app1-example-job", "id": "application_3", "startedTime": 9},
+                {"name": "app1-example-job", "id": "application_2", "startedTime": 7},
+                {"name": "app2-example-job", "id": "application_4", "startedTime": 1}]}})})
+        self.mock_environment['rest_api_req_timeout'] = 5
+        yarn_connection = YarnConnection(self.mock_environment)
+
+        yarn_connection.start_cycle()
+        self.assertEqual(yarn_connection.check_in_yarn('app1-example-job')['id'], 'application_3')
+        self.assertEqual(yarn_connection.check_in_yarn('app2-example-job')['id'], 'application_4')
+        self.assertEqual(yarn_connection.check_in_yarn('app3-example-job'), None)
+        self.assertEqual(mock_get_requests.call_count, 1)
+
+        # outside a cycle the list is read every time
+        yarn_connection.end_cycle()
+        yarn_connection.check_in_yarn('app1-example-job')
+        yarn_connection.check_in_yarn('app1-example-job')
+        self.assertEqual(mock_get_requests.call_count, 3)
+
+    @patch('http_session_pool.get')
+    @patch('happybase.Connection')
+    def test_oozie_finished_jobs_cached(self, mock_hbase, mock_get_requests):
+        #pylint: disable=protected-access
+        def workflow(job_id, status, actions, last_modified=None):
+            return {'id': job_id, 'appName': 'wf-%s' % job_id, 'status': status,
+                    'lastModifiedTime': last_modified, 'actions': actions}
+
+        def sub_workflow_action(job_id):
+            return {'externalId': job_id, 'type': 'sub-workflow', 'status': 'OK'}
+
+        def job_action(job_id):
+            return {'externalId': job_id, 'externalChildIDs': None, 'type': 'spark',
+                    'status': 'OK', 'name': 'process'}
+
+        jobs = {
+            '1-oozie-oozi-W': workflow('1-oozie-oozi-W', 'RUNNING',
+                                       [sub_workflow_action('2-oozie-oozi-W'), sub_workflow_action('3-oozie-oozi-W')],
+                                       'Mon, 01 Jan 2018 00:00:00 GMT'),
+            '2-oozie-oozi-W': workflow('2-oozie-oozi-W', 'SUCCEEDED', [job_action('job_2')]),
+            '3-oozie-oozi-W': workflow('3-oozie-oozi-W', 'RUNNING', [job_action('job_3')],
+                                       'Mon, 01 Jan 2018 00:00:00 GMT')}
+        yarn_states = {'application_2': 'FINISHED', 'application_3': 'RUNNING'}
+        requested = []
+
+        def get(url, timeout=None):
+            requested.append(url.split('/')[-1])
+            if '/ws/v1/cluster/apps/' in url:
+                return type('obj', (object,), {'text': json.dumps({'app': {
+                    'state': yarn_states[url.split('/')[-1]], 'finalStatus': 'SUCCEEDED', 'startedTime': 1,
+                    'diagnostics': '', 'applicationType': 'SPARK'}})})
+            return type('obj', (object,), {'text': json.dumps(jobs[url.split('/')[-1]])})
+
+        mock_get_requests.side_effect = get
+        self.mock_environment['rest_api_req_timeout'] = 5
+        app_summary = ApplicationDetailedSummary(self.mock_environment, self.mock_config)
+        summary = app_summary._load_creator('oozie')
+
+        first = summary._oozie_action_handler([sub_workflow_action('1-oozie-oozi-W')])
+        self.assertEqual(sorted(requested), ['1-oozie-oozi-W', '2-oozie-oozi-W', '3-oozie-oozi-W',
+                                             'application_2', 'application_3'])
+
+        # the finished sub-workflow and YARN application are not fetched again
+        del requested[:]
+        self.assertEqual(summary._oozie_action_handler([sub_workflow_action('1-oozie-oozi-W')]), first)
+        self.assertEqual(sorted(requested), ['1-oozie-oozi-W', '3-oozie-oozi-W', 'application_3'])
+
+        # a running workflow whose descendants have all finished is reused until it is modified
+        yarn_states['application_3'] = 'FINISHED'
+        summary._oozie_action_handler([sub_workflow_action('1-oozie-oozi-W')])
+        del requested[:]
+        summary._oozie_action_handler([sub_workflow_action('1-oozie-oozi-W')])
+        self.assertEqual(requested, ['1-oozie-oozi-W'])
+        jobs['1-oozie-oozi-W']['lastModifiedTime'] = 'Mon, 01 Jan 2018 00:01:00 GMT'
+        del requested[:]
+        summary._oozie_action_handler([sub_workflow_action('1-oozie-oozi-W')])
+        self.assertEqual(requested, ['1-oozie-oozi-W', '3-oozie-oozi-W'])
+
+    @patch('http_session_pool.get')
+    @patch('happybase.Connection')
+    def test_spark_counts_kept_between_summaries(self, mock_hbase, mock_get_requests):
+        #pylint: disable=protected-access
+        jobs = [{'jobId': 2, 'status': 'RUNNING'}, {'jobId': 1, 'status': 'FAILED'}, {'jobId': 0, 'status': 'SUCCEEDED'}]
+        stages = [{'stageId': 2, 'status': 'ACTIVE'}, {'stageId': 1, 'status': 'SKIPPED'},
+                  {'stageId': 0, 'status': 'COMPLETE'}]
+        def respond():
+            mock_get_requests.side_effect = route_spark_requests([None,
+                                                                  type('obj', (object,), {'text': json.dumps(jobs)}),
+                                                                  type('obj', (object,), {'text': json.dumps(stages)})])
+        respond()
+        self.mock_environment['rest_api_req_timeout'] = 5
+        app_summary = ApplicationDetailedSummary(self.mock_environment, self.mock_config)
+        summary = app_summary._load_creator('sparkStreaming')
+
+        spark_data = summary._job_handler('application_1')
+        information = spark_data['information']
+        self.assertEqual(information['jobSummary'], {'number_of_jobs': 3, 'running': 1, 'succeeded': 1,
+                                                     'failed': 1, 'unknown': 0})
+        self.assertEqual(spark_data['state'], summary.component_status['red'])
+        self.assertEqual([call[1]['params'] for call in mock_get_requests.call_args_list], [None, None])
+
+        # the failed job is no longer retained by Spark, and the running job has finished
+        del jobs[:]
+        jobs.extend([{'jobId': 4, 'status': 'RUNNING'}, {'jobId': 3, 'status': 'SUCCEEDED'},
+                     {'jobId': 2, 'status': 'SUCCEEDED'}])
+        mock_get_requests.reset_mock()
+        respond()
+        spark_data = summary._job_handler('application_1')
+        information = spark_data['information']
+        self.assertEqual(information['jobSummary'], {'number_of_jobs': 5, 'running': 1, 'succeeded': 3,
+                                                     'failed': 1, 'unknown': 0})
+        # the failure is still counted, but no longer makes the job red
+        self.assertEqual(spark_data['state'], summary.component_status['green'])
+        # skipped stages are not counted as complete
+        self.assertEqual(information['stageSummary'], {'number_of_stages': 3, 'active': 1, 'complete': 1,
+                                                       'pending': 0, 'failed': 0})
+        self.assertEqual(sorted(call[1]['params']['status'] for call in mock_get_requests.call_args_list
+                                if 'params' in call[1]),
+                         ['active', 'failed', 'failed', 'pending', 'running', 'skipped', 'unknown'])
+
+        # jobs that started and finished since the last summary are only found by their ids
+        jobs.insert(0, {'jobId': 5, 'status': 'SUCCEEDED'})
+        jobs.insert(0, {'jobId': 6, 'status': 'SUCCEEDED'})
+        jobs.insert(0, {'jobId': 7, 'status': 'SUCCEEDED'})
+        jobs[3]['status'] = 'SUCCEEDED'
+        respond()
+        information = summary._job_handler('application_1')['information']
+        self.assertEqual(information['jobSummary'], {'number_of_jobs': 8, 'running': 0, 'succeeded': 7,
+                                                     'failed': 1, 'unknown': 0})
+        self.assertEqual(information['stageSummary']['number_of_stages'], 3)
@@ -21,24 +21,53 @@ License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 either express or implied.
 """
 
+import json
+import time
 import unittest
-from mock import patch
+from mock import patch, call, Mock, MagicMock
 import happybase  # pylint: disable=unused-import
 from Hbase_thrift import AlreadyExists
 from application_registrar import HbaseApplicationRegistrar
 from lifecycle_states import ApplicationState
 
 
+class FakeTable(object):
+    """
+    Just enough of a happybase table, kept in memory, for the registrar to read back what it wrote
+    """
+
+    def __init__(self, rows=None):
+        self._rows = rows or {}
+
+    def row(self, key, columns=None):
+        return dict((column, value) for column, value in self._rows.get(key, {}).items()
+                    if columns is None or column in columns)
+
+    def rows(self, keys, columns=None):
+        return [(key, self.row(key, columns)) for key in keys if self.row(key, columns)]
+
+    def put(self, key, data):
+        self._rows.setdefault(key, {}).update(data)
+
+    def delete(self, key, columns=None):
+        if columns is None:
+            self._rows.pop(key, None)
+        else:
+            for column in columns:
+                self._rows.get(key, {}).pop(column, None)
+
+
 class ApplicationRegistrarTests(unittest.TestCase):
     @patch('happybase.Connection')
     def test_create_application(self, hbase_mock):
         registrar = HbaseApplicationRegistrar('1.2.3.4')
         registrar.create_application('pname', 'aname', {'over': 'ride'}, {'def': 'ault'})
 
-        hbase_mock.return_value.table.return_value.put.assert_called_once_with(
-            'aname',
-            {b'cf:package_name': 'pname', b'cf:status': ApplicationState.NOTCREATED, b'cf:overrides': '{"over": "ride"}',
-             b'cf:defaults': '{"def": "ault"}', b'cf:name': 'aname'})
+        self.assertEqual(hbase_mock.return_value.table.return_value.put.call_args_list, [
+            call('aname',
+                 {b'cf:package_name': 'pname', b'cf:status': ApplicationState.NOTCREATED, b'cf:overrides': '{"over": "ride"}',
+                  b'cf:defaults': '{"def": "ault"}', b'cf:name': 'aname'}),
+            call('pname', {b'cf:aname': b''})])
 
     @patch('happybase.Connection')
     def test_table_exists(self, hbase_mock):
@@ -77,9 +106,39 @@ class ApplicationRegistrarTests(unittest.TestCase):
 
     @patch('happybase.Connection')
     def test_delete_package(self, hbase_mock):
+        applications_table = Mock()
+        index_table = Mock()
+        hbase_mock.return_value.table.side_effect = lambda name: \
+            index_table if name == 'platform_package_applications' else applications_table
+        applications_table.row.return_value = {b'cf:package_name': b'p'}
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+        registrar.delete_application('name')
+        applications_table.delete.assert_called_once_with('name')
+        # the application is removed from the index of its package
+        index_table.delete.assert_called_once_with(b'p', columns=[b'cf:name'])
+
+    @patch('happybase.Connection')
+    def test_recreate_with_another_package(self, hbase_mock):
+        tables = {'platform_applications': FakeTable(),
+                  'platform_package_applications': FakeTable({
+                      HbaseApplicationRegistrar.PACKAGE_INDEX_BUILT_ROW: {b'cf:built': b'true'}})}
+        hbase_mock.return_value.table.side_effect = lambda name: tables[name]
         registrar = HbaseApplicationRegistrar('1.2.3.4')
+
+        registrar.create_application('p', 'name', {}, {})
+        registrar.set_application_status('name', ApplicationState.CREATED)
+        self.assertEqual(registrar.list_applications_for_package('p'), ['name'])
         registrar.delete_application('name')
-        hbase_mock.return_value.table.return_value.delete.assert_called_once_with('name')
+        registrar.create_application('q', 'name', {}, {})
+        registrar.set_application_status('name', ApplicationState.CREATED)
+
+        self.assertEqual(registrar.list_applications_for_package('p'), [])
+        self.assertEqual(registrar.list_applications_for_package('q'), ['name'])
+
+        # an entry left behind by an application recreated with another package is not listed, and is pruned
+        tables['platform_package_applications'].put(b'p', {b'cf:name': b''})
+        self.assertEqual(registrar.list_applications_for_package('p'), [])
+        self.assertEqual(tables['platform_package_applications'].row(b'p'), {})
 
     @patch('happybase.Connection')
     def test_get_application(self, hbase_mock):
@@ -107,6 +166,34 @@ class ApplicationRegistrarTests(unittest.TestCase):
         result = registrar.get_application('name')
         self.assertEqual(result, None)
 
+    @patch('happybase.Connection')
+    def test_acquire_operation(self, hbase_mock):
+        table = hbase_mock.return_value.table.return_value
+        client = hbase_mock.return_value.client
+        client.checkAndPut.return_value = True
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+
+        table.row.return_value = {}
+        self.assertTrue(registrar.acquire_operation('name', ApplicationState.STARTING, 60))
+        args = client.checkAndPut.call_args[0]
+        self.assertEqual(args[:4], (b'platform_applications', b'name', b'cf:operation', None))
+        self.assertEqual(json.loads(args[4].value)['operation'], ApplicationState.STARTING)
+
+        # held by an operation that has not timed out
+        table.row.return_value = {b'cf:operation': json.dumps({'operation': 'STOPPING', 'expires': time.time() + 60})}
+        self.assertFalse(registrar.acquire_operation('name', ApplicationState.STARTING, 60))
+        self.assertEqual(client.checkAndPut.call_count, 1)
+
+        # an expired claim is only taken over if it has not changed since it was read
+        expired = json.dumps({'operation': 'STOPPING', 'expires': time.time() - 1})
+        table.row.return_value = {b'cf:operation': expired}
+        client.checkAndPut.return_value = False
+        self.assertFalse(registrar.acquire_operation('name', ApplicationState.STARTING, 60))
+        self.assertEqual(client.checkAndPut.call_args[0][3], expired)
+
+        registrar.release_operation('name')
+        table.delete.assert_called_once_with(b'name', columns=[b'cf:operation'])
+
     @patch('happybase.Connection')
     def test_application_exists(self, hbase_mock):
         hbase_mock.return_value.table.return_value.row.return_value = {b'cf:status': ApplicationState.CREATED}
@@ -120,18 +207,100 @@ class ApplicationRegistrarTests(unittest.TestCase):
         result = registrar.application_exists('name')
         self.assertEqual(result, False)
 
+    @patch('happybase.Connection')
+    def test_operation_without_application(self, hbase_mock):
+        # a create claims the application before its record is written
+        hbase_mock.return_value.table.return_value.row.return_value = {
+            b'cf:operation': json.dumps({'operation': ApplicationState.CREATING, 'expires': time.time() + 60})}
+
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+        self.assertEqual(registrar.get_application('name'), None)
+        self.assertFalse(registrar.application_exists('name'))
+        self.assertFalse(registrar.application_has_record('name'))
+
+        # rows without a status are left out of scans
+        hbase_mock.return_value.table.return_value.scan.return_value = iter([])
+        self.assertEqual(registrar.list_applications(), [])
+        self.assertTrue(hbase_mock.return_value.table.return_value.scan.call_args[1]['filter'].endswith('true, true)'))
+
     @patch('happybase.Connection')
     def test_list_packages(self, hbase_mock):
         hbase_mock.return_value.table.return_value.scan.return_value = [
-            ('name1', {b'cf:status': ApplicationState.CREATED, b'cf:package_name': 'p'}),
-            ('name2', {b'cf:status': ApplicationState.NOTCREATED, b'cf:package_name': 'p'})]
+            ('name1', {b'cf:status': ApplicationState.CREATED})]
 
         registrar = HbaseApplicationRegistrar('1.2.3.4')
         result = registrar.list_applications()
         self.assertEqual(result, ['name1'])
+        hbase_mock.return_value.table.return_value.scan.assert_called_once_with(
+            row_start=None,
+            columns=[b'cf:status'],
+            filter="SingleColumnValueFilter ('cf', 'status', !=, 'binary:NOTCREATED', true, true)",
+            limit=None,
+            batch_size=HbaseApplicationRegistrar.SCAN_BATCH_SIZE)
+
+    @patch('happybase.Connection')
+    def test_list_applications_page(self, hbase_mock):
+        hbase_mock.return_value.table.return_value.scan.return_value = [
+            ('name3', {b'cf:status': ApplicationState.CREATED}),
+            ('name4', {b'cf:status': ApplicationState.STARTED})]
+
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+        result = registrar.list_applications(limit=2, start_after='name2')
+        self.assertEqual(result, ['name3', 'name4'])
+        _, kwargs = hbase_mock.return_value.table.return_value.scan.call_args
+        self.assertEqual(kwargs['row_start'], b'name2\x00')
+        self.assertEqual(kwargs['limit'], 2)
 
+    @patch('happybase.Connection')
+    def test_list_application_statuses(self, hbase_mock):
+        hbase_mock.return_value.table.return_value.scan.return_value = [
+            ('name1', {b'cf:status': ApplicationState.CREATED}),
+            ('name2', {b'cf:status': ApplicationState.STARTED})]
+
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+        result = registrar.list_application_statuses()
+        self.assertEqual(result, {'name1': ApplicationState.CREATED, 'name2': ApplicationState.STARTED})
+
+    @patch('happybase.Connection')
+    def test_list_applications_for_package(self, hbase_mock):
+        applications_table = Mock()
+        index_table = Mock()
+        hbase_mock.return_value.table.side_effect = lambda name: \
+            index_table if name == 'platform_package_applications' else applications_table
+        index_rows = {
+            HbaseApplicationRegistrar.PACKAGE_INDEX_BUILT_ROW: {b'cf:built': b'true'},
+            'p': {b'cf:name1': b'', b'cf:name2': b'', b'cf:name3': b''}}
+        index_table.row.side_effect = lambda key: index_rows.get(key, {})
+        applications_table.rows.return_value = [
+            ('name1', {b'cf:status': ApplicationState.CREATED, b'cf:package_name': b'p'}),
+            ('name2', {b'cf:status': ApplicationState.NOTCREATED, b'cf:package_name': b'p'})]
+
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
         result = registrar.list_applications_for_package('p')
         self.assertEqual(result, ['name1'])
+        applications_table.rows.assert_called_once_with(['name1', 'name2', 'name3'],
+                                                        columns=[b'cf:status', b'cf:package_name'])
+        applications_table.scan.assert_not_called()
+        # name3 no longer exists so is pruned from the index
+        index_table.delete.assert_called_once_with('p', columns=[b'cf:name3'])
 
         result = registrar.list_applications_for_package('q')
         self.assertEqual(result, [])
+
+    @patch('happybase.Connection')
+    def test_build_package_index(self, hbase_mock):
+        applications_table = Mock()
+        index_table = MagicMock()
+        hbase_mock.return_value.table.side_effect = lambda name: \
+            index_table if name == 'platform_package_applications' else applications_table
+        index_table.row.return_value = {}
+        applications_table.scan.return_value = [('name1', {b'cf:package_name': 'p'}), ('name2', {b'cf:package_name': 'q'})]
+
+        registrar = HbaseApplicationRegistrar('1.2.3.4')
+        registrar.list_applications_for_package('p')
+        registrar.list_applications_for_package('p')
+
+        applications_table.scan.assert_called_once_with(columns=[b'cf:package_name'])
+        batch = index_table.batch.return_value.__enter__.return_value
+        self.assertEqual(batch.put.call_args_list, [call('p', {b'cf:name1': b''}), call('q', {b'cf:name2': b''})])
+        index_table.put.assert_called_once_with(HbaseApplicationRegistrar.PACKAGE_INDEX_BUILT_ROW, {b'cf:built': b'true'})
@@ -19,9 +19,11 @@ License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 either express or implied.
 """
 
+import time
 import unittest
 from threading import Event
-from async_dispatcher import AsyncDispatcher
+from async_dispatcher import AsyncDispatcher, Lane, TaskCancelled, PRIORITY_HIGH, PRIORITY_LOW
+from exceptiondef import Overloaded
 
 
 class GenerateRecord(unittest.TestCase):
@@ -60,3 +62,51 @@ class GenerateRecord(unittest.TestCase):
         wait_for_exception.wait(timeout=5)
         self.assertIsInstance(asynch_result[0], Exception)
         self.assertEquals(asynch_result[0].message, test_exception_message)
+
+
+class LaneTests(unittest.TestCase):
+    def setUp(self):
+        self.release = Event()
+        self.dispatcher = AsyncDispatcher(lanes=[Lane('slow', 1, max_queue=1), Lane('fast', 1)])
+        self.blocker = self.dispatcher.run_as_asynch(self.release.wait, lane='slow')
+        # wait for the blocker to start so that it no longer counts against the queue limit
+        for _ in range(100):
+            if self.dispatcher.metrics()['slow']['running'] == 1:
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_lanes_are_independent(self):
+        task = self.dispatcher.run_as_asynch(lambda: 'read', lane='fast')
+        self.assertEqual(task.get_result(timeout=5), 'read')
+        self.assertFalse(self.blocker.done())
+
+    def test_full_queue_rejected(self):
+        self.dispatcher.run_as_asynch(lambda: None, lane='slow')
+        self.assertRaises(Overloaded, self.dispatcher.run_as_asynch, lambda: None, lane='slow')
+        self.assertEqual(self.dispatcher.metrics()['slow']['rejected'], 1)
+
+    def test_priority_and_cancel(self):
+        order = []
+        dispatcher = AsyncDispatcher(lanes=[Lane('lane', 1)])
+        dispatcher.run_as_asynch(self.release.wait, lane='lane')
+        low = dispatcher.run_as_asynch(lambda: order.append('low'), lane='lane', priority=PRIORITY_LOW)
+        high = dispatcher.run_as_asynch(lambda: order.append('high'), lane='lane', priority=PRIORITY_HIGH)
+        cancelled = dispatcher.run_as_asynch(lambda: order.append('cancelled'), lane='lane', priority=PRIORITY_HIGH)
+        self.assertTrue(cancelled.cancel())
+        self.release.set()
+
+        low.get_result(timeout=5)
+        high.get_result(timeout=5)
+        self.assertRaises(TaskCancelled, cancelled.get_result)
+        self.assertEqual(order, ['high', 'low'])
+
+    def test_deadline(self):
+        errors = []
+        task = self.dispatcher.run_as_asynch(lambda: None, on_error=errors.append, lane='slow', timeout=0)
+        self.release.set()
+        self.assertRaises(Overloaded, task.get_result, 5)
+        self.assertIsInstance(errors[0], Overloaded)
+        self.assertEqual(self.dispatcher.metrics()['slow']['expired'], 1)
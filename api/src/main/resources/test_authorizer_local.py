@@ -18,17 +18,21 @@ License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 either express or implied.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+from mock import patch
 from authorizer_local import AuthorizerLocal
 
 class AuthorizerLocalTesting(AuthorizerLocal):
     def add_rule(self, rule):
         self._rules['rules']['grant'].append(rule)
+        self.set_rules(self._rules)
 
     def remove_from_set(self, set_name, action):
-        print self._rules['sets'][set_name]
         self._rules['sets'][set_name].remove(action)
-        print self._rules['sets'][set_name]
+        self.set_rules(self._rules)
 
 class TestAuthorizerLocal(unittest.TestCase):
     '''
@@ -115,3 +119,41 @@ class TestAuthorizerLocal(unittest.TestCase):
         self.assertTrue(auth.authorize({'user': 'dave', 'groups': ['users', 'sys22']},
                                        {'type': 'deployment_manager:application', 'owner': None},
                                        {'name': 'deployment_manager:application:create'}))
+
+    def test_decisions_cached(self):
+        # Check that a decision is reused until the rules change
+        auth = AuthorizerLocalTesting()
+        identity = {'user': 'dave', 'groups': ['group1']}
+        resource = {'type': 'deployment_manager:application', 'owner': 'delia'}
+        action = {'name': 'deployment_manager:application:stop'}
+        self.assertFalse(auth.authorize(identity, resource, action))
+        with patch('authorizer_local.eval', create=True) as eval_mock:
+            self.assertFalse(auth.authorize(identity, resource, action))
+            eval_mock.assert_not_called()
+        auth.add_rule("'group1' in identity['groups']")
+        self.assertTrue(auth.authorize(identity, resource, action))
+
+    def test_rules_reloaded(self):
+        # Check that changes to the rules file are picked up without a restart
+        temp_dir = tempfile.mkdtemp()
+        try:
+            rules_path = os.path.join(temp_dir, 'rules.yaml')
+            with open(rules_path, 'w') as rules_file:
+                rules_file.write("rules:\n  grant:\n    - \"'admin' in identity['groups']\"\nsets: {}\n")
+            auth = AuthorizerLocal(rules_path=rules_path, check_interval=-1)
+            identity = {'user': 'dave', 'groups': ['users']}
+            resource = {'type': 'deployment_manager:package', 'owner': None}
+            action = {'name': 'deployment_manager:package:deploy'}
+            self.assertFalse(auth.authorize(identity, resource, action))
+
+            with open(rules_path, 'w') as rules_file:
+                rules_file.write("rules:\n  grant:\n    - \"'users' in identity['groups']\"\nsets: {}\n")
+            # rewritten within the same second and at the same size
+            self.assertTrue(auth.authorize(identity, resource, action))
+
+            # a broken rules file leaves the last good rules in place
+            with open(rules_path, 'w') as rules_file:
+                rules_file.write("rules:\n  grant:\n    - \"'users' in\"\nsets: {}\n")
+            self.assertTrue(auth.authorize(identity, resource, action))
+        finally:
+            shutil.rmtree(temp_dir)
@@ -21,11 +21,12 @@ either express or implied.
 """
 
 import unittest
+import threading
 import traceback
 from multiprocessing import Event
-from mock import Mock, patch, mock_open
+from mock import Mock, patch, mock_open, ANY, DEFAULT
 from deployment_manager import DeploymentManager
-from exceptiondef import NotFound, ConflictingState, FailedValidation, Forbidden
+from exceptiondef import NotFound, ConflictingState, FailedValidation, Forbidden, Overloaded
 from lifecycle_states import ApplicationState, PackageDeploymentState
 
 
@@ -47,10 +48,14 @@ class DeploymentManagerTest(unittest.TestCase):
         """
         mock_repository = Mock()
         mock_package_registar = Mock()
-        mock_package_registar.get_package_metadata = Mock(
-            return_value={"name": Mock(), "version": Mock(), "metadata": {"component_types": {}, "user": "username"}})
+        package_metadata = {"name": Mock(), "version": Mock(), "metadata": {"component_types": {}, "user": "username"}}
+        # like the registrar, there is no metadata for a package that has not been deployed
+        mock_package_registar.get_package_metadata = Mock(return_value=package_metadata)
+        mock_package_registar.get_package_metadata.side_effect = \
+            lambda package_name: DEFAULT if mock_package_registar.package_exists(package_name) else None
         package_status = {}
         mock_package_registar.get_package_deploy_status = lambda package: package_status.get(package, None)
+        mock_package_registar.get_package_file = Mock(return_value=(Mock(), None))
         mock_package_registar.set_package_deploy_status = \
             lambda package, status: set_dictionary_value(package_status, package, status)
 
@@ -61,6 +66,7 @@ class DeploymentManagerTest(unittest.TestCase):
         self.mock_environment = {
             'webhdfs_host': 'webhdfshost',
             'webhdfs_port': 'webhdfsport',
+            'webhdfs_user': 'webhdfsuser',
             'name_node': 'namenode',
             'oozie_uri': 'oozie',
             'cluster_private_key': 'keyfile.pem',
@@ -103,7 +109,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_package(self, package_name):
                 handle_package_state_change(package_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -158,7 +164,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_application(self, app_name):
                 verify_app_state_changes(app_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -188,8 +194,8 @@ class DeploymentManagerTest(unittest.TestCase):
     @patch('datetime.datetime')
     @patch('os.system')
     @patch('deployer_utils.exec_ssh')
-    @patch('requests.put')
-    @patch('requests.post')
+    @patch('http_session_pool.put')
+    @patch('http_session_pool.post')
     @patch('deployer_utils.HDFS')
     @patch('spur.ssh')
     @patch('application_creator.shutil')
@@ -214,7 +220,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_application(self, app_name):
                 verify_app_state_changes(app_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -241,7 +247,7 @@ class DeploymentManagerTest(unittest.TestCase):
         post_mock.return_value = Resp()
         cmd_mock.return_value = (0, 'dev')
 
-        self.mock_package_registar.get_package_data.return_value = 'abcd'
+        self.mock_package_registar.get_package_file.return_value = ('abcd', None)
         self.mock_package_registar.get_package_metadata.return_value = {
             'name': 'name',
             'version': '0.0.0',
@@ -337,7 +343,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_application(self, app_name):
                 verify_app_state_changes(app_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -375,7 +381,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_application(self, app_name):
                 verify_app_state_changes(app_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -413,7 +419,7 @@ class DeploymentManagerTest(unittest.TestCase):
             def _state_change_event_application(self, app_name):
                 verify_app_state_changes(app_name)
 
-            def _assert_package_status(self, package, required_status):
+            def _assert_package_status(self, package, required_status, snapshot=None):
                 return True
 
             def _get_groups(self, user):
@@ -605,7 +611,8 @@ class DeploymentManagerTest(unittest.TestCase):
         package_registrar = Mock()
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -626,7 +633,8 @@ class DeploymentManagerTest(unittest.TestCase):
         package_registrar.list_packages.return_value = expected_packages
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -660,7 +668,8 @@ class DeploymentManagerTest(unittest.TestCase):
         package_registrar = Mock()
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -677,10 +686,11 @@ class DeploymentManagerTest(unittest.TestCase):
         repository = Mock()
         package_registrar = Mock()
         package_registrar.get_package_deploy_status.return_value = None
-        package_registrar.package_exists.return_value = False
+        package_registrar.get_package_metadata.return_value = None
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -691,7 +701,11 @@ class DeploymentManagerTest(unittest.TestCase):
                                  config)
         dmgr._get_groups = self._mock_get_groups #pylint: disable =protected-access
 
-        self.assertEqual(dmgr.get_package_info("something-1.0.0", 'username'), {
+        package_info = dmgr.get_package_info("something-1.0.0", 'username')
+        package_registrar.get_package_metadata.assert_called_once_with("something-1.0.0")
+        package_registrar.get_package_deploy_status.assert_called_once_with("something-1.0.0")
+        package_registrar.package_exists.assert_not_called()
+        self.assertEqual(package_info, {
             'defaults': None,
             'information': None,
             'user': None,
@@ -707,7 +721,8 @@ class DeploymentManagerTest(unittest.TestCase):
         application_registrar = Mock()
         application_registrar.list_applications_for_package.return_value = expected_applications
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -728,7 +743,8 @@ class DeploymentManagerTest(unittest.TestCase):
         application_registrar = Mock()
         application_registrar.list_applications.return_value = expected_applications
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -753,7 +769,8 @@ class DeploymentManagerTest(unittest.TestCase):
             'status': ApplicationState.STARTING,
             'information': None}
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -771,11 +788,11 @@ class DeploymentManagerTest(unittest.TestCase):
         package_registrar = Mock()
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        package_registrar.package_exists.return_value = True
         package_registrar.get_package_metadata.return_value = {
             'metadata': {'user': 'username'}
         }
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         class DeploymentManagerTester(DeploymentManager):
@@ -797,10 +814,11 @@ class DeploymentManagerTest(unittest.TestCase):
         repository = Mock()
         package_registrar = Mock()
         package_registrar.get_package_deploy_status.return_value = None
-        package_registrar.package_exists.return_value = False
+        package_registrar.get_package_metadata.return_value = None
         application_registrar = Mock()
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
         dmgr = DeploymentManager(repository,
                                  package_registrar,
@@ -828,7 +846,8 @@ class DeploymentManagerTest(unittest.TestCase):
             'status': ApplicationState.STARTED,
             'information': None}
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -857,7 +876,8 @@ class DeploymentManagerTest(unittest.TestCase):
             'status': ApplicationState.NOTCREATED,
             'information': None}
         application_summary_registrar = Mock()
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -887,7 +907,8 @@ class DeploymentManagerTest(unittest.TestCase):
             'package_name': 'package_name',
             'status': ApplicationState.NOTCREATED,
             'information': None}
-        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport'}
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
         config = {"deployer_thread_limit": 10}
 
         dmgr = DeploymentManager(repository,
@@ -934,3 +955,167 @@ class DeploymentManagerTest(unittest.TestCase):
             deployment_manager.start_application(self.test_app_name, 'username2')
 
         self.assertRaises(Forbidden, expect_exception)
+
+    def test_application_record_read_once(self):
+        repository = Mock()
+        package_registrar = Mock()
+        application_registrar = Mock()
+        application_registrar.get_application.return_value = {
+            'overrides': {'user': 'username'},
+            'defaults': {},
+            'name': 'name',
+            'package_name': 'package_name',
+            'status': ApplicationState.CREATED,
+            'information': None}
+        application_summary_registrar = Mock()
+        environment = {"namespace": "some_namespace", 'webhdfs_host': 'webhdfshost', 'webhdfs_port': 'webhdfsport',
+                       'webhdfs_user': 'webhdfsuser'}
+        config = {"deployer_thread_limit": 10}
+
+        dmgr = DeploymentManager(repository,
+                                 package_registrar,
+                                 application_registrar,
+                                 application_summary_registrar,
+                                 environment,
+                                 config)
+        dmgr._get_groups = self._mock_get_groups #pylint: disable =protected-access
+
+        self.assertEqual(dmgr.get_application_info('name', 'username')['status'], ApplicationState.CREATED)
+        application_registrar.get_application.assert_called_once_with('name')
+        application_registrar.application_has_record.assert_not_called()
+
+        # the record read to authorize the call is the only read of it
+        dmgr.get_application_summary('name', 'username')
+        self.assertEqual(application_registrar.get_application.call_count, 2)
+
+    @patch('deployment_manager.os.remove')
+    def test_run_batch(self, remove_mock):
+        package_registrar = Mock()
+        package_registrar.get_package_metadata.return_value = {
+            "name": "package", "version": "1.0.0", "metadata": {"component_types": {}, "user": "username"}}
+        package_registrar.get_package_deploy_status.return_value = None
+        package_registrar.get_package_file.return_value = ('stage/package-1.0.0', 'digest')
+        records = {
+            'running': {'overrides': {'user': 'username'}, 'status': ApplicationState.STARTED, 'information': None},
+            'stopped': {'overrides': {'user': 'username'}, 'status': ApplicationState.CREATED, 'information': None}}
+        application_registrar = Mock()
+        application_registrar.get_application.side_effect = records.get
+        groups_lookups = []
+
+        class MockDeploymentManager(DeploymentManager):
+            def _get_groups(self, user):
+                groups_lookups.append(user)
+                return []
+
+        config = {"deployer_thread_limit": 1, "application_callback": None}
+        dmgr = MockDeploymentManager(self.mock_repository, package_registrar, application_registrar,
+                                     self.mock_summary_registar, self.mock_environment, config)
+        dmgr._application_creator = Mock(unsafe=True) #pylint: disable =protected-access
+        dmgr._application_creator.create_application.return_value = {}
+        dmgr.dispatcher = Mock()
+        dmgr.dispatcher.run_as_asynch.side_effect = lambda task: task()
+
+        results = dmgr.run_batch([
+            {'action': 'create', 'application': 'new1', 'package': 'package-1.0.0'},
+            {'action': 'create', 'application': 'new2', 'package': 'package-1.0.0', 'oozie': {'a': {'b': 'c'}}},
+            {'action': 'stop', 'application': 'running'},
+            {'action': 'stop', 'application': 'stopped'},
+            {'action': 'restart', 'application': 'running'},
+            {'action': 'create', 'application': 'new3'}], 'username')
+
+        self.assertEqual([result['status'] for result in results],
+                         ['ACCEPTED', 'ACCEPTED', 'ACCEPTED', 'REJECTED', 'REJECTED', 'REJECTED'])
+        self.assertEqual([result.get('error') for result in results[3:]],
+                         ['ConflictingState', 'FailedValidation', 'FailedValidation'])
+        self.assertEqual(groups_lookups, ['username'])
+        package_registrar.get_package_file.assert_called_once_with('package-1.0.0')
+        remove_mock.assert_called_once_with('stage/package-1.0.0')
+        self.assertEqual(sorted(call[0][2] for call in dmgr._application_creator.create_application.call_args_list), #pylint: disable =protected-access
+                         ['new1', 'new2'])
+        self.assertEqual([call[1]['package_digest'] for call in dmgr._application_creator.create_application.call_args_list], #pylint: disable =protected-access
+                         ['digest', 'digest'])
+        application_registrar.create_application.assert_any_call(
+            'package-1.0.0', 'new2', {'package': 'package-1.0.0', 'oozie': {'a': {'b': 'c'}}, 'user': 'username'}, ANY)
+        self.assertEqual(dmgr._application_creator.stop_application.call_count, 1) #pylint: disable =protected-access
+        # each accepted operation is queued on its own
+        self.assertEqual(dmgr.dispatcher.run_as_asynch.call_count, 3)
+
+    def test_unrelated_applications_not_serialized(self):
+        records = {
+            'a': {'overrides': {'user': 'username'}, 'status': ApplicationState.CREATED, 'information': None},
+            'b': {'overrides': {'user': 'username'}, 'status': ApplicationState.CREATED, 'information': None}}
+        application_registrar = Mock()
+        application_registrar.get_application.side_effect = records.get
+        a_claimed = threading.Event()
+        b_started = threading.Event()
+
+        def acquire_operation(application, operation, timeout):
+            if application == 'a':
+                # hold the lock on 'a' until 'b' has been started
+                a_claimed.set()
+                b_started.wait(5)
+            return True
+
+        application_registrar.acquire_operation.side_effect = acquire_operation
+        config = {"deployer_thread_limit": 1, "application_callback": None}
+        dmgr = DeploymentManager(self.mock_repository, self.mock_package_registar, application_registrar,
+                                 self.mock_summary_registar, self.mock_environment, config)
+        dmgr._get_groups = self._mock_get_groups #pylint: disable =protected-access
+        dmgr.dispatcher = Mock()
+
+        start_a = threading.Thread(target=dmgr.start_application, args=('a', 'username'))
+        start_a.start()
+        self.assertTrue(a_claimed.wait(5))
+        dmgr.start_application('b', 'username')
+        b_started.set()
+        start_a.join()
+        self.assertEqual(dmgr.dispatcher.run_as_asynch.call_count, 2)
+
+    def test_application_claimed_elsewhere(self):
+        application_registrar = Mock()
+        application_registrar.get_application.return_value = {
+            'overrides': {'user': 'username'}, 'status': ApplicationState.CREATED, 'information': None}
+        application_registrar.acquire_operation.return_value = False
+        dmgr = DeploymentManager(self.mock_repository, self.mock_package_registar, application_registrar,
+                                 self.mock_summary_registar, self.mock_environment, self.mock_config)
+        dmgr._get_groups = self._mock_get_groups #pylint: disable =protected-access
+
+        self.assertRaises(ConflictingState, dmgr.start_application, 'a', 'username')
+        application_registrar.release_operation.assert_not_called()
+
+        # a claim that was taken is released if the operation is rejected
+        application_registrar.acquire_operation.return_value = True
+        self.assertRaises(Forbidden, dmgr.start_application, 'a', 'someone_else')
+        application_registrar.release_operation.assert_called_once_with('a')
+
+    @patch('deployment_manager.os.remove')
+    def test_claim_released_when_not_queued(self, remove_mock):
+        package_registrar = Mock()
+        package_registrar.get_package_metadata.return_value = {
+            "name": "package", "version": "1.0.0", "metadata": {"component_types": {}, "user": "username"}}
+        package_registrar.get_package_deploy_status.return_value = None
+        package_registrar.get_package_file.return_value = ('stage/package-1.0.0', 'digest')
+        records = {'stopped': {'overrides': {'user': 'username'}, 'status': ApplicationState.CREATED, 'information': None}}
+        application_registrar = Mock()
+        application_registrar.get_application.side_effect = records.get
+        dmgr = DeploymentManager(self.mock_repository, package_registrar, application_registrar,
+                                 self.mock_summary_registar, self.mock_environment, self.mock_config)
+        dmgr._get_groups = self._mock_get_groups #pylint: disable =protected-access
+        dmgr._application_creator = Mock(unsafe=True) #pylint: disable =protected-access
+        dmgr.dispatcher = Mock()
+        dmgr.dispatcher.run_as_asynch.side_effect = Overloaded('The default queue is full')
+
+        self.assertRaises(Overloaded, dmgr.start_application, 'stopped', 'username')
+        application_registrar.release_operation.assert_called_once_with('stopped')
+        self.assertFalse(dmgr._is_package_in_progress('stopped')) #pylint: disable =protected-access
+
+        self.assertRaises(Overloaded, dmgr.create_application, 'package-1.0.0', 'new', {'user': 'username'}, 'username')
+        application_registrar.release_operation.assert_called_with('new')
+        self.assertFalse(dmgr._is_package_in_progress('new')) #pylint: disable =protected-access
+        remove_mock.assert_called_once_with('stage/package-1.0.0')
+
+        application_registrar.release_operation.reset_mock()
+        results = dmgr.run_batch([{'action': 'start', 'application': 'stopped'}], 'username')
+        self.assertEqual((results[0]['status'], results[0]['error']), ('REJECTED', 'Overloaded'))
+        application_registrar.release_operation.assert_called_once_with('stopped')
+        self.assertFalse(dmgr._is_package_in_progress('stopped')) #pylint: disable =protected-access
@@ -0,0 +1,182 @@
+"""
+Name:       test_deployer_utils.py
+Purpose:    Unit tests for the HDFS helpers in deployer_utils
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from mock import patch, Mock
+from pywebhdfs.errors import PyWebHdfsException
+import spur
+import deployer_utils
+from deployer_utils import HDFS, unshare_file, exec_ssh
+
+
+class HdfsTests(unittest.TestCase):
+    def setUp(self):
+        self.local_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.local_path, 'lib', 'jars'))
+        os.makedirs(os.path.join(self.local_path, 'conf'))
+        for name in ['lib/jars/a.jar', 'lib/b.jar', 'workflow.xml', 'properties.json']:
+            with open(os.path.join(self.local_path, name), 'w') as local_file:
+                local_file.write(name)
+
+    def tearDown(self):
+        shutil.rmtree(self.local_path)
+
+    @staticmethod
+    def _response(status_code, headers=None):
+        response = Mock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        return response
+
+    @patch('requests.Session')
+    def test_recursive_copy(self, session_mock):
+        session = session_mock.return_value
+
+        def put(uri, params=None, allow_redirects=True, data=None, headers=None, timeout=None):
+            if params is None:
+                return self._response(201)
+            if params['op'] == 'CREATE':
+                return self._response(307, {'location': 'http://datanode/%s' % uri.split('/v1/')[1]})
+            return self._response(200)
+        session.put.side_effect = put
+
+        HDFS('namenode', '14000', 'hdfs').recursive_copy(self.local_path, '/user/app/component',
+                                                         exclude=['properties.json'], threads=3)
+
+        made = sorted(call[0][0] for call in session.put.call_args_list
+                      if call[1].get('params', {}).get('op') == 'MKDIRS')
+        self.assertEqual(made, ['http://namenode:14000/webhdfs/v1/user/app/component/conf',
+                                'http://namenode:14000/webhdfs/v1/user/app/component/lib/jars'])
+        uploaded = sorted((call[0][0], call[1]['data']) for call in session.put.call_args_list
+                          if 'data' in call[1])
+        self.assertEqual(uploaded, [('http://datanode/user/app/component/lib/b.jar', 'lib/b.jar'),
+                                    ('http://datanode/user/app/component/lib/jars/a.jar', 'lib/jars/a.jar'),
+                                    ('http://datanode/user/app/component/workflow.xml', 'workflow.xml')])
+        self.assertEqual(session.close.call_count, 3)
+        # no request can wait forever on a stalled node
+        self.assertEqual(set(call[1]['timeout'] for call in session.put.call_args_list), set([(10, 120)]))
+
+    @patch('requests.Session')
+    def test_recursive_copy_failure(self, session_mock):
+        session_mock.return_value.put.return_value = self._response(403)
+        hdfs = HDFS('namenode', '14000', 'hdfs')
+        self.assertRaises(PyWebHdfsException, hdfs.recursive_copy, self.local_path, '/user/app/component')
+
+
+class UnshareFileTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_unshare_hard_linked_file(self):
+        original = os.path.join(self.root, 'original')
+        staged = os.path.join(self.root, 'staged')
+        with open(original, 'w') as original_file:
+            original_file.write('original')
+        os.link(original, staged)
+
+        unshare_file(staged)
+        with open(staged, 'w') as staged_file:
+            staged_file.write('modified')
+        with open(original) as original_file:
+            self.assertEqual(original_file.read(), 'original')
+        self.assertEqual(os.stat(original).st_nlink, 1)
+
+        # files that are not linked elsewhere, or do not exist, are left alone
+        unshare_file(staged)
+        unshare_file(os.path.join(self.root, 'missing'))
+        self.assertEqual(sorted(os.listdir(self.root)), ['original', 'staged'])
+
+
+def _run_locally(command):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, stderr_output = process.communicate()
+    if process.returncode != 0:
+        raise spur.results.RunProcessError(process.returncode, output, stderr_output)
+
+
+class ExecSshTests(unittest.TestCase):
+    def setUp(self):
+        self.shell = Mock()
+        self.pool = Mock()
+        self.pool.shell.return_value.__enter__ = Mock(return_value=self.shell)
+        self.pool.shell.return_value.__exit__ = Mock(return_value=False)
+
+    def test_batch_runs_one_remote_shell(self):
+        with patch.object(deployer_utils, 'SSH_POOL', self.pool):
+            exec_ssh('host', 'user', 'key.pem', ['mkdir -p /a', 'sudo initctl start b\n'])
+
+        self.pool.shell.assert_called_once_with('host', 'user', 'key.pem')
+        self.assertEqual(self.shell.run.call_count, 1)
+        script = self.shell.run.call_args[0][0][2]
+        self.assertIn('( mkdir -p /a\n)', script)
+        self.assertIn('( sudo initctl start b\n\n)', script)
+
+    def test_batched_commands_isolated(self):
+        root = tempfile.mkdtemp()
+        try:
+            self.shell.run.side_effect = _run_locally
+            output = os.path.join(root, 'output')
+            with patch.object(deployer_utils, 'SSH_POOL', self.pool):
+                exec_ssh('host', 'user', 'key.pem', ['cd /tmp && value=1',
+                                                     'echo "$(pwd) $value" >> %s' % output,
+                                                     'exit 1',
+                                                     'echo done >> %s' % output])
+            with open(output) as output_file:
+                self.assertEqual(output_file.read(), '%s \ndone\n' % os.getcwd())
+        finally:
+            shutil.rmtree(root)
+
+    @patch('deployer_utils.logging')
+    def test_batch_logs_failed_commands(self, logging_mock):
+        self.shell.run.side_effect = spur.results.RunProcessError(
+            1, '', 'no such file\n%s1\n' % deployer_utils.BATCH_FAILURE_MARKER)
+        with patch.object(deployer_utils, 'SSH_POOL', self.pool):
+            exec_ssh('host', 'user', 'key.pem', ['true', 'false'])
+
+        self.assertEqual(logging_mock.error.call_count, 1)
+        self.assertEqual(logging_mock.error.call_args[0][1], 'false')
+
+    def test_check_raises_after_running_every_command(self):
+        failure = spur.results.RunProcessError(1, '', 'false\n%s0\n' % deployer_utils.BATCH_FAILURE_MARKER)
+        self.shell.run.side_effect = failure
+        with patch.object(deployer_utils, 'SSH_POOL', self.pool):
+            exec_ssh('host', 'user', 'key.pem', ['true', 'false'])
+            with self.assertRaises(spur.results.RunProcessError) as context:
+                exec_ssh('host', 'user', 'key.pem', ['false', 'true'], check=True)
+            self.assertEqual(context.exception, failure)
+            with self.assertRaises(spur.results.RunProcessError):
+                exec_ssh('host', 'user', 'key.pem', ['false'], check=True)
+
+    def test_unbatched_runs_each_command(self):
+        with patch.object(deployer_utils, 'SSH_POOL', self.pool):
+            exec_ssh('host', 'user', 'key.pem', ['true', 'false'], batch=False)
+
+        self.assertEqual([call[0][0] for call in self.shell.run.call_args_list],
+                         [['bash', '-c', 'true'], ['bash', '-c', 'false']])
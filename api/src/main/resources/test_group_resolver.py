@@ -0,0 +1,99 @@
+"""
+Name:       test_group_resolver.py
+Purpose:    Unit tests for the group resolver
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+
+import time
+import unittest
+from mock import Mock, patch
+from group_resolver import GroupResolver, UnknownUser, lookup_groups
+
+
+class GroupResolverTests(unittest.TestCase):
+    def test_groups_cached(self):
+        lookup = Mock(return_value=['users', 'primary'])
+        resolver = GroupResolver(lookup=lookup)
+
+        self.assertEqual(resolver.get_groups('alice'), ['users', 'primary'])
+        resolver.get_groups('alice').append('changed')
+        self.assertEqual(resolver.get_groups('alice'), ['users', 'primary'])
+        lookup.assert_called_once_with('alice')
+        metrics = resolver.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['entries']), (2, 1, 1))
+
+        resolver.invalidate('alice')
+        resolver.get_groups('alice')
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_expired_entries_looked_up_again(self):
+        lookup = Mock(return_value=['primary'])
+        resolver = GroupResolver(ttl=-1, lookup=lookup)
+        resolver.get_groups('alice')
+        resolver.get_groups('alice')
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_unknown_users_cached(self):
+        lookup = Mock(side_effect=UnknownUser('nobody'))
+        resolver = GroupResolver(lookup=lookup)
+        self.assertRaises(UnknownUser, resolver.get_groups, 'nobody')
+        self.assertRaises(UnknownUser, resolver.get_groups, 'nobody')
+        lookup.assert_called_once_with('nobody')
+        self.assertEqual(resolver.metrics()['negative_hits'], 1)
+
+    def test_errors_not_cached(self):
+        lookup = Mock(side_effect=[IOError('directory unavailable'), ['primary']])
+        resolver = GroupResolver(lookup=lookup)
+        self.assertRaises(IOError, resolver.get_groups, 'alice')
+        self.assertEqual(resolver.get_groups('alice'), ['primary'])
+        self.assertEqual(resolver.metrics()['errors'], 1)
+
+    def test_background_refresh(self):
+        lookup = Mock(return_value=['primary'])
+        resolver = GroupResolver(refresh_interval=0.05, lookup=lookup)
+        try:
+            resolver.get_groups('alice')
+            for _ in range(100):
+                if resolver.metrics()['refreshes']:
+                    break
+                time.sleep(0.05)
+            self.assertTrue(resolver.metrics()['refreshes'] >= 1)
+            # users not asked for since the last refresh are dropped rather than refreshed forever
+            for _ in range(100):
+                if not resolver.metrics()['entries']:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(resolver.metrics()['entries'], 0)
+        finally:
+            resolver.stop()
+
+    @patch('group_resolver.os')
+    @patch('group_resolver.grp')
+    @patch('group_resolver.pwd')
+    def test_lookup_groups(self, pwd_mock, grp_mock, os_mock):
+        pwd_mock.getpwnam.return_value = Mock(pw_gid=100)
+        grp_mock.getgrgid.return_value = Mock(gr_name='primary')
+        del os_mock.getgrouplist
+        grp_mock.getgrall.return_value = [Mock(gr_name='users', gr_mem=['alice']), Mock(gr_name='admins', gr_mem=['bob'])]
+        self.assertEqual(lookup_groups('alice'), ['users', 'primary'])
+
+        pwd_mock.getpwnam.side_effect = KeyError('nobody')
+        self.assertRaises(UnknownUser, lookup_groups, 'nobody')
@@ -0,0 +1,86 @@
+"""
+Name:       test_hbase_connection_pool.py
+Purpose:    Unit tests for the HBase connection pool
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import unittest
+from mock import patch, Mock
+from thriftpy2.transport import TTransportException
+from hbase_connection_pool import HbaseConnectionPool
+from exceptiondef import Overloaded
+
+
+class HbaseConnectionPoolTests(unittest.TestCase):
+    @patch('happybase.Connection')
+    def test_connection_reused(self, hbase_mock):
+        pool = HbaseConnectionPool('1.2.3.4', size=2)
+        with pool.connection() as connection:
+            connection.table('t').row('a')
+        with pool.connection() as connection:
+            connection.table('t').row('b')
+
+        hbase_mock.assert_called_once_with('1.2.3.4')
+        hbase_mock.return_value.close.assert_not_called()
+
+    @patch('happybase.Connection')
+    def test_reconnect_after_transport_error(self, hbase_mock):
+        broken = Mock()
+        healthy = Mock()
+        hbase_mock.side_effect = [broken, healthy]
+        pool = HbaseConnectionPool('1.2.3.4', size=1)
+
+        def use_broken_connection():
+            with pool.connection():
+                raise TTransportException(message='connection reset')
+
+        self.assertRaises(TTransportException, use_broken_connection)
+        broken.close.assert_called_once_with()
+
+        with pool.connection() as connection:
+            self.assertEqual(connection, healthy)
+
+    @patch('happybase.Connection')
+    def test_health_check_on_idle_connection(self, hbase_mock):
+        stale = Mock()
+        stale.tables.side_effect = TTransportException(message='idle timeout')
+        fresh = Mock()
+        hbase_mock.side_effect = [stale, fresh]
+        pool = HbaseConnectionPool('1.2.3.4', size=1, health_check_interval=-1)
+
+        with pool.connection() as connection:
+            self.assertEqual(connection, stale)
+        with pool.connection() as connection:
+            self.assertEqual(connection, fresh)
+
+        stale.close.assert_called_once_with()
+
+    @patch('happybase.Connection')
+    def test_checkout_timeout(self, hbase_mock):
+        pool = HbaseConnectionPool('1.2.3.4', size=1, checkout_timeout=0.01)
+
+        def borrow():
+            with pool.connection():
+                pass
+
+        with pool.connection() as connection:
+            self.assertEqual(connection, hbase_mock.return_value)
+            self.assertRaises(Overloaded, borrow)
+        borrow()
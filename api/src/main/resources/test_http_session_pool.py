@@ -0,0 +1,57 @@
+"""
+Name:       test_http_session_pool.py
+Purpose:    Unit tests for the HTTP session pool
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import unittest
+from mock import patch, MagicMock
+from http_session_pool import HttpSessionPool, create_session_pool
+
+
+class HttpSessionPoolTests(unittest.TestCase):
+    @patch('requests.Session')
+    def test_session_per_host(self, session_mock):
+        session_mock.side_effect = lambda: MagicMock()
+        pool = HttpSessionPool()
+        first = pool.session('http://host1:8088/ws/v1/cluster/apps')
+        self.assertEqual(pool.session('HTTP://HOST1:8088/ws/v1/cluster/apps/application_1'), first)
+        self.assertNotEqual(pool.session('http://host1:11000/oozie/v1/jobs'), first)
+        self.assertNotEqual(pool.session('https://host1:8088/ws/v1/cluster/apps'), first)
+        self.assertEqual(session_mock.call_count, 3)
+
+        retry = first.mount.call_args[0][1].max_retries
+        self.assertEqual(retry.total, HttpSessionPool.RETRIES)
+        self.assertEqual(retry.status_forcelist, HttpSessionPool.RETRY_STATUSES)
+
+        pool.close()
+        first.close.assert_called_once_with()
+        self.assertNotEqual(pool.session('http://host1:8088/ws/v1/cluster/apps'), first)
+
+    @patch('requests.Session')
+    def test_default_timeout(self, session_mock):
+        session = session_mock.return_value
+        pool = create_session_pool({'http_connect_timeout': 2, 'http_read_timeout': 30})
+
+        pool.request('PUT', 'http://oozie:11000/oozie/v1/job/1?action=kill')
+        session.request.assert_called_with('PUT', 'http://oozie:11000/oozie/v1/job/1?action=kill', timeout=(2, 30))
+
+        pool.request('GET', 'http://rm:8088/ws/v1/cluster/apps', timeout=5)
+        session.request.assert_called_with('GET', 'http://rm:8088/ws/v1/cluster/apps', timeout=5)
@@ -0,0 +1,129 @@
+"""
+Name:       test_package_cache.py
+Purpose:    Unit tests for the local package cache
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from mock import patch
+from package_cache import PackageCache, ExtractedPackageStore, file_digest
+
+
+class PackageCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.root, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _package(self, name, contents):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as package_file:
+            package_file.write(contents)
+        return path
+
+    def test_add_and_checkout(self):
+        cache = PackageCache(self.cache_dir)
+        source = self._package('a-1.0.0.tar.gz', b'abcd')
+        digest = cache.add(source)
+        self.assertEqual(digest, file_digest(source))
+
+        os.remove(source)
+        self.assertTrue(cache.checkout(digest, source))
+        with open(source, 'rb') as package_file:
+            self.assertEqual(package_file.read(), b'abcd')
+        self.assertFalse(cache.checkout('0' * 64, source))
+
+    def test_lru_eviction(self):
+        cache = PackageCache(self.cache_dir, max_bytes=8)
+        first = cache.add(self._package('a', b'aaaa'))
+        second = cache.add(self._package('b', b'bbbb'))
+        cache.checkout(first, os.path.join(self.root, 'a'))
+        cache.add(self._package('c', b'cccc'))
+
+        self.assertTrue(cache.checkout(first, os.path.join(self.root, 'a')))
+        self.assertFalse(cache.checkout(second, os.path.join(self.root, 'b')))
+
+    def test_corrupt_entry_discarded(self):
+        digest = PackageCache(self.cache_dir).add(self._package('a', b'abcd'))
+        with open(os.path.join(self.cache_dir, digest), 'wb') as cached_file:
+            cached_file.write(b'corrupted')
+
+        # a new cache has not verified anything it finds on disk
+        cache = PackageCache(self.cache_dir)
+        self.assertFalse(cache.checkout(digest, os.path.join(self.root, 'a')))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, digest)))
+
+
+class ExtractedPackageStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store_dir = os.path.join(self.root, 'extracted')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _package(self, name):
+        source_dir = os.path.join(self.root, name)
+        os.makedirs(os.path.join(source_dir, 'component', 'lib'))
+        with open(os.path.join(source_dir, 'component', 'properties.json'), 'w') as properties_file:
+            properties_file.write(name)
+        os.symlink('properties.json', os.path.join(source_dir, 'component', 'lib', 'link.json'))
+        path = os.path.join(self.root, '%s.tar.gz' % name)
+        with tarfile.open(path, 'w:gz') as tar:
+            tar.add(source_dir, arcname=name)
+        return path
+
+    def test_staged_trees_share_files(self):
+        store = ExtractedPackageStore(self.store_dir)
+        package = self._package('a-1.0.0')
+        first = os.path.join(self.root, 'stage1')
+        second = os.path.join(self.root, 'stage2')
+        store.stage(package, first)
+        with patch('package_cache.tarfile.open') as tar_open:
+            store.stage(package, second)
+            self.assertEqual(tar_open.call_count, 0)
+
+        first_file = os.path.join(first, 'a-1.0.0', 'component', 'properties.json')
+        second_file = os.path.join(second, 'a-1.0.0', 'component', 'properties.json')
+        self.assertEqual(os.stat(first_file).st_ino, os.stat(second_file).st_ino)
+        self.assertEqual(os.readlink(os.path.join(second, 'a-1.0.0', 'component', 'lib', 'link.json')),
+                         'properties.json')
+
+    def test_least_recently_used_evicted(self):
+        store = ExtractedPackageStore(self.store_dir, limit=1)
+        store.stage(self._package('a-1.0.0'), os.path.join(self.root, 'stage1'))
+        store.stage(self._package('b-1.0.0'), os.path.join(self.root, 'stage2'))
+        self.assertEqual(os.listdir(self.store_dir), [file_digest(os.path.join(self.root, 'b-1.0.0.tar.gz'))])
+
+    def test_known_digest_not_recomputed(self):
+        store = ExtractedPackageStore(self.store_dir)
+        package = self._package('a-1.0.0')
+        digest = file_digest(package)
+        with patch('package_cache.file_digest') as digest_mock:
+            store.stage(package, os.path.join(self.root, 'stage1'), digest)
+            store.stage(package, os.path.join(self.root, 'stage2'), digest)
+            self.assertEqual(digest_mock.call_count, 0)
+        self.assertEqual(os.listdir(self.store_dir), [digest])
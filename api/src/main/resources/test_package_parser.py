@@ -21,7 +21,13 @@ License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 either express or implied.
 """
 
+import io
+import os
+import shutil
+import tarfile
+import tempfile
 import unittest
+from mock import patch
 from package_parser import PackageParser
 from exceptiondef import FailedValidation
 
@@ -71,6 +77,41 @@ class PackageParserTests(unittest.TestCase):
         package_name = "test_package-1.0.2"
         self.assertEqual(parser.get_package_metadata("%s.tar.gz" % package_name), expected_metadata)
 
+    @patch('package_parser.tarfile')
+    def test_metadata_cached(self, tar_mock):
+        tar_mock.open.side_effect = tarfile.open
+        PackageParser._metadata_cache.clear() # pylint: disable=protected-access
+        parser = PackageParser()
+        first = parser.get_package_metadata("test_package-1.0.2.tar.gz")
+        first['user'] = 'username'
+        second = PackageParser().get_package_metadata("test_package-1.0.2.tar.gz")
+
+        self.assertNotIn('user', second)
+        self.assertEqual(second['package_name'], "test_package-1.0.2")
+        self.assertEqual(tar_mock.open.call_count, 1)
+
+    def test_members_in_any_order(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            package_path = os.path.join(work_dir, 'unordered-1.0.0.tar.gz')
+            tar = tarfile.open(package_path, 'w:gz')
+            for name, data in [('unordered-1.0.0/oozie/componentA/properties.json', b'{"a": "1"}'),
+                               ('unordered-1.0.0/oozie/componentA/workflow.xml', b'<workflow/>')]:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            info = tarfile.TarInfo('unordered-1.0.0')
+            info.type = tarfile.DIRTYPE
+            tar.addfile(info)
+            tar.close()
+
+            metadata = PackageParser().get_package_metadata(package_path)
+            self.assertEqual(metadata['package_name'], 'unordered-1.0.0')
+            self.assertEqual(metadata['component_types']['oozie']['componentA']['component_detail'],
+                             {'properties.json': {'a': '1'}, 'workflow.xml': {}})
+        finally:
+            shutil.rmtree(work_dir)
+
     def test_invalid_package(self):
         parser = PackageParser()
         package_name = "test_package-1.0.3"
@@ -125,6 +125,27 @@ class GenerateRecord(unittest.TestCase):
         result = registrar.get_package_data('name')
         self.assertEqual(result, None)
 
+    @patch('happybase.Connection')
+    # pylint: disable=protected-access
+    def test_get_package_data_cached(self, hbase_mock):
+        hbase_mock.return_value.table.return_value.row.return_value = {b'cf:package_data': 'abcd',
+                                                                       b'cf:package_hash': '1234'}
+        package_cache = Mock()
+        registrar = HbasePackageRegistrar('1.2.3.4', None, None, None, 'path', package_cache=package_cache)
+        registrar._hdfs_client = Mock()
+
+        package_cache.checkout.return_value = True
+        self.assertEqual(registrar.get_package_data('name'), 'path/name')
+        package_cache.checkout.assert_called_once_with('1234', 'path/name')
+        registrar._hdfs_client.stream_file_to_disk.assert_not_called()
+
+        package_cache.checkout.return_value = False
+        package_cache.add.return_value = '1234'
+        self.assertEqual(registrar.get_package_file('name'), ('path/name', '1234'))
+        registrar._hdfs_client.stream_file_to_disk.assert_called_once_with('abcd', 'path/name')
+        package_cache.add.assert_called_once_with('path/name')
+        package_cache.discard.assert_not_called()
+
     @patch('happybase.Connection')
     def test_get_package_metadata(self, hbase_mock):
         hbase_mock.return_value.table.return_value.row.return_value = {b'cf:metadata': '{"some": "thing"}', b'cf:name': 'name', b'cf:version': '1.0.0'}
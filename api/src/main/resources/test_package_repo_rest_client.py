@@ -0,0 +1,88 @@
+"""
+Name:       test_package_repo_rest_client.py
+Purpose:    Unit tests for the package repository client
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch, Mock
+from requests.exceptions import ChunkedEncodingError
+from package_repo_rest_client import PackageRepoRestClient
+from exceptiondef import FailedValidation
+
+PACKAGE_DATA = b'0123456789' * 10
+
+
+class PackageRepoRestClientTests(unittest.TestCase):
+    def setUp(self):
+        self.stage_root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.stage_root)
+
+    @staticmethod
+    def _response(status_code, chunks, headers, fail=False):
+        def iter_content(chunk_size):
+            for chunk in chunks:
+                yield chunk
+            if fail:
+                raise ChunkedEncodingError('connection reset')
+        response = Mock()
+        response.status_code = status_code
+        response.headers = headers
+        response.iter_content.side_effect = iter_content
+        return response
+
+    @patch('http_session_pool.get')
+    def test_download_resumed(self, get_mock):
+        headers = {'Content-Length': str(len(PACKAGE_DATA)), 'Accept-Ranges': 'bytes',
+                   'Content-MD5': base64.b64encode(hashlib.md5(PACKAGE_DATA).digest())}
+        get_mock.side_effect = [self._response(200, [PACKAGE_DATA[:40]], headers, fail=True),
+                                self._response(206, [PACKAGE_DATA[40:]], {})]
+
+        client = PackageRepoRestClient('http://repo', self.stage_root)
+        local_path = client.get_package('a-1.0.0.tar.gz', 'user')
+
+        with open(local_path, 'rb') as local_file:
+            self.assertEqual(local_file.read(), PACKAGE_DATA)
+        self.assertEqual(get_mock.call_args_list[1][1]['headers'], {'Range': 'bytes=40-'})
+        self.assertTrue(get_mock.call_args_list[1][1]['stream'])
+
+    @patch('http_session_pool.get')
+    def test_checksum_mismatch(self, get_mock):
+        headers = {'Content-MD5': base64.b64encode(hashlib.md5(b'other').digest())}
+        get_mock.return_value = self._response(200, [PACKAGE_DATA], headers)
+
+        client = PackageRepoRestClient('http://repo', self.stage_root)
+        self.assertRaises(FailedValidation, client.get_package, 'a-1.0.0.tar.gz', 'user')
+        self.assertEqual(os.listdir(self.stage_root), [])
+
+    @patch('http_session_pool.get')
+    def test_size_limit(self, get_mock):
+        get_mock.return_value = self._response(200, [PACKAGE_DATA[:60], PACKAGE_DATA[60:]], {})
+
+        client = PackageRepoRestClient('http://repo', self.stage_root, max_package_size=50)
+        self.assertRaises(FailedValidation, client.get_package, 'a-1.0.0.tar.gz', 'user')
+        self.assertEqual(os.listdir(self.stage_root), [])
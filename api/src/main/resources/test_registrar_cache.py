@@ -0,0 +1,101 @@
+"""
+Name:       test_registrar_cache.py
+Purpose:    Unit tests for the registrar cache
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import unittest
+from mock import Mock
+from registrar_cache import RecordCache, CachedPackageRegistrar, CachedApplicationRegistrar
+from lifecycle_states import ApplicationState, PackageDeploymentState
+
+
+class RegistrarCacheTests(unittest.TestCase):
+    def test_package_reads_cached_until_write(self):
+        registrar = Mock()
+        registrar.get_package_deploy_status.return_value = {'state': PackageDeploymentState.DEPLOYED}
+        registrar.list_packages.return_value = ['a-1.0.0']
+        cached = CachedPackageRegistrar(registrar, RecordCache())
+
+        self.assertEqual(cached.get_package_deploy_status('a-1.0.0'), {'state': PackageDeploymentState.DEPLOYED})
+        self.assertEqual(cached.get_package_deploy_status('a-1.0.0'), {'state': PackageDeploymentState.DEPLOYED})
+        self.assertEqual(cached.list_packages(), ['a-1.0.0'])
+        self.assertEqual(cached.list_packages(), ['a-1.0.0'])
+        self.assertEqual(registrar.get_package_deploy_status.call_count, 1)
+        self.assertEqual(registrar.list_packages.call_count, 1)
+
+        cached.delete_package('a-1.0.0')
+        registrar.delete_package.assert_called_once_with('a-1.0.0')
+        cached.get_package_deploy_status('a-1.0.0')
+        cached.list_packages()
+        self.assertEqual(registrar.get_package_deploy_status.call_count, 2)
+        self.assertEqual(registrar.list_packages.call_count, 2)
+
+    def test_application_write_invalidates(self):
+        registrar = Mock()
+        registrar.get_application.return_value = {'status': ApplicationState.CREATED}
+        cached = CachedApplicationRegistrar(registrar, RecordCache())
+
+        cached.get_application('app')
+        cached.get_application('other')
+        cached.set_application_status('app', ApplicationState.STARTED)
+        registrar.set_application_status.assert_called_once_with('app', ApplicationState.STARTED, None)
+
+        cached.get_application('app')
+        cached.get_application('other')
+        self.assertEqual([call[0][0] for call in registrar.get_application.call_args_list], ['app', 'other', 'app'])
+
+    def test_returned_values_are_copies(self):
+        registrar = Mock()
+        registrar.get_create_data.return_value = {'oozie': [{'path': '/a/b'}]}
+        cached = CachedApplicationRegistrar(registrar, RecordCache())
+
+        cached.get_create_data('app')['oozie'][0]['path'] = '/a'
+        self.assertEqual(cached.get_create_data('app'), {'oozie': [{'path': '/a/b'}]})
+
+    def test_ttl_and_size_bound(self):
+        loader = Mock(return_value='value')
+        cache = RecordCache(ttl=-1)
+        cache.get_or_load('a', 'field', loader)
+        cache.get_or_load('a', 'field', loader)
+        self.assertEqual(loader.call_count, 2)
+
+        loader = Mock(return_value='value')
+        cache = RecordCache(max_entries=1)
+        cache.get_or_load('a', 'field', loader)
+        cache.get_or_load('b', 'field', loader)
+        cache.get_or_load('a', 'field', loader)
+        self.assertEqual(loader.call_count, 3)
+
+    def test_uncached_calls_forwarded(self):
+        registrar = Mock()
+        registrar.get_package_data.return_value = 'stage/a-1.0.0'
+        cached = CachedPackageRegistrar(registrar, RecordCache())
+        self.assertEqual(cached.get_package_data('a-1.0.0'), 'stage/a-1.0.0')
+
+    def test_application_pages_cached_separately(self):
+        registrar = Mock()
+        registrar.list_applications.side_effect = lambda limit=None, start_after=None: [start_after]
+        cached = CachedApplicationRegistrar(registrar, RecordCache())
+
+        self.assertEqual(cached.list_applications(limit=1, start_after='a'), ['a'])
+        self.assertEqual(cached.list_applications(limit=1, start_after='b'), ['b'])
+        self.assertEqual(cached.list_applications(limit=1, start_after='a'), ['a'])
+        self.assertEqual(registrar.list_applications.call_count, 2)
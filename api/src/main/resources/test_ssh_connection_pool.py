@@ -0,0 +1,97 @@
+"""
+Name:       test_ssh_connection_pool.py
+Purpose:    Unit tests for the SSH connection pool
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import unittest
+import spur
+from mock import patch, MagicMock
+from ssh_connection_pool import SshConnectionPool
+
+
+def _shell(active=True):
+    shell = MagicMock()
+    shell._client.get_transport.return_value.is_active.return_value = active
+    return shell
+
+
+class SshConnectionPoolTests(unittest.TestCase):
+    @patch('spur.SshShell')
+    def test_shell_reused_per_host(self, shell_mock):
+        shell_mock.side_effect = [_shell(), _shell()]
+        pool = SshConnectionPool(keepalive_interval=10)
+        with pool.shell('host1', 'user', 'key.pem') as shell:
+            first = shell
+        with pool.shell('host1', 'user', 'key.pem') as shell:
+            self.assertEqual(shell, first)
+        with pool.shell('host2', 'user', 'key.pem') as shell:
+            self.assertNotEqual(shell, first)
+
+        self.assertEqual(shell_mock.call_count, 2)
+        first._client.get_transport.return_value.set_keepalive.assert_called_with(10)
+        first.__exit__.assert_not_called()
+
+    @patch('spur.SshShell')
+    def test_reconnect_after_connection_error(self, shell_mock):
+        broken = _shell()
+        healthy = _shell()
+        shell_mock.side_effect = [broken, healthy]
+        pool = SshConnectionPool()
+
+        def use_broken_shell():
+            with pool.shell('host', 'user', 'key.pem'):
+                raise spur.ssh.ConnectionError('connection reset')
+
+        self.assertRaises(spur.ssh.ConnectionError, use_broken_shell)
+        self.assertEqual(broken.__exit__.call_count, 1)
+        with pool.shell('host', 'user', 'key.pem') as shell:
+            self.assertEqual(shell, healthy)
+
+    @patch('spur.SshShell')
+    def test_inactive_and_idle_shells_replaced(self, shell_mock):
+        dropped = _shell()
+        stale = _shell()
+        fresh = _shell()
+        shell_mock.side_effect = [dropped, stale, fresh]
+        pool = SshConnectionPool(idle_timeout=-1)
+
+        with pool.shell('host', 'user', 'key.pem'):
+            dropped._client.get_transport.return_value.is_active.return_value = False
+        with pool.shell('host', 'user', 'key.pem') as shell:
+            self.assertEqual(shell, stale)
+        with pool.shell('host', 'user', 'key.pem') as shell:
+            self.assertEqual(shell, fresh)
+
+        self.assertEqual(dropped.__exit__.call_count, 1)
+        self.assertEqual(stale.__exit__.call_count, 1)
+
+    @patch('spur.SshShell')
+    def test_shell_reused_without_transport_access(self, shell_mock):
+        # a version of spur that does not keep its paramiko client in _client
+        shell_mock.return_value = MagicMock(spec=['run', '__exit__'])
+        pool = SshConnectionPool()
+        with pool.shell('host1', 'user', 'key.pem') as shell:
+            first = shell
+        with pool.shell('host1', 'user', 'key.pem') as shell:
+            self.assertEqual(shell, first)
+
+        self.assertEqual(shell_mock.call_count, 1)
+        first.__exit__.assert_not_called()
@@ -0,0 +1,80 @@
+"""
+Name:       test_striped_lock.py
+Purpose:    Unit tests for the striped lock
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+
+import threading
+import unittest
+from striped_lock import StripedLock
+
+
+class StripedLockTests(unittest.TestCase):
+    def test_same_name_serialized(self):
+        locks = StripedLock()
+        entered = threading.Event()
+
+        def hold():
+            with locks.locked('application:a'):
+                entered.set()
+
+        with locks.locked('application:a'):
+            thread = threading.Thread(target=hold)
+            thread.start()
+            self.assertFalse(entered.wait(0.2))
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_different_names_concurrent(self):
+        locks = StripedLock(stripes=1024)
+        entered = threading.Event()
+
+        def hold():
+            with locks.locked('application:b'):
+                entered.set()
+
+        with locks.locked('application:a'):
+            thread = threading.Thread(target=hold)
+            thread.start()
+            self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_several_names_and_reentry(self):
+        locks = StripedLock(stripes=1)
+        # every name shares the single stripe, which must be taken once and may be re-entered
+        with locks.locked('package:p', 'application:a'):
+            with locks.locked('application:a'):
+                pass
+
+    def test_locked_if_free(self):
+        locks = StripedLock()
+        results = []
+
+        def try_lock():
+            with locks.locked_if_free('package:p') as locked:
+                results.append(locked)
+
+        with locks.locked('package:p'):
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+        try_lock()
+        self.assertEqual(results, [False, True])
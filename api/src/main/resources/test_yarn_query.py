@@ -0,0 +1,91 @@
+"""
+Name:       test_yarn_query.py
+Purpose:    Unit tests for the YARN query layer
+            Run with main(), the easiest way is "nosetests test_*.py"
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+
+import json
+import unittest
+from mock import patch
+import yarn_query
+from yarn_query import IncrementalAppList
+
+
+def rm_response(body):
+    return type('obj', (object,), {'status_code': 200, 'text': json.dumps(body)})
+
+
+def apps_response(apps):
+    return rm_response({'apps': {'app': apps} if apps else None})
+
+
+class YarnQueryTests(unittest.TestCase):
+    def test_query_params(self):
+        self.assertEqual(yarn_query.query_params(), {})
+        self.assertEqual(yarn_query.query_params(states=['RUNNING', 'ACCEPTED'],
+                                                 application_types=['SPARK', 'Apache Flink'],
+                                                 started_time_begin=5,
+                                                 application_tags=[yarn_query.application_tag('Platform_App')]),
+                         {'states': 'RUNNING,ACCEPTED',
+                          'applicationTypes': 'SPARK,Apache Flink',
+                          'startedTimeBegin': 5,
+                          'applicationTags': 'pnda-dm-platform_app'})
+
+    @patch('yarn_query.milli_time')
+    @patch('http_session_pool.get')
+    def test_incremental_poll(self, get_mock, time_mock):
+        app_list = IncrementalAppList('rm:8088', application_types=['SPARK'])
+
+        # the first poll reads every application
+        time_mock.return_value = 1000000
+        get_mock.side_effect = [apps_response([
+            {'id': 'application_1', 'state': 'RUNNING'},
+            {'id': 'application_2', 'state': 'RUNNING'},
+            {'id': 'application_3', 'state': 'FINISHED'}])]
+        self.assertEqual(len(app_list.poll()), 3)
+        self.assertEqual(get_mock.call_args[1]['params'], {'applicationTypes': 'SPARK'})
+
+        # later polls ask for new and active applications, and for active applications that are in neither list
+        time_mock.return_value = 1030000
+        get_mock.side_effect = [
+            apps_response([{'id': 'application_4', 'state': 'ACCEPTED'}]),
+            apps_response([{'id': 'application_1', 'state': 'RUNNING'}, {'id': 'application_4', 'state': 'ACCEPTED'}]),
+            rm_response({'app': {'id': 'application_2', 'state': 'FINISHED'}})]
+        apps = dict((app['id'], app['state']) for app in app_list.poll())
+        self.assertEqual(apps, {'application_1': 'RUNNING', 'application_2': 'FINISHED',
+                                'application_3': 'FINISHED', 'application_4': 'ACCEPTED'})
+        params = [call[1].get('params') for call in get_mock.call_args_list[1:]]
+        self.assertEqual(params[0]['startedTimeBegin'], 1000000 - yarn_query.CLOCK_SKEW_MILLIS)
+        self.assertEqual(params[1]['states'], ','.join(yarn_query.ACTIVE_STATES))
+        self.assertEqual(get_mock.call_args_list[3][0][0], 'http://rm:8088/ws/v1/cluster/apps/application_2')
+
+        # applications the resource manager has forgotten are dropped
+        time_mock.return_value = 1060000
+        get_mock.side_effect = [
+            apps_response([]),
+            apps_response([{'id': 'application_4', 'state': 'RUNNING'}]),
+            rm_response({'RemoteException': {'message': 'not found'}})]
+        self.assertEqual(sorted(app['id'] for app in app_list.poll()), ['application_2', 'application_3', 'application_4'])
+
+        # and the whole list is read again after the full refresh interval
+        time_mock.return_value = 1000000 + IncrementalAppList.DEFAULT_FULL_REFRESH_INTERVAL * 1000
+        get_mock.side_effect = [apps_response([{'id': 'application_4', 'state': 'RUNNING'}])]
+        self.assertEqual([app['id'] for app in app_list.poll()], ['application_4'])
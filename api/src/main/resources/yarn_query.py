@@ -0,0 +1,133 @@
+"""
+Name:       yarn_query.py
+Purpose:    Queries the YARN resource manager for applications using its filters
+            Applications launched by the deployment manager are tagged so that they can be asked for
+            by tag, and the list of applications can be kept up to date by asking only for what has changed.
+Author:     PNDA team
+
+Created:    17/10/2026
+
+Copyright (c) 2026 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Apache License, Version 2.0 (the "License").
+You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+The code, technical concepts, and all information contained herein, are the property of Cisco Technology, Inc.
+and/or its affiliated entities, under various laws including copyright, international treaties, patent,
+and/or contract. Any use of the material herein must be in accordance with the terms of the License.
+All rights not expressly granted by the License are reserved.
+
+Unless required by applicable law or agreed to separately in writing, software distributed under the
+License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied.
+"""
+
+import json
+import logging
+import time
+import http_session_pool
+
+APPS_PATH = '/ws/v1/cluster/apps'
+# states in which an application may still change
+ACTIVE_STATES = ['NEW', 'NEW_SAVING', 'SUBMITTED', 'ACCEPTED', 'RUNNING']
+# allowance for the clocks of this host and the resource manager disagreeing
+CLOCK_SKEW_MILLIS = 5 * 60 * 1000
+
+
+def milli_time():
+    return int(round(time.time() * 1000))
+
+
+def application_tag(namespace):
+    """
+    :return: the tag given to YARN applications launched by the deployment manager in namespace
+    """
+    # YARN stores tags in lower case
+    return ('pnda-dm-%s' % namespace).lower()
+
+
+def query_params(states=None, application_types=None, started_time_begin=None, application_tags=None):
+    """
+    :return: the resource manager query parameters that select applications matching every given filter
+    """
+    params = {}
+    if states:
+        params['states'] = ','.join(states)
+    if application_types:
+        params['applicationTypes'] = ','.join(application_types)
+    if started_time_begin is not None:
+        params['startedTimeBegin'] = started_time_begin
+    if application_tags:
+        params['applicationTags'] = ','.join(application_tags)
+    return params
+
+
+def list_apps(resource_manager, timeout=None, **filters):
+    """
+    :param resource_manager: the host:port of the resource manager
+    :param filters: passed to query_params
+    :return: a list of the applications that match the filters
+    """
+    url = 'http://%s%s' % (resource_manager, APPS_PATH)
+    response = http_session_pool.get(url, params=query_params(**filters), timeout=timeout)
+    apps = json.loads(response.text)['apps']
+    return apps['app'] if apps is not None else []
+
+
+def get_app(resource_manager, app_id, timeout=None):
+    """
+    :return: a single application, or None if the resource manager no longer knows about it
+    """
+    url = 'http://%s%s/%s' % (resource_manager, APPS_PATH, app_id)
+    response = http_session_pool.get(url, timeout=timeout)
+    return json.loads(response.text).get('app')
+
+
+class IncrementalAppList(object):
+    """
+    A copy of the resource manager's list of applications that is brought up to date by asking for
+    the applications that have started or were still active since the last poll, rather than for every application
+    The whole list is read again every full_refresh_interval seconds to drop applications the resource manager has forgotten.
+    Not thread safe, callers must serialize calls to poll.
+    """
+    DEFAULT_FULL_REFRESH_INTERVAL = 600
+
+    def __init__(self, resource_manager, timeout=None, application_types=None, application_tags=None,
+                 full_refresh_interval=DEFAULT_FULL_REFRESH_INTERVAL):
+        self._resource_manager = resource_manager
+        self._timeout = timeout
+        self._filters = {'application_types': application_types, 'application_tags': application_tags}
+        self._full_refresh_interval = full_refresh_interval * 1000
+        # application id -> application
+        self._apps = {}
+        self._last_poll = None
+        self._last_full_poll = None
+
+    def poll(self):
+        """
+        :return: a list of every application that matches the filters
+        """
+        now = milli_time()
+        if self._last_poll is None or now - self._last_full_poll >= self._full_refresh_interval:
+            apps = list_apps(self._resource_manager, self._timeout, **self._filters)
+            self._apps = dict((app['id'], app) for app in apps)
+            self._last_full_poll = now
+        else:
+            previously_active = [app_id for app_id, app in self._apps.items() if app['state'] in ACTIVE_STATES]
+            changed = list_apps(self._resource_manager, self._timeout,
+                                started_time_begin=self._last_poll - CLOCK_SKEW_MILLIS, **self._filters)
+            changed.extend(list_apps(self._resource_manager, self._timeout, states=ACTIVE_STATES, **self._filters))
+            for app in changed:
+                self._apps[app['id']] = app
+            # applications that have finished since the last poll are no longer in either list
+            seen = set(app['id'] for app in changed)
+            for app_id in previously_active:
+                if app_id not in seen:
+                    app = get_app(self._resource_manager, app_id, self._timeout)
+                    if app is not None:
+                        self._apps[app_id] = app
+                    else:
+                        del self._apps[app_id]
+            logging.debug("%d YARN applications changed since the last poll", len(changed))
+        self._last_poll = now
+        return self._apps.values()